@@ -0,0 +1,193 @@
+"""
+Asynchronous counterpart of :mod:`paypal.gateway`, for use from ASGI views.
+
+This module needs Python 3.5+ and the ``httpx`` package, which is installed
+with ``pip install "django-oscar-paypal[async]"``.  Responses are parsed by
+exactly the same code as the synchronous transport.
+"""
+import asyncio
+import functools
+import time
+import weakref
+
+import httpx
+from django.conf import settings
+
+from paypal import exceptions, gateway, metrics
+from paypal.breaker import get_breaker
+from paypal.bulkhead import get_bulkhead
+
+try:
+    from asgiref.sync import sync_to_async
+except ImportError:
+    def sync_to_async(fn):
+        """
+        Run a blocking function (eg an ORM call) in the default executor.
+        """
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            loop = asyncio.get_event_loop()
+            return await loop.run_in_executor(
+                None, functools.partial(fn, *args, **kwargs))
+        return wrapper
+
+# httpx clients are bound to the event loop they were first used in, so we
+# keep one per loop.
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    """
+    Return the pooled ``httpx.AsyncClient`` for the current event loop.
+    """
+    loop = asyncio.get_event_loop()
+    client = _clients.get(loop)
+    if client is None:
+        if getattr(settings, 'PAYPAL_HTTP_KEEP_ALIVE', True):
+            keep_alive = getattr(settings, 'PAYPAL_HTTP_POOL_SIZE', 10)
+        else:
+            keep_alive = 0
+        client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=None, max_keepalive_connections=keep_alive))
+        _clients[loop] = client
+    return client
+
+
+async def close_client():
+    """
+    Close the client for the current event loop (eg on ASGI shutdown).
+    """
+    client = _clients.pop(asyncio.get_event_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def post(url, params, headers=None, policy=None):
+    """
+    Make a POST request to the URL using the key-value pairs without blocking
+    the event loop.  Return the response as an
+    :class:`paypal.nvp.NVPResponse`.
+
+    Timeouts, deadline, retries, circuit breaking and the bulkhead work as
+    for :func:`paypal.gateway.post`.  Async calls take slots from the same
+    bulkhead as the synchronous ones, so ``PAYPAL_BULKHEAD`` caps them
+    together.
+
+    :url: URL to post to
+    :params: Dict of parameters to include in post payload
+    :headers: Extra HTTP headers to send
+    :policy: The :class:`paypal.gateway.CallPolicy` for the call
+    """
+    if policy is None:
+        policy = gateway.CallPolicy()
+    start_time = time.time()
+    metrics.call_started(policy.name)
+    try:
+        pairs = await _guarded_post(url, params, headers, policy)
+    except exceptions.PayPalBusy:
+        metrics.call_failed(policy.name, 'busy', time.time() - start_time)
+        raise
+    except exceptions.PayPalUnavailable:
+        metrics.call_failed(
+            policy.name, 'unavailable', time.time() - start_time)
+        raise
+    except Exception:
+        metrics.call_failed(policy.name, 'error', time.time() - start_time)
+        raise
+    metrics.call_responded(policy.name)
+    return pairs
+
+
+async def _guarded_post(url, params, headers, policy):
+    # The breaker's state is in a Django cache, so it is read and written
+    # off the event loop
+    breaker = get_breaker(url)
+    breaker_state = (await sync_to_async(breaker.before_call)()
+                     if breaker else None)
+    bulkhead = get_bulkhead()
+    reachable = None
+    try:
+        if bulkhead:
+            await _acquire_slot(bulkhead)
+        try:
+            try:
+                pairs = await _post(url, params, headers, policy)
+            except exceptions.PayPalUnavailable:
+                reachable = False
+                raise
+            except exceptions.PayPalError:
+                reachable = True
+                raise
+            reachable = True
+        finally:
+            if bulkhead:
+                await _run_blocking(bulkhead.release)
+    finally:
+        if breaker:
+            await sync_to_async(gateway._record_breaker)(
+                breaker, breaker_state, reachable)
+    return pairs
+
+
+def _run_blocking(fn):
+    # The bulkhead waits on a threading.Condition (and may use a cache), so
+    # its calls are made in the default executor.  Not with sync_to_async:
+    # its single thread could be waiting for a slot while the release which
+    # frees it is queued behind.
+    return asyncio.get_event_loop().run_in_executor(None, fn)
+
+
+async def _acquire_slot(bulkhead):
+    future = _run_blocking(bulkhead.acquire)
+    try:
+        await asyncio.shield(future)
+    except asyncio.CancelledError:
+        # The acquire carries on in its thread - give the slot back if it
+        # gets one
+        def release(future):
+            if not future.cancelled() and future.exception() is None:
+                _run_blocking(bulkhead.release)
+        future.add_done_callback(release)
+        raise
+
+
+async def _post(url, params, headers, policy):
+    payload, raw_request = gateway.encode(params)
+    request_headers = dict(gateway.HEADERS, **(headers or {}))
+    start_time = time.time()
+    deadline = start_time + policy.deadline
+    attempt = 0
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise exceptions.PayPalUnavailable(
+                "Timed out communicating with PayPal")
+        timeout = httpx.Timeout(
+            min(policy.read_timeout, remaining),
+            connect=min(policy.connect_timeout, remaining))
+        try:
+            response = await asyncio.wait_for(get_client().post(
+                url, content=payload, headers=request_headers,
+                timeout=timeout), remaining)
+        except (httpx.TransportError, asyncio.TimeoutError) as e:
+            error = e
+        else:
+            if response.status_code == 200:
+                return gateway.parse_response(
+                    raw_request, response.content, start_time)
+            if response.status_code < 500:
+                raise exceptions.PayPalError(
+                    "Unable to communicate with PayPal")
+            error = "HTTP %s" % response.status_code
+
+        if attempt >= policy.retries:
+            gateway.logger.warning("PayPal call to %s failed: %s", url, error)
+            raise exceptions.PayPalUnavailable(
+                "Unable to communicate with PayPal")
+        delay = policy.backoff_delay(attempt)
+        if time.time() + delay >= deadline:
+            raise exceptions.PayPalUnavailable(
+                "Timed out communicating with PayPal")
+        attempt += 1
+        metrics.call_retried(policy.name)
+        await asyncio.sleep(delay)
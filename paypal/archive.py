@@ -0,0 +1,112 @@
+"""
+Archiving of old transactions.
+
+Nothing needs the audit records of old transactions day to day, but they
+make the transaction tables (and their indexes) ever bigger.  The
+``paypal_archive_transactions`` command moves transactions older than a
+given age into the ``ArchivedTransaction`` table, where each one is stored as
+a single compressed JSON document.  Archived transactions can still be viewed
+in the dashboards, and can be moved back with :func:`restore` (or the
+``paypal_restore_transactions`` command).
+"""
+from __future__ import unicode_literals
+import json
+
+from django.db import router, transaction
+
+from paypal.base import ArchivedTransaction, TransactionPayload
+
+# Fields stored with the payload rather than with the rest of the data
+PAYLOAD_FIELDS = ('raw_request', 'raw_response')
+
+
+def serialize(txn):
+    """
+    Return a transaction, including its payload, as a JSON string.
+    """
+    data = {}
+    for field in txn._meta.concrete_fields:
+        if field.name == 'payload':
+            continue
+        value = field.value_from_object(txn)
+        data[field.attname] = (
+            None if value is None else field.value_to_string(txn))
+    for name in PAYLOAD_FIELDS:
+        data[name] = getattr(txn, name)
+    return json.dumps(data, sort_keys=True)
+
+
+def deserialize(model, document):
+    """
+    Return an unsaved transaction built from a JSON string returned by
+    :func:`serialize`.
+    """
+    data = json.loads(document)
+    kwargs = {}
+    for field in model._meta.concrete_fields:
+        if field.attname in data:
+            value = data[field.attname]
+            kwargs[field.attname] = (
+                None if value is None else field.to_python(value))
+    for name in PAYLOAD_FIELDS:
+        kwargs[name] = data.get(name, '')
+    return model(**kwargs)
+
+
+def archive_batch(model, before, batch_size=500):
+    """
+    Archive up to ``batch_size`` of the oldest transactions created before
+    ``before``, and return how many were archived.
+
+    Each batch is moved in its own database transaction, so an interrupted
+    run loses nothing and the next run carries on where it stopped.
+    """
+    model_name = model._meta.model_name
+    with transaction.atomic(using=router.db_for_write(model)):
+        txns = list(model.objects.filter(date_created__lt=before)
+                    .select_related('payload')
+                    .order_by('pk')[:batch_size])
+        if not txns:
+            return 0
+        ArchivedTransaction.objects.bulk_create([
+            ArchivedTransaction(model_name=model_name, original_id=txn.pk,
+                                date_created=txn.date_created,
+                                data=serialize(txn))
+            for txn in txns])
+        model.objects.filter(pk__in=[txn.pk for txn in txns]).delete()
+        payload_ids = [txn.payload_id for txn in txns if txn.payload_id]
+        if payload_ids:
+            TransactionPayload.objects.filter(pk__in=payload_ids).delete()
+    return len(txns)
+
+
+def get_archived(model, pk):
+    """
+    Return an archived transaction as an unsaved instance of ``model`` with
+    its original ID, or ``None`` if it hasn't been archived.
+    """
+    try:
+        archived = ArchivedTransaction.objects.get(
+            model_name=model._meta.model_name, original_id=pk)
+    except ArchivedTransaction.DoesNotExist:
+        return None
+    txn = deserialize(model, archived.data)
+    txn.is_archived = True
+    return txn
+
+
+def restore(model, pk):
+    """
+    Move an archived transaction back into its table and return it.
+    """
+    with transaction.atomic(using=router.db_for_write(model)):
+        archived = ArchivedTransaction.objects.select_for_update().get(
+            model_name=model._meta.model_name, original_id=pk)
+        txn = deserialize(model, archived.data)
+        txn.save(force_insert=True)
+        # auto_now_add replaced the original creation date
+        model.objects.filter(pk=txn.pk).update(
+            date_created=archived.date_created)
+        txn.date_created = archived.date_created
+        archived.delete()
+    return txn
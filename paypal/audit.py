@@ -0,0 +1,329 @@
+"""
+Persistence of the audit records (``ExpressTransaction`` and
+``PayflowTransaction`` rows) written for every call to PayPal.
+
+By default each record is saved as soon as the call returns.  With the
+``PAYPAL_AUDIT_WRITE_BEHIND`` setting, records are instead collected in an
+in-process buffer and written with ``bulk_create`` by a background thread
+once the buffer is big enough or old enough, which takes a blocking INSERT out
+of every checkout request.  The buffer is also flushed when the process exits
+normally.
+
+Records written behind don't get a primary key.  Code which looks records up
+from the database should call :func:`flush` first, which waits until the
+records made by this process have been written.  Records buffered by other
+processes can't be flushed, so a lookup may miss them for up to ``max_age``
+seconds: the view is only consistent within a process.
+
+The ``PAYPAL_AUDIT_SAMPLING`` setting reduces the records kept for successful,
+high-volume calls which don't move money (eg GetExpressCheckoutDetails): only
+a sample of them are stored, or stored with their raw payloads.  Failed calls
+and calls which move money are always stored in full.  The number of calls
+recorded each way is counted by :func:`stats` (and the
+``paypal_audit_records_total`` metric).
+"""
+from __future__ import unicode_literals
+import atexit
+import collections
+import contextlib
+import logging
+import os
+import random
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, router, transaction
+
+from paypal import metrics
+
+logger = logging.getLogger('paypal.audit')
+
+DEFAULTS = {
+    'max_size': 100,
+    'max_age': 5,
+}
+
+# How a record is stored
+FULL, SUMMARY, SKIPPED = 'full', 'summary', 'skipped'
+
+# Calls which are always stored in full: the Express methods which move money
+# and all Payflow transaction types
+MONEY_MOVING_CALLS = frozenset([
+    'DoExpressCheckoutPayment', 'DoCapture', 'DoVoid', 'RefundTransaction',
+    'S', 'A', 'D', 'C', 'V',
+])
+
+
+class AuditBuffer(object):
+    """
+    Buffer of unsaved audit records.
+
+    Records are written by a background thread, once ``max_size`` are
+    waiting or at least every ``max_age`` seconds.  The thread has its own
+    database connection, so records are never written inside the
+    transaction of the request which happens to make (or flush) them, and
+    aren't lost if that transaction is rolled back.
+    """
+
+    def __init__(self, max_size=100, max_age=5):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._records = []
+        # Held while records are written, so a flush can't return while
+        # another thread is still writing records taken from the buffer
+        self._write_lock = threading.Lock()
+        # Flushes are numbered so that callers can wait for theirs
+        self._flushed = threading.Condition()
+        self._requested = 0
+        self._completed = 0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name='paypal-audit-flusher')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add(self, record):
+        with self._lock:
+            self._records.append(record)
+            full = len(self._records) >= self.max_size
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """
+        Write all buffered records to the database, and wait until they have
+        been written.
+        """
+        if not self._thread.is_alive():
+            self._write_buffered()
+            return
+        with self._flushed:
+            self._requested += 1
+            ticket = self._requested
+        self._wake.set()
+        with self._flushed:
+            while self._completed < ticket and self._thread.is_alive():
+                self._flushed.wait(self.max_age)
+        if self._completed < ticket:
+            # The flusher stopped (eg the process is exiting)
+            self._write_buffered()
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(self.max_age)
+        self._write_buffered()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.max_age)
+            self._wake.clear()
+            with self._flushed:
+                ticket = self._requested
+            try:
+                self._write_buffered()
+            except Exception:
+                logger.exception("Unable to write audit records")
+            finally:
+                _close_connection()
+            with self._flushed:
+                self._completed = ticket
+                self._flushed.notify_all()
+
+    def _write_buffered(self):
+        with self._write_lock:
+            with self._lock:
+                records, self._records = self._records, []
+            if records:
+                _write(records)
+
+    def __len__(self):
+        return len(self._records)
+
+
+def _write(records):
+    """
+    Bulk insert the records, grouped by model, after their payloads.  Each
+    batch is written in its own transaction.  If a batch fails, fall back to
+    saving its records one at a time so one bad record doesn't lose the
+    others.
+    """
+    by_model = {}
+    for record in records:
+        by_model.setdefault(type(record), []).append(record)
+    for model, batch in by_model.items():
+        using = router.db_for_write(model)
+        with_payloads = [record for record in batch
+                         if record.unsaved_payload() is not None]
+        try:
+            with transaction.atomic(using=using):
+                _write_payloads(with_payloads)
+                model.objects.bulk_create(batch)
+        except DatabaseError:
+            logger.exception(
+                "Unable to write %d %s audit records in bulk - saving them "
+                "one at a time", len(batch), model.__name__)
+            # The payloads were rolled back with the batch
+            for record in with_payloads:
+                record.payload_unsaved()
+            for record in batch:
+                try:
+                    with transaction.atomic(using=using):
+                        record.save()
+                except DatabaseError:
+                    logger.exception("Unable to write audit record %r",
+                                     record)
+
+
+def _write_payloads(records):
+    from paypal.base import TransactionPayload
+    if records:
+        TransactionPayload.objects.bulk_create(
+            [record.payload for record in records])
+        for record in records:
+            record.payload_saved()
+
+
+def _close_connection():
+    # Connections are per thread, so this only closes the flusher's
+    from django.db import connections
+    for connection in connections.all():
+        connection.close()
+
+
+# Each process gets its own buffer.  A forked worker starts with an empty
+# buffer - its parent is responsible for the records it had buffered.
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """
+    Return this process's buffer, or ``None`` if records are not written
+    behind.
+    """
+    global _buffer, _buffer_pid
+    config = getattr(settings, 'PAYPAL_AUDIT_WRITE_BEHIND', None)
+    if config is None:
+        return None
+    pid = os.getpid()
+    if _buffer is None or _buffer_pid != pid:
+        with _buffer_lock:
+            if _buffer is None or _buffer_pid != pid:
+                _buffer = AuditBuffer(**dict(DEFAULTS, **config))
+                _buffer_pid = pid
+    return _buffer
+
+
+def get_storage(call, successful):
+    """
+    Return how the record of a call should be stored: ``FULL``, ``SUMMARY``
+    (without the raw request and response) or ``SKIPPED``.
+    """
+    if not successful or call in MONEY_MOVING_CALLS:
+        return FULL
+    config = getattr(settings, 'PAYPAL_AUDIT_SAMPLING', {}).get(call)
+    if not config:
+        return FULL
+    if random.random() >= config.get('records', 1):
+        return SKIPPED
+    if random.random() >= config.get('payloads', 1):
+        return SUMMARY
+    return FULL
+
+
+_counts = collections.Counter()
+_counts_lock = threading.Lock()
+
+
+def stats():
+    """
+    Return the number of calls recorded by this process, keyed by the call
+    and how it was stored, eg ``('GetExpressCheckoutDetails', 'summary')``.
+    """
+    with _counts_lock:
+        return dict(_counts)
+
+
+def record(instance, call=None, successful=False):
+    """
+    Save an audit record, either at once or via the write-behind buffer.
+    Return the record.
+
+    If the ``call`` is given, the ``PAYPAL_AUDIT_SAMPLING`` setting decides
+    whether the record is saved, and whether it is saved with its payload.
+    Records which aren't saved are still returned.
+    """
+    storage = FULL if call is None else get_storage(call, successful)
+    if call is not None:
+        with _counts_lock:
+            _counts[(call, storage)] += 1
+        metrics.audit_recorded(call, storage)
+    if storage == SKIPPED:
+        return instance
+    if storage == SUMMARY:
+        instance.discard_payload()
+    pending = getattr(_deferred, 'records', None)
+    if pending is not None:
+        pending.append(instance)
+    else:
+        _store(instance)
+    return instance
+
+
+def _store(instance):
+    buffer = get_buffer()
+    if buffer is None:
+        instance.save()
+    else:
+        buffer.add(instance)
+
+
+_deferred = threading.local()
+
+
+@contextlib.contextmanager
+def deferred():
+    """
+    Collect the records made by this thread in a list rather than saving
+    them, so that another thread can save them with :func:`save_deferred`
+    (eg in its own database transaction).
+    """
+    _deferred.records = []
+    try:
+        yield _deferred.records
+    finally:
+        del _deferred.records
+
+
+def save_deferred(records):
+    """
+    Save records collected by :func:`deferred`, as :func:`record` would have.
+    """
+    for instance in records:
+        _store(instance)
+
+
+def flush():
+    """
+    Write any buffered records made by this process.
+    """
+    if _buffer is not None and _buffer_pid == os.getpid():
+        _buffer.flush()
+
+
+def reset_buffer():
+    """
+    Flush and discard the buffer (eg after changing settings).
+    """
+    global _buffer, _buffer_pid
+    with _buffer_lock:
+        if _buffer is not None and _buffer_pid == os.getpid():
+            _buffer.close()
+        _buffer = _buffer_pid = None
+
+
+atexit.register(flush)
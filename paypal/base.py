@@ -1,26 +1,156 @@
 from __future__ import unicode_literals
-from django.utils import six
-from django.utils.six.moves.urllib.parse import parse_qsl
+import uuid
+
 from django.utils.translation import ugettext_lazy as _
 
 from django.db import models
 
+from paypal.fields import CompressedTextField
+from paypal.nvp import NVPResponse
+
+
+def new_payload_id():
+    return uuid.uuid4().hex
+
+
+class TransactionPayload(models.Model):
+    """
+    The raw request and response of a transaction.
+
+    These are kept out of the transaction tables so that queries which only
+    need a transaction's other fields (eg the dashboards and the facade
+    lookups) don't read them.  The ID is generated up front so that payloads
+    and their transactions can be written with ``bulk_create``.
+    """
+    id = models.CharField(max_length=32, primary_key=True,
+                          default=new_payload_id, editable=False)
+
+    # Debug information, compressed if PAYPAL_COMPRESS_PAYLOADS is set
+    raw_request = CompressedTextField(max_length=512, blank=True)
+    raw_response = CompressedTextField(max_length=512, blank=True)
+
+    class Meta:
+        app_label = 'paypal'
+
+
+class ArchivedTransaction(models.Model):
+    """
+    A transaction moved out of its table by the
+    ``paypal_archive_transactions`` command.  The transaction's fields and
+    payload are kept as compressed JSON.
+    """
+    model_name = models.CharField(max_length=32)
+    original_id = models.PositiveIntegerField()
+    date_created = models.DateTimeField(db_index=True)
+    data = CompressedTextField(always_compress=True)
+    date_archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = 'paypal'
+        unique_together = [('model_name', 'original_id')]
+
 
 class ResponseModel(models.Model):
 
-    # Debug information
-    raw_request = models.TextField(max_length=512)
-    raw_response = models.TextField(max_length=512)
+    # Loaded when the raw request or response is first read
+    payload = models.OneToOneField(
+        TransactionPayload, null=True, editable=False, related_name='+',
+        on_delete=models.SET_NULL)
 
     response_time = models.FloatField(help_text=_("Response time in milliseconds"))
 
-    date_created = models.DateTimeField(auto_now_add=True)
+    # Indexed for the dashboards, which list the most recent first
+    date_created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    # Set on transactions loaded from the archive (see paypal.archive)
+    is_archived = False
 
     class Meta:
         abstract = True
         ordering = ('-date_created',)
         app_label = 'paypal'
 
+    def save(self, *args, **kwargs):
+        payload = self.unsaved_payload()
+        if payload is not None:
+            payload.save(using=kwargs.get('using'),
+                         force_insert=payload._state.adding)
+            self.payload_saved()
+        return super(ResponseModel, self).save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        payload_id = self.payload_id
+        result = super(ResponseModel, self).delete(*args, **kwargs)
+        if payload_id is not None:
+            TransactionPayload.objects.filter(pk=payload_id).delete()
+        return result
+
+    @property
+    def raw_request(self):
+        payload = self._current_payload()
+        return payload.raw_request if payload else ''
+
+    @raw_request.setter
+    def raw_request(self, value):
+        self._changed_payload().raw_request = value
+
+    @property
+    def raw_response(self):
+        payload = self._current_payload()
+        return payload.raw_response if payload else ''
+
+    @raw_response.setter
+    def raw_response(self, value):
+        self._changed_payload().raw_response = value
+
+    def _current_payload(self):
+        # A discarded payload is still available until the record is reloaded
+        payload = self.__dict__.get('_discarded_payload')
+        if payload is None and self.payload_id:
+            payload = self.payload
+        return payload
+
+    def _changed_payload(self):
+        if self.payload_id is None:
+            self.payload = (self.__dict__.pop('_discarded_payload', None) or
+                            TransactionPayload())
+        self.__dict__['_payload_changed'] = True
+        return self.payload
+
+    def unsaved_payload(self):
+        """
+        Return the payload if it has been changed since it was last saved,
+        otherwise ``None``.
+        """
+        if self.__dict__.get('_payload_changed'):
+            return self.payload
+
+    def payload_saved(self):
+        """
+        Mark the payload as saved (eg after writing it with ``bulk_create``).
+        """
+        self.__dict__['_payload_changed'] = False
+        self.payload._state.adding = False
+
+    def payload_unsaved(self):
+        """
+        Mark the payload as unsaved again (eg after the transaction which
+        wrote it was rolled back).
+        """
+        if self.payload_id is not None:
+            self.__dict__['_payload_changed'] = True
+            self.payload._state.adding = True
+
+    def discard_payload(self):
+        """
+        Save the record without its payload.  The raw request and response
+        are still available from this instance.
+        """
+        if self.payload_id is not None:
+            self.__dict__['_discarded_payload'] = self.payload
+            self.__dict__['_payload_changed'] = False
+            self.payload = None
+
     def request(self):
         request_params = self.context
         return self._as_dl(request_params)
@@ -42,19 +172,32 @@ class ResponseModel(models.Model):
             rows.append('<dt>%s</dt><dd>%s</dd>' % (k, v[0]))
         return '<dl>%s</dl>' % ''.join(rows)
 
+    @property
+    def nvp(self):
+        """
+        The stored response as an :class:`paypal.nvp.NVPResponse`.
+
+        This is parsed once and reused until ``raw_response`` changes, as the
+        views and facades read many values from the same transaction.
+        """
+        return self._parsed()[0]
+
     @property
     def context(self):
-        ctx = {}
-        if six.PY2 and isinstance(self.raw_response, six.text_type):
-            self.raw_response = self.raw_response.encode('utf8')
-        for key, val in parse_qsl(self.raw_response):
-            if isinstance(key, six.binary_type):
-                key = key.decode('utf8')
-            if isinstance(val, six.binary_type):
-                val = val.decode('utf8')
-            ctx[key] = [val]
-        return ctx
+        parsed = self._parsed()
+        if parsed[1] is None:
+            parsed[1] = dict((key, [val]) for key, val in parsed[0].items())
+        return parsed[1]
 
     def value(self, key, default=None):
-        ctx = self.context
-        return ctx[key][0] if key in ctx else default
+        return self._parsed()[0].get(key, default)
+
+    def _parsed(self):
+        # A list of [response, context, raw_response] - the context is built
+        # on first use.  The cache is dropped whenever raw_response is
+        # replaced (eg by refresh_from_db).
+        parsed = self.__dict__.get('_parsed_response')
+        if parsed is None or parsed[2] is not self.raw_response:
+            parsed = [NVPResponse(self.raw_response), None, self.raw_response]
+            self.__dict__['_parsed_response'] = parsed
+        return parsed
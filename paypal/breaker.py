@@ -0,0 +1,147 @@
+"""
+Circuit breaker around the PayPal endpoints.
+
+State is kept in a Django cache so that every worker process (and every node,
+if the cache is shared) agrees on whether an endpoint is healthy.  The breaker
+is disabled unless the ``PAYPAL_CIRCUIT_BREAKER`` setting is defined.
+
+* While *closed*, calls go through and transport failures (connection errors,
+  timeouts and 5xx responses) are counted.  Once ``failure_threshold``
+  failures happen within ``failure_window`` seconds, the breaker opens.
+  Successful calls don't reset the count, so an endpoint which fails
+  intermittently still opens the breaker.
+* While *open*, calls fail immediately with a ``PayPalError``.
+* After ``reset_timeout`` seconds the breaker is *half-open*: a single probe
+  call is let through.  If it succeeds the breaker closes, otherwise it opens
+  again.
+"""
+from __future__ import unicode_literals
+import hashlib
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.encoding import force_bytes
+from django.utils.six.moves.urllib.parse import urlsplit
+
+from paypal import exceptions
+
+logger = logging.getLogger('paypal.gateway')
+
+DEFAULTS = {
+    'cache': 'default',
+    'failure_threshold': 5,
+    'failure_window': 30,
+    'reset_timeout': 30,
+}
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitBreaker(object):
+
+    def __init__(self, endpoint, cache='default', failure_threshold=5,
+                 failure_window=30, reset_timeout=30):
+        self.endpoint = endpoint
+        self.cache = caches[cache]
+        self.failure_threshold = failure_threshold
+        self.failure_window = failure_window
+        self.reset_timeout = reset_timeout
+        prefix = 'paypal:breaker:%s' % hashlib.md5(
+            force_bytes(endpoint)).hexdigest()
+        self.failures_key = prefix + ':failures'
+        self.opened_key = prefix + ':opened'
+        self.probe_key = prefix + ':probe'
+
+    def before_call(self):
+        """
+        Check the breaker before making a call.
+
+        Raise ``PayPalUnavailable`` if the breaker is open.  Otherwise return
+        the state that was read, which should be passed to
+        :meth:`record_success`, :meth:`record_failure` or
+        :meth:`release_probe`.
+        """
+        state = self.cache.get_many([self.failures_key, self.opened_key])
+        opened_at = state.get(self.opened_key)
+        if opened_at is not None:
+            if time.time() - opened_at < self.reset_timeout:
+                raise exceptions.PayPalUnavailable(
+                    "PayPal is currently unavailable - please try again later")
+            # Half-open: only one probe may be in flight across all workers
+            if not self.cache.add(self.probe_key, 1, self.reset_timeout):
+                raise exceptions.PayPalUnavailable(
+                    "PayPal is currently unavailable - please try again later")
+            logger.info("Circuit breaker for %s is half-open - probing",
+                        self.endpoint)
+        return state
+
+    def record_success(self, state):
+        # While closed, failures expire with their window.  Only a successful
+        # probe clears them.
+        if self.opened_key in state:
+            logger.info("Circuit breaker for %s closed", self.endpoint)
+            self.cache.delete_many(
+                [self.failures_key, self.opened_key, self.probe_key])
+
+    def release_probe(self, state):
+        """
+        Let another probe through if this call was a probe which ended
+        without telling whether the endpoint is healthy (eg it was rejected
+        by the bulkhead before being sent).
+        """
+        if self.opened_key in state:
+            self.cache.delete(self.probe_key)
+
+    def record_failure(self, state):
+        if self.opened_key in state:
+            # A failed probe - stay open for another reset period
+            self._open()
+            return
+        self.cache.add(self.failures_key, 0, self.failure_window)
+        try:
+            failures = self.cache.incr(self.failures_key)
+        except ValueError:
+            # The counter expired between the add and the incr
+            failures = 1
+            self.cache.set(self.failures_key, failures, self.failure_window)
+        if failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        logger.error("Circuit breaker for %s opened", self.endpoint)
+        # Keep the state long enough to outlive several reset periods
+        self.cache.set(self.opened_key, time.time(), self.reset_timeout * 10)
+        self.cache.delete(self.probe_key)
+
+
+def get_breaker(url):
+    """
+    Return the circuit breaker for the endpoint of a URL, or ``None`` if
+    circuit breaking is not enabled.
+    """
+    config = getattr(settings, 'PAYPAL_CIRCUIT_BREAKER', None)
+    if config is None:
+        return None
+    parts = urlsplit(url)
+    endpoint = '%s://%s' % (parts.scheme, parts.netloc)
+    breaker = _breakers.get(endpoint)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(endpoint)
+            if breaker is None:
+                kwargs = dict(DEFAULTS, **config)
+                breaker = _breakers[endpoint] = CircuitBreaker(
+                    endpoint, **kwargs)
+    return breaker
+
+
+def reset_breakers():
+    """
+    Forget the configured breakers (eg after changing settings).
+    """
+    with _breakers_lock:
+        _breakers.clear()
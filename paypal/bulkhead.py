@@ -0,0 +1,188 @@
+"""
+Bulkhead limiting the number of concurrent in-flight PayPal calls.
+
+When PayPal slows down, we don't want every worker thread to end up blocked
+waiting on it - that would take down the rest of the shop too.  The bulkhead
+caps the number of concurrent calls per process (with a short queue for
+callers waiting for a free slot) and, optionally, per node.  Calls which can't
+get a slot are rejected at once with ``PayPalBusy`` (a ``PayPalUnavailable``).
+
+The number of calls in flight, queued and rejected is recorded in
+:mod:`paypal.metrics`.
+
+The bulkhead is disabled unless the ``PAYPAL_BULKHEAD`` setting is defined.
+"""
+from __future__ import unicode_literals
+import contextlib
+import logging
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from paypal import exceptions, metrics
+
+logger = logging.getLogger('paypal.gateway')
+
+DEFAULTS = {
+    'max_concurrent': 10,
+    'max_queued': 5,
+    'queue_timeout': 0.5,
+    'node_limit': None,
+    'node_cache': 'default',
+    'node_ttl': 300,
+}
+
+
+class Bulkhead(object):
+    """
+    Limit the number of concurrent calls in this process and, if
+    ``node_limit`` is set, across all processes on this node.
+
+    The per-node count is kept in ``node_cache``, which must be shared by the
+    processes on a node (eg a local memcached or file-based cache).  The count
+    expires after ``node_ttl`` seconds so that slots leaked by a crashed
+    process are eventually freed.
+    """
+
+    def __init__(self, max_concurrent=10, max_queued=5, queue_timeout=0.5,
+                 node_limit=None, node_cache='default', node_ttl=300):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.node_limit = node_limit
+        self.node_cache = caches[node_cache] if node_limit else None
+        self.node_ttl = node_ttl
+        self.node_key = 'paypal:bulkhead:%s' % socket.gethostname()
+
+        self._condition = threading.Condition()
+        self.in_flight = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def acquire(self):
+        """
+        Take a slot, waiting up to ``queue_timeout`` seconds for one to free
+        up.  Raise ``PayPalUnavailable`` if none is available.
+        """
+        with self._condition:
+            if self.in_flight >= self.max_concurrent:
+                if self.queued >= self.max_queued:
+                    self._reject('queue_full', "queue is full")
+                self.queued += 1
+                metrics.bulkhead_queued(1)
+                try:
+                    deadline = time.time() + self.queue_timeout
+                    while self.in_flight >= self.max_concurrent:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            self._reject('queue_timeout',
+                                         "timed out waiting for a slot")
+                        self._condition.wait(remaining)
+                finally:
+                    self.queued -= 1
+                    metrics.bulkhead_queued(-1)
+            self.in_flight += 1
+            metrics.bulkhead_in_flight(1)
+
+        if self.node_limit:
+            try:
+                self._acquire_node_slot()
+            except exceptions.PayPalUnavailable:
+                self.release(node=False)
+                raise
+
+    def release(self, node=True):
+        if node and self.node_limit:
+            try:
+                self.node_cache.decr(self.node_key)
+            except ValueError:
+                # The count expired while we held the slot
+                pass
+        with self._condition:
+            self.in_flight -= 1
+            metrics.bulkhead_in_flight(-1)
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """
+        Return a snapshot of the bulkhead's state.
+        """
+        return {
+            'max_concurrent': self.max_concurrent,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'rejected': self.rejected,
+        }
+
+    def _acquire_node_slot(self):
+        self.node_cache.add(self.node_key, 0, self.node_ttl)
+        try:
+            count = self.node_cache.incr(self.node_key)
+        except ValueError:
+            count = 1
+            self.node_cache.set(self.node_key, count, self.node_ttl)
+        if count > self.node_limit:
+            self.node_cache.decr(self.node_key)
+            with self._condition:
+                self._reject('node_limit', "node limit reached")
+
+    def _reject(self, reason, description):
+        # Must be called with the condition held
+        self.rejected += 1
+        metrics.bulkhead_rejected(reason)
+        logger.warning("Rejecting PayPal call - %s", description)
+        raise exceptions.PayPalBusy(
+            "PayPal is busy - please try again later")
+
+
+_bulkhead = None
+_bulkhead_lock = threading.Lock()
+
+
+def get_bulkhead():
+    """
+    Return this process's bulkhead, or ``None`` if it is not enabled.
+    """
+    global _bulkhead
+    config = getattr(settings, 'PAYPAL_BULKHEAD', None)
+    if config is None:
+        return None
+    if _bulkhead is None:
+        with _bulkhead_lock:
+            if _bulkhead is None:
+                _bulkhead = Bulkhead(**dict(DEFAULTS, **config))
+    return _bulkhead
+
+
+def reset_bulkhead():
+    """
+    Forget the configured bulkhead (eg after changing settings).
+    """
+    global _bulkhead
+    with _bulkhead_lock:
+        _bulkhead = None
+
+
+@contextlib.contextmanager
+def slot():
+    """
+    Hold a bulkhead slot for the duration of the block (a no-op if the
+    bulkhead is disabled).
+    """
+    bulkhead = get_bulkhead()
+    if bulkhead is None:
+        yield
+    else:
+        with bulkhead.slot():
+            yield
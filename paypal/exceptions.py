@@ -11,3 +11,17 @@ class PayPalError(PaymentError):
 
 class PayPalError(PaymentError):
     pass
+
+
+class PayPalUnavailable(PayPalError):
+    """
+    For when calls to PayPal are rejected without being attempted, eg because
+    the circuit breaker for the endpoint is open.
+    """
+
+
+class PayPalBusy(PayPalUnavailable):
+    """
+    For when calls to PayPal are rejected by the bulkhead because too many
+    are already in flight.
+    """
@@ -0,0 +1,259 @@
+"""
+Streaming export of transactions, eg for reconciliation.
+
+Rows are read in chunks of consecutive IDs and written out as they are read,
+so the memory used doesn't depend on how many transactions are exported.
+The raw payloads aren't exported.  CSV and JSON lines are always available;
+Parquet needs the ``pyarrow`` package (``pip install
+"django-oscar-paypal[export]"``).
+"""
+from __future__ import unicode_literals
+import csv
+import datetime
+import json
+from decimal import Decimal
+
+from django import http
+from django.utils import six, timezone
+from django.utils.dateparse import parse_date
+from django.views import generic
+
+from paypal.express.models import ExpressTransaction
+from paypal.payflow.models import PayflowTransaction
+from paypal.routers import get_dashboard_database
+
+try:
+    import pyarrow
+    from pyarrow import parquet
+except ImportError:
+    pyarrow = None
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+# The columns exported for each model, and the fields filtered on for the
+# call (method or TRXTYPE) and status of a transaction
+EXPORTS = {
+    'express': {
+        'model': ExpressTransaction,
+        'fields': ('id', 'date_created', 'method', 'ack', 'token',
+                   'transaction_id', 'correlation_id', 'amount', 'currency',
+                   'payer_id', 'payer_email', 'basket_id', 'order_number',
+                   'error_code', 'error_message', 'response_time'),
+        'call': 'method',
+        'status': 'ack',
+    },
+    'payflow': {
+        'model': PayflowTransaction,
+        'fields': ('id', 'date_created', 'trxtype', 'result', 'respmsg',
+                   'comment1', 'pnref', 'ppref', 'tender', 'amount',
+                   'authcode', 'cvv2match', 'avsaddr', 'avszip',
+                   'response_time'),
+        'call': 'trxtype',
+        'status': 'result',
+    },
+}
+
+# Columns which aren't stored as strings in Parquet files.  Amounts are
+# stored as strings to keep them exact.
+PARQUET_TYPES = {
+    'id': 'int64',
+    'basket_id': 'int64',
+    'response_time': 'float64',
+}
+
+CHUNK_SIZE = 2000
+
+
+def parse_day(value):
+    """
+    Return the start of a day given as YYYY-MM-DD, in the current time zone,
+    or ``None`` if no day is given.
+    """
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError("Invalid date %r - use YYYY-MM-DD" % value)
+    start = datetime.datetime.combine(day, datetime.time.min)
+    if timezone.is_aware(timezone.now()):
+        start = timezone.make_aware(start, timezone.get_current_timezone())
+    return start
+
+
+def get_queryset(kind, date_from=None, date_to=None, call=None,
+                 status=None):
+    """
+    Return the transactions of a kind (``'express'`` or ``'payflow'``) to
+    export.  ``date_to`` is exclusive.  Exports are read from the dashboard
+    database (eg a replica) if there is one.
+    """
+    export = EXPORTS[kind]
+    queryset = export['model'].objects.using(get_dashboard_database())
+    if date_from:
+        queryset = queryset.filter(date_created__gte=date_from)
+    if date_to:
+        queryset = queryset.filter(date_created__lt=date_to)
+    if call:
+        queryset = queryset.filter(**{export['call']: call})
+    if status:
+        queryset = queryset.filter(**{export['status']: status})
+    return queryset
+
+
+def iter_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    """
+    Yield the values of ``fields`` for each transaction as a tuple, in ID
+    order.
+
+    Each chunk is a separate query for the next IDs, which keeps both the
+    database and the client from holding the whole result set.
+    """
+    fields = list(fields)
+    if fields[0] != 'id':
+        raise ValueError("The first field must be the ID")
+    last_id = 0
+    while True:
+        chunk = (queryset.filter(pk__gt=last_id).order_by('pk')
+                 .values_list(*fields)[:chunk_size])
+        count = 0
+        for row in chunk.iterator():
+            count += 1
+            last_id = row[0]
+            yield row
+        if count < chunk_size:
+            return
+
+
+def _to_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return six.text_type(value)
+
+
+def _to_json(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return six.text_type(value)
+    return value
+
+
+class _Echo(object):
+    # A file-like object which returns what is written to it, so the csv
+    # module can be used to format single rows
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows, fields):
+    """
+    Yield the header and then each row as a line of CSV.
+    """
+    writer = csv.writer(_Echo())
+
+    def line(values):
+        if six.PY2:
+            values = [value.encode('utf8') for value in values]
+            return writer.writerow(values).decode('utf8')
+        return writer.writerow(values)
+
+    yield line(fields)
+    for row in rows:
+        yield line([_to_text(value) for value in row])
+
+
+def iter_jsonl(rows, fields):
+    """
+    Yield each row as a line of JSON.
+    """
+    for row in rows:
+        yield json.dumps(dict(
+            (field, _to_json(value)) for field, value in zip(fields, row)),
+            sort_keys=True) + '\n'
+
+
+def write_parquet(rows, fields, path, chunk_size=CHUNK_SIZE):
+    """
+    Write the rows to a Parquet file, one row group per chunk.  Parquet
+    files can't be streamed, as the file's metadata is written last.
+    """
+    if pyarrow is None:
+        raise RuntimeError(
+            "Exporting to Parquet needs the pyarrow package")
+    types = [pyarrow.type_for_alias(PARQUET_TYPES.get(field, 'string'))
+             for field in fields]
+    schema = pyarrow.schema(list(zip(fields, types)))
+    writer = parquet.ParquetWriter(path, schema)
+    try:
+        for chunk in _chunks(rows, chunk_size):
+            arrays = []
+            for field, arrow_type, column in zip(fields, types, zip(*chunk)):
+                if field not in PARQUET_TYPES:
+                    column = [None if value is None else _to_text(value)
+                              for value in column]
+                arrays.append(pyarrow.array(column, type=arrow_type))
+            writer.write_table(
+                pyarrow.Table.from_arrays(arrays, names=list(fields)))
+    finally:
+        writer.close()
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream(kind, format, chunk_size=CHUNK_SIZE, **filters):
+    """
+    Return an iterator over the lines of a CSV or JSON lines export.
+    """
+    fields = EXPORTS[kind]['fields']
+    rows = iter_rows(get_queryset(kind, **filters), fields, chunk_size)
+    if format == 'csv':
+        return iter_csv(rows, fields)
+    if format == 'jsonl':
+        return iter_jsonl(rows, fields)
+    raise ValueError("Can't stream the %r format" % format)
+
+
+class ExportView(generic.View):
+    """
+    Stream an export as CSV (the default) or JSON lines.  The query string
+    can contain ``format``, ``from`` and ``to`` (YYYY-MM-DD), ``call`` and
+    ``status``.
+    """
+    kind = None
+
+    def get(self, request, *args, **kwargs):
+        fmt = request.GET.get('format', 'csv')
+        if fmt not in CONTENT_TYPES:
+            return http.HttpResponseBadRequest("Unsupported format")
+        try:
+            filters = {
+                'date_from': parse_day(request.GET.get('from')),
+                'date_to': parse_day(request.GET.get('to')),
+                'call': request.GET.get('call'),
+                'status': request.GET.get('status'),
+            }
+        except ValueError as e:
+            return http.HttpResponseBadRequest(six.text_type(e))
+        response = http.StreamingHttpResponse(
+            stream(self.kind, fmt, **filters),
+            content_type=CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = (
+            'attachment; filename="paypal-%s-transactions.%s"' % (
+                self.kind, fmt))
+        return response
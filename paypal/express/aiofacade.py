@@ -0,0 +1,103 @@
+"""
+Asynchronous versions of the :mod:`paypal.express.facade` functions.
+"""
+import asyncio
+import functools
+import weakref
+
+from paypal.aiogateway import _run_blocking, sync_to_async
+from paypal.express import aiogateway, cache, facade
+from paypal.express.gateway import GET_EXPRESS_CHECKOUT
+
+# Concurrent calls for the same method and token share a single call to
+# PayPal, as in the synchronous facade.  Tasks are bound to their event loop,
+# so the calls in flight are kept per loop.
+_in_flight = weakref.WeakKeyDictionary()
+
+
+async def _coalesce(key, coro_fn, *args, **kwargs):
+    loop = asyncio.get_event_loop()
+    calls = _in_flight.setdefault(loop, {})
+    task = calls.get(key)
+    if task is None:
+        task = calls[key] = loop.create_task(coro_fn(*args, **kwargs))
+        task.add_done_callback(lambda task: calls.pop(key, None))
+    # A cancelled caller mustn't cancel the call the others are waiting for
+    return await asyncio.shield(task)
+
+
+async def get_paypal_url(basket, shipping_methods, **kwargs):
+    """
+    Return the URL for a PayPal Express transaction.
+    """
+    set_txn_kwargs = await sync_to_async(facade._get_set_txn_kwargs)(
+        basket, shipping_methods, **kwargs)
+    return await aiogateway.set_txn(**set_txn_kwargs)
+
+
+async def fetch_transaction_details(token, basket_id=None, use_cache=False):
+    """
+    Fetch the completed details about the PayPal transaction.  Concurrent
+    fetches for a token in the event loop share one call to PayPal.
+    """
+    if use_cache:
+        txn = await sync_to_async(cache.get_details)(
+            token, basket_id=basket_id)
+        if txn is not None:
+            return txn
+    txn = await _coalesce((GET_EXPRESS_CHECKOUT, token), aiogateway.get_txn,
+                          token, basket_id=basket_id)
+    await sync_to_async(cache.set_details)(txn)
+    return txn
+
+
+async def confirm_transaction(payer_id, token, amount, currency,
+                              basket_id=None, order_number=None):
+    """
+    Confirm the payment action.
+    """
+    txn, is_leader = await confirm_transaction_once(
+        payer_id, token, amount, currency, basket_id=basket_id,
+        order_number=order_number)
+    return txn
+
+
+async def confirm_transaction_once(payer_id, token, amount, currency,
+                                   basket_id=None, order_number=None):
+    """
+    Confirm the payment action, returning a ``(txn, is_leader)`` tuple as
+    :func:`paypal.express.facade.confirm_transaction_once` does.
+
+    The payment goes through the synchronous facade in the default executor,
+    so it shares the in-process coalescing and ``PAYPAL_EXPRESS_PAYMENT_LOCK``
+    with every other confirmation of the token, sync or async.
+    """
+    return await _run_blocking(functools.partial(
+        facade.confirm_transaction_once, payer_id, token, amount, currency,
+        basket_id=basket_id, order_number=order_number))
+
+
+async def refund_transaction(token, amount, currency, note=None):
+    txn = await sync_to_async(facade._get_payment_txn)(token)
+    is_partial = amount < txn.amount
+    return await aiogateway.refund_txn(
+        txn.transaction_id, is_partial, amount, currency)
+
+
+async def capture_authorization(token, note=None):
+    """
+    Capture a previous authorization.
+    """
+    txn = await sync_to_async(facade._get_payment_txn)(token)
+    return await aiogateway.do_capture(
+        txn.transaction_id, txn.amount, txn.currency,
+        note=note)
+
+
+async def void_authorization(token, note=None):
+    """
+    Void a previous authorization.
+    """
+    txn = await sync_to_async(facade._get_payment_txn)(token)
+    return await aiogateway.do_void(
+        txn.transaction_id, note=note)
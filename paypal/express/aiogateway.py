@@ -0,0 +1,87 @@
+"""
+Asynchronous versions of the :mod:`paypal.express.gateway` functions.
+
+Parameters are built and audit records are saved by the same code as the
+synchronous gateway; only the HTTP call is non-blocking.
+"""
+import logging
+
+from paypal import aiogateway
+from paypal.aiogateway import sync_to_async
+from paypal.express import cache, gateway as sync_gateway
+from paypal.express.gateway import (
+    SET_EXPRESS_CHECKOUT, GET_EXPRESS_CHECKOUT, DO_EXPRESS_CHECKOUT,
+    DO_CAPTURE, DO_VOID, REFUND_TRANSACTION, SALE)
+
+logger = logging.getLogger('paypal.express')
+
+
+async def _fetch_response(method, extra_params, basket_id=None,
+                          order_number=None):
+    """
+    Fetch the response from PayPal and return a transaction object
+    """
+    params = sync_gateway._build_params(method, extra_params)
+    url = sync_gateway._get_api_url()
+    logger.debug("Making async %s request to %s", method, url)
+    response = await aiogateway.post(
+        url, params, policy=sync_gateway._get_call_policy(method))
+    return await sync_to_async(sync_gateway._record_response)(
+        method, params, response, basket_id=basket_id,
+        order_number=order_number)
+
+
+async def set_txn(basket, shipping_methods, currency, return_url, cancel_url,
+                  basket_id=None, **kwargs):
+    """
+    SetExpressCheckout - see :func:`paypal.express.gateway.set_txn`
+    """
+    # Building the params touches the basket lines and offers, which may
+    # hit the database.
+    params = await sync_to_async(sync_gateway._set_txn_params)(
+        basket, shipping_methods, currency, return_url, cancel_url, **kwargs)
+    fingerprint = sync_gateway._fingerprint(params)
+    token = await sync_to_async(cache.get_token)(fingerprint)
+    if token is None:
+        txn = await _fetch_response(SET_EXPRESS_CHECKOUT, params,
+                                    basket_id=basket_id)
+        token = txn.token
+        await sync_to_async(cache.set_token)(fingerprint, token)
+    return sync_gateway._get_checkout_url(token)
+
+
+async def get_txn(token, basket_id=None):
+    """
+    GetExpressCheckoutDetails
+    """
+    return await _fetch_response(GET_EXPRESS_CHECKOUT, {'TOKEN': token},
+                                 basket_id=basket_id)
+
+
+async def do_txn(payer_id, token, amount, currency, action=SALE,
+                 basket_id=None, order_number=None):
+    """
+    DoExpressCheckoutPayment
+    """
+    return await _fetch_response(
+        DO_EXPRESS_CHECKOUT,
+        sync_gateway._do_txn_params(payer_id, token, amount, currency, action),
+        basket_id=basket_id, order_number=order_number)
+
+
+async def do_capture(txn_id, amount, currency, complete_type='Complete',
+                     note=None):
+    return await _fetch_response(
+        DO_CAPTURE, sync_gateway._do_capture_params(
+            txn_id, amount, currency, complete_type, note))
+
+
+async def do_void(txn_id, note=None):
+    return await _fetch_response(
+        DO_VOID, sync_gateway._do_void_params(txn_id, note))
+
+
+async def refund_txn(txn_id, is_partial=False, amount=None, currency=None):
+    return await _fetch_response(
+        REFUND_TRANSACTION, sync_gateway._refund_txn_params(
+            txn_id, is_partial, amount, currency))
@@ -0,0 +1,129 @@
+"""
+Caches of Express Checkout calls, keyed by token.
+
+The success view fetches the transaction details when showing the order
+preview and again when the order is placed, although nothing changes on
+PayPal's side in between.  With the details cache enabled, the details
+fetched for the preview are reused when placing the order, saving a call to
+PayPal (and its audit record).  The details cache is disabled unless the
+``PAYPAL_EXPRESS_DETAILS_CACHE`` setting is defined.
+
+Customers who bounce between the basket and PayPal start a new
+SetExpressCheckout each time, even when nothing in the basket changed.  With
+the token cache enabled (``PAYPAL_EXPRESS_TOKEN_CACHE``), the token for a
+fingerprint of the SetExpressCheckout parameters is reused while it is valid.
+
+Everything cached for a token is dropped when PayPal tells us the payer
+changed their shipping address (the shipping options callback) and once the
+payment is confirmed.
+"""
+from __future__ import unicode_literals
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.encoding import force_bytes
+
+from paypal import archive
+from paypal.express.models import ExpressTransaction
+
+DEFAULTS = {
+    'cache': 'default',
+    'timeout': 300,
+}
+
+# PayPal tokens expire after three hours
+TOKEN_DEFAULTS = {
+    'cache': 'default',
+    'timeout': 3600,
+}
+
+
+def _get_config(setting='PAYPAL_EXPRESS_DETAILS_CACHE', defaults=DEFAULTS):
+    config = getattr(settings, setting, None)
+    if config is None:
+        return None
+    return dict(defaults, **config)
+
+
+def _get_token_config():
+    return _get_config('PAYPAL_EXPRESS_TOKEN_CACHE', TOKEN_DEFAULTS)
+
+
+def _key(value, kind='details'):
+    return 'paypal:%s:%s' % (
+        kind, hashlib.md5(force_bytes(value)).hexdigest())
+
+
+def get_details(token, basket_id=None):
+    """
+    Return the cached GetExpressCheckoutDetails transaction for a token, or
+    ``None``.  If a basket ID is given, only a transaction for that basket is
+    returned.
+    """
+    config = _get_config()
+    if config is None or not token:
+        return None
+    document = caches[config['cache']].get(_key(token))
+    if document is None:
+        return None
+    txn = archive.deserialize(ExpressTransaction, document)
+    if basket_id is not None and txn.basket_id != int(basket_id):
+        return None
+    return txn
+
+
+def set_details(txn):
+    """
+    Cache a GetExpressCheckoutDetails transaction.
+    """
+    config = _get_config()
+    if config is None or not txn.token:
+        return
+    caches[config['cache']].set(
+        _key(txn.token), archive.serialize(txn), config['timeout'])
+
+
+def get_token(fingerprint):
+    """
+    Return the cached token for a fingerprint of the SetExpressCheckout
+    parameters, or ``None``.
+    """
+    config = _get_token_config()
+    if config is None:
+        return None
+    return caches[config['cache']].get(_key(fingerprint, 'token'))
+
+
+def set_token(fingerprint, token):
+    """
+    Cache the token returned by SetExpressCheckout for a fingerprint of its
+    parameters.
+    """
+    config = _get_token_config()
+    if config is None or not token:
+        return
+    cache = caches[config['cache']]
+    cache.set_many({
+        _key(fingerprint, 'token'): token,
+        # So the token can be dropped by invalidate()
+        _key(token, 'fingerprint'): fingerprint,
+    }, config['timeout'])
+
+
+def invalidate(token):
+    """
+    Drop everything cached for a token.
+    """
+    if not token:
+        return
+    config = _get_config()
+    if config is not None:
+        caches[config['cache']].delete(_key(token))
+    config = _get_token_config()
+    if config is not None:
+        cache = caches[config['cache']]
+        fingerprint_key = _key(token, 'fingerprint')
+        fingerprint = cache.get(fingerprint_key)
+        if fingerprint is not None:
+            cache.delete_many([_key(fingerprint, 'token'), fingerprint_key])
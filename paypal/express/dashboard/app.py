@@ -10,6 +10,7 @@ class ExpressDashboardApplication(Application):
     name = None
     list_view = views.TransactionListView
     detail_view = views.TransactionDetailView
+    export_view = views.TransactionExportView
 
     def get_urls(self):
         urlpatterns = patterns('',
@@ -17,6 +18,8 @@ class ExpressDashboardApplication(Application):
                 name='paypal-express-list'),
             url(r'^transactions/(?P<pk>\d+)/$', self.detail_view.as_view(),
                 name='paypal-express-detail'),
+            url(r'^transactions/export/$', self.export_view.as_view(),
+                name='paypal-express-export'),
         )
         return self.post_process_urls(urlpatterns)
 
@@ -1,7 +1,10 @@
 from django.views import generic
 from django.conf import settings
+from django import http
 
+from paypal import archive, export
 from paypal.express import models
+from paypal.routers import get_dashboard_database
 
 
 class TransactionListView(generic.ListView):
@@ -9,14 +12,36 @@ class TransactionListView(generic.ListView):
     template_name = 'paypal/express/dashboard/transaction_list.html'
     context_object_name = 'transactions'
 
+    def get_queryset(self):
+        return super(TransactionListView, self).get_queryset().using(
+            get_dashboard_database())
+
 
 class TransactionDetailView(generic.DetailView):
     model = models.ExpressTransaction
     template_name = 'paypal/express/dashboard/transaction_detail.html'
     context_object_name = 'txn'
 
+    def get_queryset(self):
+        return super(TransactionDetailView, self).get_queryset().using(
+            get_dashboard_database())
+
+    def get_object(self, queryset=None):
+        try:
+            return super(TransactionDetailView, self).get_object(queryset)
+        except http.Http404:
+            # Fall back to the archive for old transactions
+            txn = archive.get_archived(self.model, self.kwargs['pk'])
+            if txn is None:
+                raise
+            return txn
+
     def get_context_data(self, **kwargs):
         ctx = super(TransactionDetailView, self).get_context_data(**kwargs)
         ctx['show_form_buttons'] = getattr(
             settings, 'PAYPAL_PAYFLOW_DASHBOARD_FORMS', False)
         return ctx
+
+
+class TransactionExportView(export.ExportView):
+    kind = 'express'
@@ -2,17 +2,35 @@
 Responsible for briding between Oscar and the PayPal gateway
 """
 from __future__ import unicode_literals
+import functools
+
 from django.core.urlresolvers import reverse
 from django.contrib.sites.models import Site
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
 
+from paypal import archive, audit, singleflight
+from paypal.express import cache
 from paypal.express.models import ExpressTransaction as Transaction
 from paypal.express.gateway import (
     set_txn, get_txn, do_txn, SALE, AUTHORIZATION, ORDER,
-    do_capture, DO_EXPRESS_CHECKOUT, do_void, refund_txn
+    do_capture, DO_EXPRESS_CHECKOUT, GET_EXPRESS_CHECKOUT, do_void, refund_txn,
+    _get_call_policy
 )
 
+# Concurrent calls for the same method and token share a single call to
+# PayPal
+_in_flight = singleflight.Group()
+
+PAYMENT_LOCK_DEFAULTS = {
+    'cache': 'default',
+    'result_timeout': 3600,
+}
+
+# Seconds the payment lock is held for beyond the deadline of the call, so it
+# can't expire while the call is still in progress
+PAYMENT_LOCK_MARGIN = 30
+
 
 def _get_payment_action():
     # PayPal supports 3 actions: 'Sale', 'Authorization', 'Order'
@@ -33,6 +51,18 @@ def get_paypal_url(basket, shipping_methods, user=None, shipping_address=None,
     given to PayPal directly - this is used within when using PayPal as a
     payment method.
     """
+    return set_txn(**_get_set_txn_kwargs(
+        basket, shipping_methods, user=user,
+        shipping_address=shipping_address, shipping_method=shipping_method,
+        host=host, scheme=scheme, paypal_params=paypal_params))
+
+
+def _get_set_txn_kwargs(basket, shipping_methods, user=None,
+                        shipping_address=None, shipping_method=None,
+                        host=None, scheme=None, paypal_params=None):
+    """
+    Return the keyword arguments to pass to ``set_txn`` for a basket.
+    """
     if basket.currency:
         currency = basket.currency
     else:
@@ -71,50 +101,119 @@ def get_paypal_url(basket, shipping_methods, user=None, shipping_address=None,
         if len(addresses):
             address = addresses[0]
 
-    return set_txn(basket=basket,
-                   shipping_methods=shipping_methods,
-                   currency=currency,
-                   return_url=return_url,
-                   cancel_url=cancel_url,
-                   update_url=update_url,
-                   action=_get_payment_action(),
-                   shipping_method=shipping_method,
-                   shipping_address=shipping_address,
-                   user=user,
-                   user_address=address,
-                   no_shipping=no_shipping,
-                   paypal_params=paypal_params)
-
-
-def fetch_transaction_details(token):
+    return dict(basket=basket,
+                shipping_methods=shipping_methods,
+                currency=currency,
+                return_url=return_url,
+                cancel_url=cancel_url,
+                update_url=update_url,
+                action=_get_payment_action(),
+                shipping_method=shipping_method,
+                shipping_address=shipping_address,
+                user=user,
+                user_address=address,
+                no_shipping=no_shipping,
+                paypal_params=paypal_params,
+                basket_id=basket.id)
+
+
+def fetch_transaction_details(token, basket_id=None, use_cache=False):
     """
     Fetch the completed details about the PayPal transaction.
+
+    If the details cache is enabled (see :mod:`paypal.express.cache`), the
+    fetched details are cached, and with ``use_cache`` the cached details for
+    the token are returned instead of calling PayPal again.
+    """
+    if use_cache:
+        txn = cache.get_details(token, basket_id=basket_id)
+        if txn is not None:
+            return txn
+    txn = _in_flight.do((GET_EXPRESS_CHECKOUT, token), get_txn, token,
+                        basket_id=basket_id)
+    cache.set_details(txn)
+    return txn
+
+
+def confirm_transaction(payer_id, token, amount, currency, basket_id=None,
+                        order_number=None):
     """
-    return get_txn(token)
+    Confirm the payment action.  The basket ID and order number are stored on
+    the transaction for reconciliation.
+
+    Concurrent confirmations of a token share one call to PayPal.  With the
+    ``PAYPAL_EXPRESS_PAYMENT_LOCK`` setting, this also holds across processes
+    and nodes, and later confirmations return the stored transaction.  Use
+    :func:`confirm_transaction_once` to tell whether this confirmation was
+    the one which called PayPal.
+    """
+    return confirm_transaction_once(
+        payer_id, token, amount, currency, basket_id=basket_id,
+        order_number=order_number)[0]
 
 
-def confirm_transaction(payer_id, token, amount, currency):
+def confirm_transaction_once(payer_id, token, amount, currency,
+                             basket_id=None, order_number=None):
+    """
+    Confirm the payment action as :func:`confirm_transaction` does, and
+    return a ``(txn, is_leader)`` tuple.  ``is_leader`` is only true for the
+    confirmation which called PayPal, so only that one should place an order.
+    """
+    confirm = functools.partial(
+        do_txn, payer_id, token, amount, currency,
+        action=_get_payment_action(), basket_id=basket_id,
+        order_number=order_number)
+    (txn, made_call), is_leader = _in_flight.call(
+        (DO_EXPRESS_CHECKOUT, token), _confirm_once, token, confirm)
+    cache.invalidate(token)
+    return txn, is_leader and made_call
+
+
+def _get_payment_lock_config():
+    config = getattr(settings, 'PAYPAL_EXPRESS_PAYMENT_LOCK', None)
+    if config is None:
+        return None
+    config = dict(PAYMENT_LOCK_DEFAULTS, **config)
+    # The lock must outlive the call, however it is configured, and other
+    # confirmations wait for as long as it may be held
+    min_lock_timeout = (int(_get_call_policy(DO_EXPRESS_CHECKOUT).deadline) +
+                        PAYMENT_LOCK_MARGIN)
+    config['lock_timeout'] = max(config.get('lock_timeout', 0),
+                                 min_lock_timeout)
+    config['wait'] = max(config.get('wait', 0), config['lock_timeout'])
+    return config
+
+
+def _confirm_once(token, confirm):
+    config = _get_payment_lock_config()
+    if config is None:
+        return confirm(), True
+    return singleflight.exclusive(
+        '%s:%s' % (DO_EXPRESS_CHECKOUT, token), confirm,
+        dump=archive.serialize,
+        load=functools.partial(archive.deserialize, Transaction), **config)
+
+
+def _get_payment_txn(token):
     """
-    Confirm the payment action.
+    Return the DoExpressCheckoutPayment transaction for a token.
     """
-    return do_txn(payer_id, token, amount, currency,
-                  action=_get_payment_action())
+    audit.flush()
+    return Transaction.objects.get(token=token, method=DO_EXPRESS_CHECKOUT)
 
 
 def refund_transaction(token, amount, currency, note=None):
-    txn = Transaction.objects.get(token=token,
-                                  method=DO_EXPRESS_CHECKOUT)
+    txn = _get_payment_txn(token)
     is_partial = amount < txn.amount
-    return refund_txn(txn.value('PAYMENTINFO_0_TRANSACTIONID'), is_partial, amount, currency)
+    return refund_txn(txn.transaction_id, is_partial, amount, currency)
 
 
 def capture_authorization(token, note=None):
     """
     Capture a previous authorization.
     """
-    txn = Transaction.objects.get(token=token,
-                                  method=DO_EXPRESS_CHECKOUT)
-    return do_capture(txn.value('PAYMENTINFO_0_TRANSACTIONID'),
+    txn = _get_payment_txn(token)
+    return do_capture(txn.transaction_id,
                       txn.amount, txn.currency, note=note)
 
 
@@ -122,6 +221,5 @@ def void_authorization(token, note=None):
     """
     Void a previous authorization.
     """
-    txn = Transaction.objects.get(token=token,
-                                  method=DO_EXPRESS_CHECKOUT)
-    return do_void(txn.value('PAYMENTINFO_0_TRANSACTIONID'), note=note)
+    txn = _get_payment_txn(token)
+    return do_void(txn.transaction_id, note=note)
@@ -1,17 +1,20 @@
 from __future__ import unicode_literals
+import hashlib
+import json
 import logging
 from decimal import Decimal as D
 
 from django.conf import settings
 from django.core.exceptions import ImproperlyConfigured
+from django.utils.encoding import force_bytes
 from django.utils.http import urlencode
 from django.utils import six
 from django.utils.translation import ugettext as _
 from django.template.defaultfilters import truncatewords, striptags
 from localflavor.us import us_states
 
-from . import models, exceptions as express_exceptions
-from paypal import gateway
+from . import cache, models, exceptions as express_exceptions
+from paypal import audit, gateway, metrics, singleflight
 from paypal import exceptions
 
 
@@ -25,12 +28,20 @@ REFUND_TRANSACTION = 'RefundTransaction'
 
 SALE, AUTHORIZATION, ORDER = 'Sale', 'Authorization', 'Order'
 
+# Methods which only read from PayPal and so are safe to retry.  Calls that
+# move money are never retried automatically.
+RETRYABLE_METHODS = (GET_EXPRESS_CHECKOUT,)
+
 # The latest version of the PayPal Express API can be found here:
 # https://developer.paypal.com/docs/classic/release-notes/
 API_VERSION = getattr(settings, 'PAYPAL_API_VERSION', '119')
 
 logger = logging.getLogger('paypal.express')
 
+# Concurrent SetExpressCheckout calls with the same parameters share a single
+# call to PayPal
+_in_flight = singleflight.Group()
+
 
 def _format_description(description):
     if description:
@@ -42,11 +53,43 @@ def _format_currency(amt):
     return amt.quantize(D('0.01'))
 
 
-def _fetch_response(method, extra_params):
+def _fetch_response(method, extra_params, basket_id=None, order_number=None):
     """
-    Fetch the response from PayPal and return a transaction object
+    Fetch the response from PayPal and return a transaction object.  The
+    basket ID and order number, if known, are stored on the transaction.
+    """
+    params = _build_params(method, extra_params)
+    url = _get_api_url()
+
+    # Log the request for debugging, with the credentials masked as they are
+    # in the audit record
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Making %s request to %s with params: %s", method, url,
+                     gateway.encode(params)[1])
+
+    # Make HTTP request
+    response = gateway.post(url, params, policy=_get_call_policy(method))
+
+    return _record_response(method, params, response, basket_id=basket_id,
+                            order_number=order_number)
+
+
+def _get_call_policy(method):
+    """
+    Return the timeouts and retry budget for a method.  These can be
+    customised per method with the PAYPAL_HTTP_POLICIES setting.
+    """
+    if method in RETRYABLE_METHODS:
+        return gateway.get_call_policy(method, {'retries': 2})
+    policy = gateway.get_call_policy(method)
+    policy.retries = 0
+    return policy
+
+
+def _build_params(method, extra_params):
+    """
+    Build the full parameter dict for a call, including credentials
     """
-    # Build parameter string
     params = {
         'METHOD': method,
         'VERSION': API_VERSION,
@@ -55,55 +98,76 @@ def _fetch_response(method, extra_params):
         'SIGNATURE': settings.PAYPAL_API_SIGNATURE,
     }
     params.update(extra_params)
+    return params
 
+
+def _get_api_url():
+    # An explicit URL (eg of a local simulator) takes precedence
+    url = getattr(settings, 'PAYPAL_API_URL', None)
+    if url:
+        return url
     if getattr(settings, 'PAYPAL_SANDBOX_MODE', True):
-        url = 'https://api-3t.sandbox.paypal.com/nvp'
-    else:
-        url = 'https://api-3t.paypal.com/nvp'
+        return 'https://api-3t.sandbox.paypal.com/nvp'
+    return 'https://api-3t.paypal.com/nvp'
 
-    # Print easy-to-read version of params for debugging
-    param_str = "\n".join(["%s: %s" % x for x in sorted(params.items())])
-    logger.debug("Making %s request to %s with params:\n%s", method, url,
-                 param_str)
 
-    # Make HTTP request
-    pairs = gateway.post(url, params)
+def _record_response(method, params, response, basket_id=None,
+                     order_number=None):
+    """
+    Save an audit record of the call and return it, raising a PayPalError if
+    PayPal reported a failure.
 
-    pairs_str = "\n".join(["%s: %s" % x for x in sorted(pairs.items())
-                           if not x[0].startswith('_')])
-    logger.debug("Response with params:\n%s", pairs_str)
+    :response: The :class:`paypal.nvp.NVPResponse` returned by the transport.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        response_str = "\n".join(
+            ["%s: %s" % x for x in sorted(response.items())])
+        logger.debug("Response with params:\n%s", response_str)
 
     # Record transaction data - we save this model whether the txn
     # was successful or not
     txn = models.ExpressTransaction(
         method=method,
         version=API_VERSION,
-        ack=pairs['ACK'],
-        raw_request=pairs['_raw_request'],
-        raw_response=pairs['_raw_response'],
-        response_time=pairs['_response_time'],
+        ack=response['ACK'],
+        raw_request=response.raw_request,
+        raw_response=response.raw_response,
+        response_time=response.response_time,
+        basket_id=basket_id,
+        order_number=order_number,
     )
     if txn.is_successful:
-        txn.correlation_id = pairs['CORRELATIONID']
+        txn.correlation_id = response['CORRELATIONID']
+        txn.payer_id = response.get('PAYERID') or params.get('PAYERID')
+        txn.payer_email = response.get('EMAIL')
+        txn.transaction_id = (
+            response.get('PAYMENTINFO_0_TRANSACTIONID') or
+            response.get('TRANSACTIONID') or
+            response.get('REFUNDTRANSACTIONID'))
         if method == SET_EXPRESS_CHECKOUT:
             txn.amount = params['PAYMENTREQUEST_0_AMT']
             txn.currency = params['PAYMENTREQUEST_0_CURRENCYCODE']
-            txn.token = pairs['TOKEN']
+            txn.token = response['TOKEN']
         elif method == GET_EXPRESS_CHECKOUT:
             txn.token = params['TOKEN']
-            txn.amount = D(pairs['PAYMENTREQUEST_0_AMT'])
-            txn.currency = pairs['PAYMENTREQUEST_0_CURRENCYCODE']
+            txn.amount = response.amount('PAYMENTREQUEST_0_AMT')
+            txn.currency = response['PAYMENTREQUEST_0_CURRENCYCODE']
         elif method == DO_EXPRESS_CHECKOUT:
             txn.token = params['TOKEN']
-            txn.amount = D(pairs['PAYMENTINFO_0_AMT'])
-            txn.currency = pairs['PAYMENTINFO_0_CURRENCYCODE']
+            txn.amount = response.amount('PAYMENTINFO_0_AMT')
+            txn.currency = response['PAYMENTINFO_0_CURRENCYCODE']
     else:
-        # There can be more than one error, each with its own number.
-        if 'L_ERRORCODE0' in pairs:
-            txn.error_code = pairs['L_ERRORCODE0']
-        if 'L_LONGMESSAGE0' in pairs:
-            txn.error_message = pairs['L_LONGMESSAGE0']
-    txn.save()
+        # There can be more than one error, each with its own number.  We
+        # record the first.
+        error_codes = response.indexed('L_ERRORCODE')
+        if error_codes:
+            txn.error_code = error_codes[0]
+        messages = response.indexed('L_LONGMESSAGE')
+        if messages:
+            txn.error_message = messages[0]
+    metrics.call_succeeded(method, txn.ack, txn.error_code,
+                           response.response_time / 1000.0)
+    audit.record(txn, call=method, successful=txn.is_successful)
 
     if not txn.is_successful:
         msg = "Error %s - %s" % (txn.error_code, txn.error_message)
@@ -115,13 +179,66 @@ def _fetch_response(method, extra_params):
 
 def set_txn(basket, shipping_methods, currency, return_url, cancel_url, update_url=None,
             action=SALE, user=None, user_address=None, shipping_method=None,
-            shipping_address=None, no_shipping=False, paypal_params=None):
+            shipping_address=None, no_shipping=False, paypal_params=None,
+            basket_id=None):
     """
     Register the transaction with PayPal to get a token which we use in the
     redirect URL.  This is the 'SetExpressCheckout' from their documentation.
 
     There are quite a few options that can be passed to PayPal to configure
-    this request - most are controlled by PAYPAL_* settings.
+    this request - most are controlled by PAYPAL_* settings.  The basket ID is
+    only stored on the transaction.
+
+    If the token cache is enabled (see :mod:`paypal.express.cache`), a token
+    registered with exactly the same parameters is reused while it is valid.
+    """
+    params = _set_txn_params(
+        basket, shipping_methods, currency, return_url, cancel_url,
+        update_url=update_url, action=action, user=user,
+        user_address=user_address, shipping_method=shipping_method,
+        shipping_address=shipping_address, no_shipping=no_shipping,
+        paypal_params=paypal_params)
+    return _get_checkout_url(get_token(params, basket_id=basket_id))
+
+
+def get_token(params, basket_id=None):
+    """
+    Return a token for the SetExpressCheckout parameters - a cached one if
+    the token cache is enabled and has one, otherwise a new one.  Concurrent
+    calls for the same parameters (eg a redirect while the token is being
+    registered in advance) share a single call to PayPal.
+    """
+    fingerprint = _fingerprint(params)
+    token = cache.get_token(fingerprint)
+    if token is not None:
+        logger.info("Reusing token %s for basket #%s", token, basket_id)
+        return token
+    txn = _in_flight.do(fingerprint, _fetch_response, SET_EXPRESS_CHECKOUT,
+                        params, basket_id=basket_id)
+    cache.set_token(fingerprint, txn.token)
+    return txn.token
+
+
+def _fingerprint(params):
+    """
+    Return a fingerprint of the SetExpressCheckout parameters (the lines,
+    discounts, shipping, URLs and so on) and the account and API they are
+    sent to.
+    """
+    pairs = sorted((key, six.text_type(value))
+                   for key, value in params.items())
+    pairs += [('API_URL', _get_api_url()), ('VERSION', API_VERSION),
+              ('USER', settings.PAYPAL_API_USERNAME)]
+    return hashlib.sha256(force_bytes(json.dumps(pairs))).hexdigest()
+
+
+def _set_txn_params(basket, shipping_methods, currency, return_url,
+                    cancel_url, update_url=None, action=SALE, user=None,
+                    user_address=None, shipping_method=None,
+                    shipping_address=None, no_shipping=False,
+                    paypal_params=None):
+    """
+    Build the SetExpressCheckout parameters for a basket
     """
     # Default parameters (taken from global settings).  These can be overridden
     # and customised using the paypal_params parameter.
@@ -339,38 +456,52 @@ def set_txn(basket, shipping_methods, currency, return_url, cancel_url, update_u
     params['PAYMENTREQUEST_0_AMT'] = _format_currency(
         params['PAYMENTREQUEST_0_AMT'])
 
-    txn = _fetch_response(SET_EXPRESS_CHECKOUT, params)
+    return params
 
-    # Construct return URL
-    if getattr(settings, 'PAYPAL_SANDBOX_MODE', True):
-        url = 'https://www.sandbox.paypal.com/webscr'
-    else:
-        url = 'https://www.paypal.com/webscr'
+
+def _get_checkout_url(token):
+    """
+    Return the PayPal URL to redirect the customer to for the given token
+    """
+    url = getattr(settings, 'PAYPAL_CHECKOUT_URL', None)
+    if not url:
+        if getattr(settings, 'PAYPAL_SANDBOX_MODE', True):
+            url = 'https://www.sandbox.paypal.com/webscr'
+        else:
+            url = 'https://www.paypal.com/webscr'
     params = (('cmd', '_express-checkout'),
-              ('token', txn.token),)
+              ('token', token),)
     return '%s?%s' % (url, urlencode(params))
 
 
-def get_txn(token):
+def get_txn(token, basket_id=None):
     """
     Fetch details of a transaction from PayPal using the token as
     an identifier.
     """
-    return _fetch_response(GET_EXPRESS_CHECKOUT, {'TOKEN': token})
+    return _fetch_response(GET_EXPRESS_CHECKOUT, {'TOKEN': token},
+                           basket_id=basket_id)
 
 
-def do_txn(payer_id, token, amount, currency, action=SALE):
+def do_txn(payer_id, token, amount, currency, action=SALE, basket_id=None,
+           order_number=None):
     """
     DoExpressCheckoutPayment
     """
-    params = {
+    return _fetch_response(
+        DO_EXPRESS_CHECKOUT,
+        _do_txn_params(payer_id, token, amount, currency, action),
+        basket_id=basket_id, order_number=order_number)
+
+
+def _do_txn_params(payer_id, token, amount, currency, action=SALE):
+    return {
         'PAYERID': payer_id,
         'TOKEN': token,
         'PAYMENTREQUEST_0_AMT': amount,
         'PAYMENTREQUEST_0_CURRENCYCODE': currency,
         'PAYMENTREQUEST_0_PAYMENTACTION': action,
     }
-    return _fetch_response(DO_EXPRESS_CHECKOUT, params)
 
 
 def do_capture(txn_id, amount, currency, complete_type='Complete',
@@ -380,6 +511,13 @@ def do_capture(txn_id, amount, currency, complete_type='Complete',
 
     See https://cms.paypal.com/uk/cgi-bin/?&cmd=_render-content&content_ID=developer/e_howto_api_soap_r_DoCapture
     """
+    return _fetch_response(
+        DO_CAPTURE,
+        _do_capture_params(txn_id, amount, currency, complete_type, note))
+
+
+def _do_capture_params(txn_id, amount, currency, complete_type='Complete',
+                       note=None):
     params = {
         'AUTHORIZATIONID': txn_id,
         'AMT': amount,
@@ -388,21 +526,31 @@ def do_capture(txn_id, amount, currency, complete_type='Complete',
     }
     if note:
         params['NOTE'] = note
-    return _fetch_response(DO_CAPTURE, params)
+    return params
 
 
 def do_void(txn_id, note=None):
+    return _fetch_response(DO_VOID, _do_void_params(txn_id, note))
+
+
+def _do_void_params(txn_id, note=None):
     params = {
         'AUTHORIZATIONID': txn_id,
     }
     if note:
         params['NOTE'] = note
-    return _fetch_response(DO_VOID, params)
+    return params
 
 
 FULL_REFUND = 'Full'
 PARTIAL_REFUND = 'Partial'
 def refund_txn(txn_id, is_partial=False, amount=None, currency=None):
+    return _fetch_response(
+        REFUND_TRANSACTION,
+        _refund_txn_params(txn_id, is_partial, amount, currency))
+
+
+def _refund_txn_params(txn_id, is_partial=False, amount=None, currency=None):
     params = {
         'TRANSACTIONID': txn_id,
         'REFUNDTYPE': PARTIAL_REFUND if is_partial else FULL_REFUND,
@@ -410,4 +558,4 @@ def refund_txn(txn_id, is_partial=False, amount=None, currency=None):
     if is_partial:
         params['AMT'] = amount
         params['CURRENCYCODE'] = currency
-    return _fetch_response(REFUND_TRANSACTION, params)
+    return params
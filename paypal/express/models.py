@@ -1,5 +1,4 @@
 from __future__ import unicode_literals
-import re
 
 from django.db import models
 from django.utils.encoding import python_2_unicode_compatible
@@ -26,16 +25,27 @@ class ExpressTransaction(base.ResponseModel):
     correlation_id = models.CharField(max_length=32, null=True, blank=True)
     token = models.CharField(max_length=32, null=True, blank=True)
 
+    # Key values from the request and response, stored so that transactions
+    # can be looked up and reconciled without parsing the raw response
+    transaction_id = models.CharField(max_length=32, null=True, blank=True,
+                                      db_index=True)
+    payer_id = models.CharField(max_length=32, null=True, blank=True,
+                                db_index=True)
+    payer_email = models.EmailField(max_length=254, null=True, blank=True,
+                                   db_index=True)
+    basket_id = models.PositiveIntegerField(null=True, blank=True,
+                                            db_index=True)
+    order_number = models.CharField(max_length=128, null=True, blank=True,
+                                    db_index=True)
+
     error_code = models.CharField(max_length=32, null=True, blank=True)
     error_message = models.CharField(max_length=256, null=True, blank=True)
 
     class Meta:
         ordering = ('-date_created',)
         app_label = 'paypal'
-
-    def save(self, *args, **kwargs):
-        self.raw_request = re.sub(r'PWD=\d+&', 'PWD=XXXXXX&', self.raw_request)
-        return super(ExpressTransaction, self).save(*args, **kwargs)
+        # The facade looks up transactions by token and method
+        index_together = [('token', 'method')]
 
     @property
     def is_successful(self):
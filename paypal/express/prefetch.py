@@ -0,0 +1,144 @@
+"""
+Registering Express Checkout tokens in advance.
+
+Redirecting to PayPal waits for SetExpressCheckout.  With the
+``PAYPAL_EXPRESS_PREFETCH`` setting defined, rendering the basket page with
+the ``paypal_prefetch_token`` template tag starts SetExpressCheckout for the
+basket in a background thread.  The token is stored in the token cache (see
+:mod:`paypal.express.cache`) under a fingerprint of the SetExpressCheckout
+parameters, so if the basket is unchanged when the customer clicks the PayPal
+button, the redirect needs no call to PayPal.
+
+Each customer can only cause ``rate_limit`` tokens to be registered in
+advance every ``rate_period`` seconds, so browsing doesn't cause a flood of
+calls to PayPal.
+"""
+from __future__ import unicode_literals
+import hashlib
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.utils.encoding import force_bytes
+from oscar.core.compat import user_is_authenticated
+
+from paypal.exceptions import PayPalError
+from paypal.express import cache, facade, gateway
+from paypal.express.exceptions import InvalidBasket
+
+logger = logging.getLogger('paypal.express')
+
+DEFAULTS = {
+    'cache': 'default',
+    'rate_limit': 5,
+    'rate_period': 3600,
+}
+
+
+def _get_config():
+    config = getattr(settings, 'PAYPAL_EXPRESS_PREFETCH', None)
+    if config is None:
+        return None
+    return dict(DEFAULTS, **config)
+
+
+def _get_customer_key(request):
+    if user_is_authenticated(request.user):
+        return 'user:%s' % request.user.pk
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return 'session:%s' % session.session_key
+
+
+def _rate_key(customer_key):
+    return 'paypal:prefetch:%s' % hashlib.md5(
+        force_bytes(customer_key)).hexdigest()
+
+
+def is_limited(customer_key, config):
+    """
+    Return whether a customer has used up their rate limit, without counting
+    a token against it.
+    """
+    rate_cache = caches[config['cache']]
+    return rate_cache.get(_rate_key(customer_key), 0) >= config['rate_limit']
+
+
+def is_allowed(customer_key, config):
+    """
+    Count a token registered in advance for a customer, and return whether
+    they are still within the rate limit.
+    """
+    rate_cache = caches[config['cache']]
+    key = _rate_key(customer_key)
+    rate_cache.add(key, 0, config['rate_period'])
+    try:
+        count = rate_cache.incr(key)
+    except ValueError:
+        # The counter expired since it was added
+        rate_cache.set(key, 1, config['rate_period'])
+        count = 1
+    return count <= config['rate_limit']
+
+
+def prefetch(request, basket, view_class=None):
+    """
+    Start registering a token for the basket in the background, using the
+    same parameters as a redirect by ``view_class`` (by default
+    :class:`paypal.express.views.RedirectView`).  Return the thread, or
+    ``None`` if no token is registered.
+    """
+    config = _get_config()
+    if config is None or basket.is_empty:
+        return None
+    if cache._get_token_config() is None:
+        logger.warning("Prefetching tokens needs PAYPAL_EXPRESS_TOKEN_CACHE")
+        return None
+    # Checked first, so customers over their limit cost nothing
+    customer_key = _get_customer_key(request)
+    if customer_key is None or is_limited(customer_key, config):
+        return None
+
+    if view_class is None:
+        from paypal.express.views import RedirectView as view_class
+    view = view_class()
+    view.request = request
+    view.args, view.kwargs = (), {}
+
+    # The parameters are built here, as they read the basket and the
+    # database; the thread only makes the call to PayPal
+    set_txn_kwargs = facade._get_set_txn_kwargs(
+        **view._get_paypal_url_kwargs(basket))
+    basket_id = set_txn_kwargs.pop('basket_id')
+    try:
+        params = gateway._set_txn_params(**set_txn_kwargs)
+    except InvalidBasket:
+        # The redirect will tell the customer what is wrong
+        return None
+    if cache.get_token(gateway._fingerprint(params)) is not None:
+        return None
+    if not is_allowed(customer_key, config):
+        return None
+
+    thread = threading.Thread(target=_register, args=(params, basket_id),
+                              name='paypal-prefetch')
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+def _register(params, basket_id):
+    try:
+        gateway.get_token(params, basket_id=basket_id)
+    except PayPalError as e:
+        logger.warning("Unable to register a token for basket #%s in "
+                       "advance: %s", basket_id, e)
+    except Exception:
+        logger.exception("Unable to register a token for basket #%s in "
+                         "advance", basket_id)
+    finally:
+        # Connections are per thread, so this only closes this thread's
+        for connection in connections.all():
+            connection.close()
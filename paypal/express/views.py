@@ -1,6 +1,10 @@
 from __future__ import unicode_literals
 from decimal import Decimal as D
 import logging
+import os
+import sys
+import threading
+import time
 
 from django.views.generic import RedirectView, View
 from django.conf import settings
@@ -14,9 +18,11 @@ from django.utils.http import urlencode
 from django.utils import six
 from django.utils.translation import ugettext_lazy as _
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import close_old_connections
+from django.utils.six.moves import queue
 
 import oscar
-from oscar.apps.payment.exceptions import UnableToTakePayment
+from oscar.apps.payment.exceptions import RedirectRequired, UnableToTakePayment
 from oscar.core.exceptions import ModuleNotFoundError
 from oscar.core.loading import get_class, get_model
 from oscar.apps.shipping.methods import FixedPrice, NoShippingRequired
@@ -24,8 +30,10 @@ from oscar.core.compat import user_is_authenticated
 
 from home.views import send_email_to_admin
 
+from paypal import audit
+from paypal.express import cache
 from paypal.express.facade import (
-    get_paypal_url, fetch_transaction_details, confirm_transaction)
+    get_paypal_url, fetch_transaction_details, confirm_transaction_once)
 from paypal.express.exceptions import (
     EmptyBasketException, MissingShippingAddressException,
     MissingShippingMethodException, InvalidBasket)
@@ -56,6 +64,48 @@ except ModuleNotFoundError:
 
 logger = logging.getLogger('paypal.express')
 
+# Seconds a duplicate submission waits for the order to be placed by the
+# request which took the payment
+ORDER_PLACEMENT_WAIT = 10
+
+# Worker threads for PAYPAL_EXPRESS_CONCURRENT_FETCH.  At most this many
+# fetches run at once, with as many again queued; beyond that, requests fetch
+# on their own thread.
+FETCH_WORKERS = 4
+
+_fetch_queue = None
+_fetch_pid = None
+_fetch_lock = threading.Lock()
+
+
+def _get_fetch_queue():
+    # Threads don't survive a fork, so each process starts its own workers
+    global _fetch_queue, _fetch_pid
+    pid = os.getpid()
+    if _fetch_queue is None or _fetch_pid != pid:
+        with _fetch_lock:
+            if _fetch_queue is None or _fetch_pid != pid:
+                fetch_queue = queue.Queue(maxsize=FETCH_WORKERS)
+                for index in range(FETCH_WORKERS):
+                    worker = threading.Thread(
+                        target=_run_fetches, args=(fetch_queue,),
+                        name='paypal-fetch-%d' % index)
+                    worker.daemon = True
+                    worker.start()
+                _fetch_queue, _fetch_pid = fetch_queue, pid
+    return _fetch_queue
+
+
+def _run_fetches(fetch_queue):
+    while True:
+        fn, done = fetch_queue.get()
+        try:
+            fn()
+        finally:
+            # As at the end of a request, so CONN_MAX_AGE is honoured
+            close_old_connections()
+            done.set()
+
 
 class RedirectView(CheckoutSessionMixin, RedirectView):
     """
@@ -77,7 +127,7 @@ class RedirectView(CheckoutSessionMixin, RedirectView):
             url = self._get_redirect_url(basket, **kwargs)
         except PayPalError as ppe:
             messages.error(
-                self.request, ppe.message)
+                self.request, six.text_type(ppe))
             if self.as_payment_method:
                 url = reverse('checkout:payment-details')
             else:
@@ -113,6 +163,13 @@ class RedirectView(CheckoutSessionMixin, RedirectView):
         if basket.is_empty:
             raise EmptyBasketException()
 
+        return get_paypal_url(**self._get_paypal_url_kwargs(basket))
+
+    def _get_paypal_url_kwargs(self, basket):
+        """
+        Return the keyword arguments for ``get_paypal_url``.  These are also
+        used to register tokens in advance (see paypal.express.prefetch).
+        """
         params = {
             'basket': basket,
             'shipping_methods': []          # setup a default empty list
@@ -153,7 +210,7 @@ class RedirectView(CheckoutSessionMixin, RedirectView):
 
         params['paypal_params'] = self._get_paypal_params()
 
-        return get_paypal_url(**params)
+        return params
 
     def _get_paypal_params(self):
         """
@@ -486,7 +543,9 @@ class SuccessResponseView(PaymentDetailsView):
             return HttpResponseRedirect(reverse('basket:summary'))
 
         try:
-            self.txn = fetch_transaction_details(self.token)
+            # Also reloads the frozen basket which is specified in the URL
+            self.txn, kwargs['basket'] = self.fetch_txn_and_basket(
+                kwargs['basket_id'])
         except PayPalError as e:
             logger.warning(
                 "Unable to fetch transaction details for token %s: %s",
@@ -496,8 +555,6 @@ class SuccessResponseView(PaymentDetailsView):
                 _("A problem occurred communicating with PayPal - please try again later"))
             return HttpResponseRedirect(reverse('basket:summary'))
 
-        # Reload frozen basket which is specified in the URL
-        kwargs['basket'] = self.load_frozen_basket(kwargs['basket_id'])
         if not kwargs['basket']:
             logger.warning(
                 "Unable to load frozen basket with ID %s", kwargs['basket_id'])
@@ -511,15 +568,52 @@ class SuccessResponseView(PaymentDetailsView):
             "Basket #%s - showing preview with payer ID %s and token %s",
             kwargs['basket'].id, self.payer_id, self.token)
 
-        basket = self.load_frozen_basket(kwargs['basket_id'])
-        if not basket:
-            messages.error(self.request, error_msg)
-            return HttpResponseRedirect(reverse('basket:summary'))
-
-        submission = self.build_submission(basket=basket)
+        submission = self.build_submission(basket=kwargs['basket'])
         return self.submit(**submission)
 #        return super(SuccessResponseView, self).get(request, *args, **kwargs)
 
+    def fetch_txn_and_basket(self, basket_id, use_cache=False):
+        """
+        Fetch the transaction details from PayPal and load the frozen basket,
+        raising a PayPalError if the details can't be fetched.
+
+        With ``PAYPAL_EXPRESS_CONCURRENT_FETCH``, the call to PayPal is made
+        on one of a pool of worker threads while the basket and its offers
+        load.
+        """
+        if not getattr(settings, 'PAYPAL_EXPRESS_CONCURRENT_FETCH', False):
+            txn = fetch_transaction_details(
+                self.token, basket_id=basket_id, use_cache=use_cache)
+            return txn, self.load_frozen_basket(basket_id)
+
+        result = {}
+
+        def fetch():
+            # The audit record is saved by the request's thread, in its
+            # transaction
+            with audit.deferred() as records:
+                try:
+                    result['txn'] = fetch_transaction_details(
+                        self.token, basket_id=basket_id, use_cache=use_cache)
+                except Exception:
+                    result['error'] = sys.exc_info()
+            result['records'] = records
+
+        done = threading.Event()
+        try:
+            _get_fetch_queue().put_nowait((fetch, done))
+        except queue.Full:
+            fetch()
+            done.set()
+        try:
+            basket = self.load_frozen_basket(basket_id)
+        finally:
+            done.wait()
+            audit.save_deferred(result.get('records', []))
+        if 'error' in result:
+            six.reraise(*result['error'])
+        return result['txn'], basket
+
     def load_frozen_basket(self, basket_id):
         # Lookup the frozen basket that this txn corresponds to
         try:
@@ -547,7 +641,7 @@ class SuccessResponseView(PaymentDetailsView):
             'payer_id': self.payer_id,
             'token': self.token,
             'paypal_user_email': self.txn.value('EMAIL'),
-            'paypal_amount': D(self.txn.value('AMT')),
+            'paypal_amount': self.txn.nvp.amount('AMT'),
         })
 
         return ctx
@@ -556,8 +650,9 @@ class SuccessResponseView(PaymentDetailsView):
         """
         Place an order.
 
-        We fetch the txn details again and then proceed with oscar's standard
-        payment details view for placing the order.
+        We fetch the txn details again (unless they were cached when showing
+        the preview) and then proceed with oscar's standard payment details
+        view for placing the order.
         """
         error_msg = _(
             "A problem occurred communicating with PayPal "
@@ -572,14 +667,15 @@ class SuccessResponseView(PaymentDetailsView):
             return HttpResponseRedirect(reverse('basket:summary'))
 
         try:
-            self.txn = fetch_transaction_details(self.token)
+            # Reuse the details fetched for the preview, if they are cached.
+            # This also reloads the frozen basket specified in the URL.
+            self.txn, basket = self.fetch_txn_and_basket(
+                kwargs['basket_id'], use_cache=True)
         except PayPalError:
             # Unable to fetch txn details from PayPal - we have to bail out
             messages.error(self.request, error_msg)
             return HttpResponseRedirect(reverse('basket:summary'))
 
-        # Reload frozen basket which is specified in the URL
-        basket = self.load_frozen_basket(kwargs['basket_id'])
         if not basket:
             messages.error(self.request, error_msg)
             return HttpResponseRedirect(reverse('basket:summary'))
@@ -605,13 +701,23 @@ class SuccessResponseView(PaymentDetailsView):
         method to capture the money from the initial transaction.
         """
         try:
-            confirm_txn = confirm_transaction(
+            confirm_txn, is_leader = confirm_transaction_once(
                 kwargs['payer_id'], kwargs['token'], kwargs['txn'].amount,
-                kwargs['txn'].currency)
+                kwargs['txn'].currency,
+                basket_id=self.kwargs.get('basket_id'),
+                order_number=order_number)
         except PayPalError:
             raise UnableToTakePayment()
         if not confirm_txn.is_successful:
             raise UnableToTakePayment()
+        if not is_leader:
+            # A duplicate submission (eg a double-click) - the request which
+            # confirmed the payment places the order, so don't place another
+            logger.warning("Order #%s: payment for token %s was already "
+                           "confirmed by another request", order_number,
+                           kwargs['token'])
+            raise RedirectRequired(self.get_placed_order_url(
+                confirm_txn.order_number or order_number))
 
         # Record payment source and event
         source_type, is_created = SourceType.objects.get_or_create(
@@ -624,6 +730,27 @@ class SuccessResponseView(PaymentDetailsView):
         self.add_payment_event('Settled', confirm_txn.amount,
                                reference=confirm_txn.correlation_id)
 
+    def get_placed_order_url(self, order_number):
+        """
+        Return the URL to send a duplicate submission to: the thank-you page
+        once the request which took the payment has placed its order.
+        """
+        deadline = time.time() + ORDER_PLACEMENT_WAIT
+        while True:
+            order = Order.objects.filter(number=order_number).first()
+            if order is not None:
+                # As the thank-you page shows the order in the session
+                self.request.session['checkout_order_id'] = order.pk
+                return reverse('checkout:thank-you')
+            if time.time() >= deadline:
+                break
+            time.sleep(0.25)
+        logger.warning("Order #%s: not placed after %s seconds",
+                       order_number, ORDER_PLACEMENT_WAIT)
+        messages.info(self.request, _(
+            "Your payment has been taken and your order is being placed"))
+        return reverse('basket:summary')
+
     def get_shipping_address(self, basket):
         """
         Return a created shipping address instance, created using
@@ -692,7 +819,8 @@ class SuccessResponseView(PaymentDetailsView):
             return NoShippingRequired()
 
         # Instantiate a new FixedPrice shipping method instance
-        charge_incl_tax = D(self.txn.value('PAYMENTREQUEST_0_SHIPPINGAMT'))
+        charge_incl_tax = self.txn.nvp.amount(
+            'PAYMENTREQUEST_0_SHIPPINGAMT', D('0.00'))
 
         # Assume no tax for now
         charge_excl_tax = charge_incl_tax
@@ -729,6 +857,10 @@ class ShippingOptionsView(View):
         # the basket ID in the callback URL.
         basket = get_object_or_404(Basket, id=kwargs['basket_id'])
         user = basket.owner
+
+        # The payer has changed their shipping address, so any cached details
+        # for the transaction are out of date
+        cache.invalidate(self.request.POST.get('TOKEN'))
         if not user:
             user = AnonymousUser()
 
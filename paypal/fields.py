@@ -0,0 +1,100 @@
+"""
+Model fields used by the transaction models.
+"""
+from __future__ import unicode_literals
+import base64
+import zlib
+
+from django.conf import settings
+from django.db import models
+
+# Compressed values are stored as this prefix followed by the base64 encoded
+# zlib data.  NVP payloads are URL-encoded, so ':' is escaped in them and an
+# uncompressed payload can never start with the prefix.
+PREFIX = 'zlib:'
+
+
+def is_compressed(value):
+    return bool(value) and value.startswith(PREFIX)
+
+
+def compress(value):
+    """
+    Return the compressed form of a string, or the string itself if
+    compressing it doesn't make it any shorter (eg for short payloads).
+    """
+    if not value or is_compressed(value):
+        return value
+    data = base64.b64encode(zlib.compress(value.encode('utf8')))
+    compressed = PREFIX + data.decode('ascii')
+    return compressed if len(compressed) < len(value) else value
+
+
+def decompress(value):
+    if not is_compressed(value):
+        return value
+    data = base64.b64decode(value[len(PREFIX):].encode('ascii'))
+    return zlib.decompress(data).decode('utf8')
+
+
+def compression_enabled():
+    return getattr(settings, 'PAYPAL_COMPRESS_PAYLOADS', False)
+
+
+class CompressedTextDescriptor(object):
+    """
+    Keeps the value as loaded from the database and only decompresses it
+    when it is first read.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.__dict__[self.field.attname]
+        if is_compressed(value):
+            value = decompress(value)
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedTextField(models.TextField):
+    """
+    A text field which can store its values compressed.
+
+    Values are compressed when saved if the ``PAYPAL_COMPRESS_PAYLOADS``
+    setting is ``True``.  Compressed and plain values can be mixed in the same
+    column, so compression can be turned on (or off) at any time; existing
+    rows can be compressed with the ``paypal_compress_payloads`` command.
+    Pass ``always_compress=True`` to compress values whatever the setting.
+    Reading the attribute always returns the plain text.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.always_compress = kwargs.pop('always_compress', False)
+        super(CompressedTextField, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(
+            CompressedTextField, self).deconstruct()
+        if self.always_compress:
+            kwargs['always_compress'] = True
+        return name, path, args, kwargs
+
+    def contribute_to_class(self, cls, name, *args, **kwargs):
+        super(CompressedTextField, self).contribute_to_class(
+            cls, name, *args, **kwargs)
+        setattr(cls, self.name, CompressedTextDescriptor(self))
+
+    def pre_save(self, model_instance, add):
+        # Read the stored value directly so unread values aren't
+        # decompressed just to be compressed again.
+        value = model_instance.__dict__.get(self.attname)
+        if self.always_compress or compression_enabled():
+            return compress(value)
+        return decompress(value)
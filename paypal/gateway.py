@@ -1,42 +1,304 @@
 from __future__ import unicode_literals
+import logging
+import os
+import random
+import threading
 import requests
 import time
+from requests.adapters import HTTPAdapter
 
+from django.conf import settings
 from django.utils.http import urlencode
-from django.utils import six
-from django.utils.six.moves.urllib.parse import parse_qsl
+from django.utils.six.moves import http_cookiejar
 
-from paypal import exceptions
+from paypal import bulkhead, exceptions, metrics
+from paypal.breaker import get_breaker
+from paypal.nvp import NVPResponse
 
+HEADERS = {'content-type': 'text/namevalue; charset=utf-8'}
 
-def post(url, params):
+# Request fields which must never be stored or logged, with their masks.
+# Card numbers keep their last four digits.
+REDACTED_FIELDS = {
+    'PWD': 'XXXXXX',
+    'SIGNATURE': 'XXXXXX',
+    'ACCT': None,
+    'CVV2': 'XXX',
+}
+
+logger = logging.getLogger('paypal.gateway')
+
+# Each process gets its own pooled session, created lazily on first use.  We
+# remember the PID it was created in so a forked worker never shares sockets
+# with its parent.
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _build_session():
+    """
+    Build a ``requests.Session`` with a connection pool sized from the
+    ``PAYPAL_HTTP_POOL_SIZE`` setting.
+    """
+    pool_size = getattr(settings, 'PAYPAL_HTTP_POOL_SIZE', 10)
+    session = requests.Session()
+    # The NVP APIs are stateless - never let cookies from one customer's call
+    # leak into another's.
+    session.cookies.set_policy(
+        http_cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(
+        pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    """
+    Return the pooled session shared by all PayPal calls in this process.
+
+    The underlying urllib3 pools are thread-safe so the session can be used
+    from any number of request threads.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    if _session is None or _session_pid != pid:
+        with _session_lock:
+            if _session is None or _session_pid != pid:
+                _session = _build_session()
+                _session_pid = pid
+    return _session
+
+
+def reset_session():
+    """
+    Close and discard the pooled session (eg after changing pool settings).
+    """
+    global _session, _session_pid
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = _session_pid = None
+
+
+class CallPolicy(object):
+    """
+    Timeouts and retry budget for a single gateway call.
+
+    :connect_timeout: Seconds to wait for a connection to be established.
+    :read_timeout: Seconds to wait between bytes of the response.
+    :deadline: Overall seconds allowed for the call, including retries.
+    :retries: How many times to retry after a connection error, timeout or
+              5xx response.  Only use this for calls that are safe to repeat.
+    :name: The Express METHOD or Payflow TRXTYPE, used to label metrics.
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=30, deadline=60,
+                 retries=0, backoff=0.1, name=None):
+        self.name = name
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+
+    def backoff_delay(self, attempt):
+        """
+        Return a jittered delay to wait before the given retry attempt
+        ("full jitter" exponential backoff).
+        """
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+
+def encode(params):
+    """
+    URL-encode the params of a call.  Return a tuple of the payload to send
+    and a redacted copy of it for the audit record.
+
+    Credentials and card details (plus any fields in the
+    ``PAYPAL_REDACT_KEYS`` setting) are masked in the copy.  The rest of the
+    params are only encoded once and shared by both.
+    """
+    extra_fields = getattr(settings, 'PAYPAL_REDACT_KEYS', ())
+    public, secret = [], []
+    for key, value in params.items():
+        if key in REDACTED_FIELDS or key in extra_fields:
+            secret.append((key, value))
+        else:
+            public.append((key, value))
+    payload = urlencode(public)
+    if not secret:
+        return payload, payload
+    masked = [(key, _mask(key, value)) for key, value in secret]
+    prefix = payload + '&' if payload else ''
+    return prefix + urlencode(secret), prefix + urlencode(masked)
+
+
+def _mask(key, value):
+    mask = REDACTED_FIELDS.get(key, 'XXXXXX')
+    if mask is None:
+        value = '%s' % value
+        return 'X' * (len(value) - 4) + value[-4:]
+    return mask
+
+
+def get_call_policy(name, defaults=None):
+    """
+    Return the :class:`CallPolicy` for a named call - an Express METHOD or a
+    Payflow TRXTYPE.
+
+    The ``PAYPAL_HTTP_POLICIES`` setting maps names (and ``'default'``) to
+    dicts of :class:`CallPolicy` arguments.  These are layered over the
+    ``defaults`` given by the gateway.
+    """
+    overrides = getattr(settings, 'PAYPAL_HTTP_POLICIES', {})
+    kwargs = {}
+    kwargs.update(defaults or {})
+    kwargs.update(overrides.get('default', {}))
+    kwargs.update(overrides.get(name, {}))
+    kwargs['name'] = name
+    return CallPolicy(**kwargs)
+
+
+def post(url, params, headers=None, policy=None):
     """
     Make a POST request to the URL using the key-value pairs.  Return
-    a set of key-value pairs.
+    the response as an :class:`paypal.nvp.NVPResponse`.
+
+    Connections are kept alive and reused across calls unless the
+    ``PAYPAL_HTTP_KEEP_ALIVE`` setting is ``False``.
 
     :url: URL to post to
     :params: Dict of parameters to include in post payload
+    :headers: Extra HTTP headers to send
+    :policy: The :class:`CallPolicy` for the call.  If a call fails with a
+             connection error, timeout or 5xx response, it is retried (after
+             a jittered backoff) while the policy's retry budget and deadline
+             allow.
+
+    If the circuit breaker for the endpoint is open (see
+    :mod:`paypal.breaker`) or there are too many calls already in flight (see
+    :mod:`paypal.bulkhead`), ``PayPalUnavailable`` is raised at once.
+
+    Latency, outcome and in-flight calls are recorded in
+    :mod:`paypal.metrics`.
     """
-    payload = urlencode(params)
+    if policy is None:
+        policy = CallPolicy()
     start_time = time.time()
-    response = requests.post(
-        url, payload,
-        headers={'content-type': 'text/namevalue; charset=utf-8'})
-    if response.status_code != requests.codes.ok:
-        raise exceptions.PayPalError("Unable to communicate with PayPal")
-
-    # Convert response into a simple key-value format
-    pairs = {}
-    for key, value in parse_qsl(response.content):
-        if isinstance(key, six.binary_type):
-            key = key.decode('utf8')
-        if isinstance(value, six.binary_type):
-            value = value.decode('utf8')
-        pairs[key] = value
-
-    # Add audit information
-    pairs['_raw_request'] = payload
-    pairs['_raw_response'] = response.content
-    pairs['_response_time'] = (time.time() - start_time) * 1000.0
+    metrics.call_started(policy.name)
+    try:
+        pairs = _guarded_post(url, params, headers, policy)
+    except exceptions.PayPalBusy:
+        metrics.call_failed(policy.name, 'busy', time.time() - start_time)
+        raise
+    except exceptions.PayPalUnavailable:
+        metrics.call_failed(
+            policy.name, 'unavailable', time.time() - start_time)
+        raise
+    except Exception:
+        metrics.call_failed(policy.name, 'error', time.time() - start_time)
+        raise
+    metrics.call_responded(policy.name)
+    return pairs
 
+
+def _guarded_post(url, params, headers, policy):
+    """
+    Make the call through the circuit breaker and bulkhead.
+    """
+    breaker = get_breaker(url)
+    breaker_state = breaker.before_call() if breaker else None
+    reachable = None
+    try:
+        with bulkhead.slot():
+            try:
+                pairs = _post(url, params, headers, policy)
+            except exceptions.PayPalUnavailable:
+                reachable = False
+                raise
+            except exceptions.PayPalError:
+                # Eg a 4xx response - PayPal was reached
+                reachable = True
+                raise
+            reachable = True
+    finally:
+        if breaker:
+            _record_breaker(breaker, breaker_state, reachable)
     return pairs
+
+
+def _record_breaker(breaker, state, reachable):
+    """
+    Record the outcome of a call in the circuit breaker.  ``reachable`` is
+    ``None`` if the call wasn't made (eg the bulkhead rejected it).
+    """
+    if reachable:
+        breaker.record_success(state)
+    elif reachable is None:
+        breaker.release_probe(state)
+    else:
+        breaker.record_failure(state)
+
+
+def _post(url, params, headers, policy):
+    """
+    Make the call, retrying as the policy allows.  Raise
+    ``PayPalUnavailable`` if PayPal could not be reached in time.
+    """
+    payload, raw_request = encode(params)
+    request_headers = dict(HEADERS, **(headers or {}))
+    start_time = time.time()
+    deadline = start_time + policy.deadline
+    attempt = 0
+    while True:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise exceptions.PayPalUnavailable(
+                "Timed out communicating with PayPal")
+        timeout = (min(policy.connect_timeout, remaining),
+                   min(policy.read_timeout, remaining))
+        try:
+            response = _send(url, payload, request_headers, timeout)
+        except requests.RequestException as e:
+            error = e
+        else:
+            if response.status_code == requests.codes.ok:
+                return parse_response(
+                    raw_request, response.content, start_time)
+            if response.status_code < 500:
+                raise exceptions.PayPalError(
+                    "Unable to communicate with PayPal")
+            error = "HTTP %s" % response.status_code
+
+        if attempt >= policy.retries:
+            logger.warning("PayPal call to %s failed: %s", url, error)
+            raise exceptions.PayPalUnavailable(
+                "Unable to communicate with PayPal")
+        delay = policy.backoff_delay(attempt)
+        if time.time() + delay >= deadline:
+            raise exceptions.PayPalUnavailable(
+                "Timed out communicating with PayPal")
+        attempt += 1
+        metrics.call_retried(policy.name)
+        logger.info("PayPal call to %s failed (%s) - retry %d in %.2fs",
+                    url, error, attempt, delay)
+        time.sleep(delay)
+
+
+def _send(url, payload, headers, timeout):
+    if getattr(settings, 'PAYPAL_HTTP_KEEP_ALIVE', True):
+        return get_session().post(
+            url, payload, headers=headers, timeout=timeout)
+    return requests.post(url, payload, headers=headers, timeout=timeout)
+
+
+def parse_response(raw_request, content, start_time):
+    """
+    Wrap a raw NVP response in an :class:`paypal.nvp.NVPResponse`, including
+    the audit information (redacted raw request, raw response and response
+    time).  The response itself is only parsed when it is first read.
+    """
+    return NVPResponse(content, raw_request=raw_request,
+                       response_time=(time.time() - start_time) * 1000.0)
@@ -0,0 +1,71 @@
+from __future__ import unicode_literals
+import datetime
+import time
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from paypal import archive
+from paypal.express.models import ExpressTransaction
+from paypal.payflow.models import PayflowTransaction
+
+MODELS = {
+    'express': ExpressTransaction,
+    'payflow': PayflowTransaction,
+}
+
+
+class Command(BaseCommand):
+    help = ("Move transactions older than a given number of days into the "
+            "archive table.  Transactions are moved in batches, each in its "
+            "own database transaction, so the command can be interrupted "
+            "and run again.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--days', type='int',
+                    default=getattr(settings, 'PAYPAL_ARCHIVE_AFTER_DAYS',
+                                    None),
+                    help="Archive transactions older than this many days "
+                         "(defaults to the PAYPAL_ARCHIVE_AFTER_DAYS "
+                         "setting)"),
+        make_option('--batch-size', type='int', default=500,
+                    help="Number of transactions to move per database "
+                         "transaction"),
+        make_option('--pause', type='float', default=0,
+                    help="Seconds to wait between batches, to leave room "
+                         "for other queries on busy databases"),
+        make_option('--only', choices=sorted(MODELS),
+                    help="Only archive Express or Payflow transactions"),
+        make_option('--dry-run', action='store_true', default=False,
+                    help="Only report how many transactions would be "
+                         "archived"),
+    )
+
+    def handle(self, *args, **options):
+        if options['days'] is None:
+            raise CommandError(
+                "Pass --days or set PAYPAL_ARCHIVE_AFTER_DAYS")
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        names = [options['only']] if options['only'] else sorted(MODELS)
+        for name in names:
+            model = MODELS[name]
+            if options['dry_run']:
+                count = model.objects.filter(date_created__lt=before).count()
+                self.stdout.write("Would archive %d %s transactions" % (
+                    count, name))
+                continue
+            count = 0
+            while True:
+                archived = archive.archive_batch(
+                    model, before, options['batch_size'])
+                if not archived:
+                    break
+                count += archived
+                if int(options['verbosity']) > 1:
+                    self.stdout.write("Archived %d %s transactions so far" % (
+                        count, name))
+                if options['pause']:
+                    time.sleep(options['pause'])
+            self.stdout.write("Archived %d %s transactions" % (count, name))
@@ -0,0 +1,58 @@
+from __future__ import unicode_literals
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import router, transaction
+
+from paypal.base import TransactionPayload
+from paypal.fields import compress, is_compressed
+
+FIELDS = ('raw_request', 'raw_response')
+
+
+class Command(BaseCommand):
+    help = ("Compress the raw requests and responses of existing "
+            "transactions.  Rows are updated in batches, so the command can "
+            "be interrupted and run again.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', default=1000,
+                    help="Number of rows to update per transaction"),
+        make_option('--start-id', default='',
+                    help="Only compress payloads with a greater ID (to "
+                         "resume an earlier run)"),
+    )
+
+    def handle(self, *args, **options):
+        self.verbosity = int(options.get('verbosity', 1))
+        count = self.compress_payloads(
+            options['batch_size'], options['start_id'])
+        self.stdout.write("Compressed %d payloads" % count)
+
+    def compress_payloads(self, batch_size, start_id):
+        count = 0
+        last_id = start_id
+        while True:
+            # Read the stored values without loading the models, which would
+            # decompress them.
+            rows = list(TransactionPayload.objects.filter(pk__gt=last_id)
+                        .order_by('pk')
+                        .values_list('pk', *FIELDS)[:batch_size])
+            if not rows:
+                return count
+            with transaction.atomic(
+                    using=router.db_for_write(TransactionPayload)):
+                for row in rows:
+                    updates = {}
+                    for field, value in zip(FIELDS, row[1:]):
+                        if not is_compressed(value):
+                            compressed = compress(value)
+                            if compressed != value:
+                                updates[field] = compressed
+                    if updates:
+                        TransactionPayload.objects.filter(
+                            pk=row[0]).update(**updates)
+                        count += 1
+            last_id = rows[-1][0]
+            if self.verbosity > 1:
+                self.stdout.write("Compressed up to ID %s" % last_id)
@@ -0,0 +1,69 @@
+from __future__ import unicode_literals
+import io
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paypal import export
+
+
+class Command(BaseCommand):
+    args = '<express|payflow>'
+    help = ("Export transactions as CSV, JSON lines or Parquet.  Rows are "
+            "read and written in chunks, so exports of any size use the "
+            "same amount of memory.")
+
+    option_list = BaseCommand.option_list + (
+        make_option('--format', choices=export.FORMATS, default='csv',
+                    help="Output format: csv (default), jsonl or parquet"),
+        make_option('--output',
+                    help="File to write to (defaults to stdout, which isn't "
+                         "available for Parquet)"),
+        make_option('--from', dest='date_from',
+                    help="Only export transactions created on or after this "
+                         "date (YYYY-MM-DD)"),
+        make_option('--to', dest='date_to',
+                    help="Only export transactions created before this "
+                         "date (YYYY-MM-DD)"),
+        make_option('--call',
+                    help="Only export this Express method or Payflow "
+                         "TRXTYPE"),
+        make_option('--status',
+                    help="Only export this Express ACK or Payflow RESULT"),
+        make_option('--chunk-size', type='int', default=export.CHUNK_SIZE,
+                    help="Number of rows to read per query"),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1 or args[0] not in export.EXPORTS:
+            raise CommandError("Usage: paypal_export_transactions %s" %
+                               self.args)
+        kind = args[0]
+        try:
+            filters = {
+                'date_from': export.parse_day(options['date_from']),
+                'date_to': export.parse_day(options['date_to']),
+                'call': options['call'],
+                'status': options['status'],
+            }
+        except ValueError as e:
+            raise CommandError(e)
+        fmt = options['format']
+        if fmt == 'parquet':
+            if not options['output']:
+                raise CommandError("Parquet exports need --output")
+            fields = export.EXPORTS[kind]['fields']
+            rows = export.iter_rows(export.get_queryset(kind, **filters),
+                                    fields, options['chunk_size'])
+            export.write_parquet(rows, fields, options['output'],
+                                 options['chunk_size'])
+            return
+        lines = export.stream(kind, fmt, options['chunk_size'], **filters)
+        if options['output']:
+            with io.open(options['output'], 'w', encoding='utf8',
+                         newline='') as output:
+                for line in lines:
+                    output.write(line)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
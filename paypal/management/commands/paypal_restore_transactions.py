@@ -0,0 +1,26 @@
+from __future__ import unicode_literals
+
+from django.core.management.base import BaseCommand, CommandError
+
+from paypal import archive
+from paypal.base import ArchivedTransaction
+from paypal.management.commands.paypal_archive_transactions import MODELS
+
+
+class Command(BaseCommand):
+    args = '<express|payflow> <id> [<id> ...]'
+    help = ("Move archived transactions back into their table, keeping "
+            "their original IDs.")
+
+    def handle(self, *args, **options):
+        if len(args) < 2 or args[0] not in MODELS:
+            raise CommandError("Usage: paypal_restore_transactions %s" %
+                               self.args)
+        model = MODELS[args[0]]
+        for pk in args[1:]:
+            try:
+                archive.restore(model, int(pk))
+            except (ValueError, ArchivedTransaction.DoesNotExist):
+                raise CommandError("No archived %s transaction %s" % (
+                    args[0], pk))
+            self.stdout.write("Restored %s transaction %s" % (args[0], pk))
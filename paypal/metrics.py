@@ -0,0 +1,159 @@
+"""
+Prometheus metrics for calls to PayPal.
+
+Metrics are recorded with the ``prometheus_client`` package, which is
+installed with ``pip install "django-oscar-paypal[metrics]"``.  Without it (or
+with ``PAYPAL_METRICS = False``) every function here is a no-op.
+
+All metrics are labelled with the ``call`` - the Express ``METHOD`` or the
+Payflow ``TRXTYPE``.  Under multi-process servers (eg gunicorn or uWSGI with
+several workers) set the ``PROMETHEUS_MULTIPROC_DIR`` environment variable as
+described in the ``prometheus_client`` docs; :func:`metrics_view` then
+aggregates the metrics of all the workers.
+"""
+from __future__ import unicode_literals
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+# PayPal calls normally take between a few hundred milliseconds and a few
+# seconds, but can take up to the read timeout when PayPal is struggling.
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 10, 20, 30, 60)
+
+if prometheus_client is not None:
+    REQUEST_LATENCY = prometheus_client.Histogram(
+        'paypal_request_duration_seconds',
+        "Time taken by calls to PayPal, including retries",
+        ['call', 'outcome'], buckets=LATENCY_BUCKETS)
+    REQUESTS = prometheus_client.Counter(
+        'paypal_requests_total',
+        "Calls to PayPal which got a response, by ACK or RESULT and error "
+        "code",
+        ['call', 'outcome', 'error_code'])
+    ERRORS = prometheus_client.Counter(
+        'paypal_errors_total',
+        "Calls to PayPal which got no usable response",
+        ['call', 'reason'])
+    RETRIES = prometheus_client.Counter(
+        'paypal_retries_total',
+        "Calls to PayPal which were retried after a transport failure",
+        ['call'])
+    IN_FLIGHT = prometheus_client.Gauge(
+        'paypal_requests_in_flight',
+        "Calls to PayPal currently waiting on a response",
+        ['call'], multiprocess_mode='livesum')
+    BULKHEAD_IN_FLIGHT = prometheus_client.Gauge(
+        'paypal_bulkhead_in_flight',
+        "Calls to PayPal holding a bulkhead slot",
+        multiprocess_mode='livesum')
+    BULKHEAD_QUEUED = prometheus_client.Gauge(
+        'paypal_bulkhead_queued',
+        "Calls to PayPal waiting for a bulkhead slot",
+        multiprocess_mode='livesum')
+    BULKHEAD_REJECTIONS = prometheus_client.Counter(
+        'paypal_bulkhead_rejections_total',
+        "Calls to PayPal rejected by the bulkhead, by reason (queue_full, "
+        "queue_timeout or node_limit)",
+        ['reason'])
+    AUDIT_RECORDS = prometheus_client.Counter(
+        'paypal_audit_records_total',
+        "Calls to PayPal by how their audit record was stored (full, summary "
+        "or skipped)",
+        ['call', 'stored'])
+
+
+def is_enabled():
+    return (prometheus_client is not None and
+            getattr(settings, 'PAYPAL_METRICS', True))
+
+
+def call_started(call):
+    if is_enabled():
+        IN_FLIGHT.labels(call or 'unknown').inc()
+
+
+def call_responded(call):
+    """
+    Record that a call got a response.  The outcome is recorded separately
+    with :func:`call_succeeded` once the response has been read.
+    """
+    if is_enabled():
+        IN_FLIGHT.labels(call or 'unknown').dec()
+
+
+def call_succeeded(call, outcome, error_code, duration):
+    """
+    Record the outcome of a call which got a response: the ``ACK`` and first
+    error code for Express, the ``RESULT`` for Payflow.  This is called by
+    the gateways when they record the response, which saves the transport
+    from parsing responses itself.
+    """
+    if not is_enabled():
+        return
+    call = call or 'unknown'
+    REQUEST_LATENCY.labels(call, outcome).observe(duration)
+    REQUESTS.labels(call, outcome, error_code or '').inc()
+
+
+def call_failed(call, reason, duration):
+    """
+    Record a call which got no usable response, eg because PayPal was
+    unreachable or the call was rejected by the circuit breaker or bulkhead.
+    """
+    if not is_enabled():
+        return
+    call = call or 'unknown'
+    IN_FLIGHT.labels(call).dec()
+    REQUEST_LATENCY.labels(call, 'error').observe(duration)
+    ERRORS.labels(call, reason).inc()
+
+
+def call_retried(call):
+    if is_enabled():
+        RETRIES.labels(call or 'unknown').inc()
+
+
+def bulkhead_in_flight(change):
+    if is_enabled():
+        BULKHEAD_IN_FLIGHT.inc(change)
+
+
+def bulkhead_queued(change):
+    if is_enabled():
+        BULKHEAD_QUEUED.inc(change)
+
+
+def bulkhead_rejected(reason):
+    if is_enabled():
+        BULKHEAD_REJECTIONS.labels(reason).inc()
+
+
+def audit_recorded(call, stored):
+    if is_enabled():
+        AUDIT_RECORDS.labels(call or 'unknown', stored).inc()
+
+
+def metrics_view(request):
+    """
+    Expose the metrics in the Prometheus text format.  Hook this up in your
+    URLconf (and restrict access to it) if you don't already expose
+    ``prometheus_client``'s default registry.
+    """
+    if prometheus_client is None:
+        return HttpResponse("prometheus_client is not installed", status=501,
+                            content_type='text/plain')
+    if (os.environ.get('PROMETHEUS_MULTIPROC_DIR') or
+            os.environ.get('prometheus_multiproc_dir')):
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return HttpResponse(prometheus_client.generate_latest(registry),
+                        content_type=prometheus_client.CONTENT_TYPE_LATEST)
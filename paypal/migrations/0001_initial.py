@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpressTransaction',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('raw_request', models.TextField(max_length=512)),
+                ('raw_response', models.TextField(max_length=512)),
+                ('response_time', models.FloatField(help_text='Response time in milliseconds')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('method', models.CharField(max_length=32)),
+                ('version', models.CharField(max_length=8)),
+                ('amount', models.DecimalField(null=True, max_digits=12, decimal_places=2, blank=True)),
+                ('currency', models.CharField(max_length=8, null=True, blank=True)),
+                ('ack', models.CharField(max_length=32)),
+                ('correlation_id', models.CharField(max_length=32, null=True, blank=True)),
+                ('token', models.CharField(max_length=32, null=True, blank=True)),
+                ('error_code', models.CharField(max_length=32, null=True, blank=True)),
+                ('error_message', models.CharField(max_length=256, null=True, blank=True)),
+            ],
+            options={
+                'ordering': ('-date_created',),
+            },
+            bases=(models.Model,),
+        ),
+        migrations.CreateModel(
+            name='PayflowTransaction',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('raw_request', models.TextField(max_length=512)),
+                ('raw_response', models.TextField(max_length=512)),
+                ('response_time', models.FloatField(help_text='Response time in milliseconds')),
+                ('date_created', models.DateTimeField(auto_now_add=True)),
+                ('comment1', models.CharField(max_length=128, verbose_name='Comment 1', db_index=True)),
+                ('trxtype', models.CharField(max_length=12, verbose_name='Transaction type')),
+                ('tender', models.CharField(max_length=12, null=True, verbose_name='Bankcard or PayPal')),
+                ('amount', models.DecimalField(null=True, max_digits=12, decimal_places=2, blank=True)),
+                ('pnref', models.CharField(max_length=32, null=True, verbose_name='Payflow transaction ID')),
+                ('ppref', models.CharField(max_length=32, unique=True, null=True, verbose_name='Payment transaction ID')),
+                ('result', models.CharField(max_length=32, null=True, blank=True)),
+                ('respmsg', models.CharField(max_length=512, verbose_name='Response message')),
+                ('authcode', models.CharField(max_length=32, null=True, verbose_name='Auth code', blank=True)),
+                ('cvv2match', models.CharField(max_length=12, null=True, verbose_name='CVV2 check', blank=True)),
+                ('avsaddr', models.CharField(max_length=1, null=True, verbose_name='House number check', blank=True)),
+                ('avszip', models.CharField(max_length=1, null=True, verbose_name='Zip/Postcode check', blank=True)),
+            ],
+            options={
+                'ordering': ('-date_created',),
+            },
+            bases=(models.Model,),
+        ),
+    ]
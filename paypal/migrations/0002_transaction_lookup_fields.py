@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paypal', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expresstransaction',
+            name='token',
+            field=models.CharField(db_index=True, max_length=32, null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='expresstransaction',
+            name='transaction_id',
+            field=models.CharField(db_index=True, max_length=32, null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='expresstransaction',
+            name='payer_id',
+            field=models.CharField(db_index=True, max_length=32, null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='expresstransaction',
+            name='payer_email',
+            field=models.EmailField(db_index=True, max_length=254, null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='expresstransaction',
+            name='basket_id',
+            field=models.PositiveIntegerField(db_index=True, null=True, blank=True),
+        ),
+        migrations.AddField(
+            model_name='expresstransaction',
+            name='order_number',
+            field=models.CharField(db_index=True, max_length=128, null=True, blank=True),
+        ),
+        migrations.AlterField(
+            model_name='payflowtransaction',
+            name='pnref',
+            field=models.CharField(db_index=True, max_length=32, null=True, verbose_name='Payflow transaction ID'),
+        ),
+    ]
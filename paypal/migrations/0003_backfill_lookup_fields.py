@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import re
+
+from django.db import migrations
+from django.utils import six
+from django.utils.six.moves.urllib.parse import parse_qsl, urlsplit
+
+SUCCESS_ACKS = ('Success', 'SuccessWithWarning')
+
+# The return URL of a SetExpressCheckout call ends with the basket ID, eg
+# /checkout/paypal/preview/123/
+BASKET_ID = re.compile(r'/(\d+)/?$')
+
+
+def parse(raw):
+    if six.PY2 and isinstance(raw, six.text_type):
+        raw = raw.encode('utf8')
+    fields = {}
+    for key, value in parse_qsl(raw):
+        if isinstance(key, six.binary_type):
+            key = key.decode('utf8')
+        if isinstance(value, six.binary_type):
+            value = value.decode('utf8')
+        fields[key] = value
+    return fields
+
+
+def backfill(apps, schema_editor):
+    """
+    Extract the lookup fields of existing Express transactions from their raw
+    request and response.  Order numbers weren't recorded, so they can't be
+    backfilled.
+    """
+    Transaction = apps.get_model('paypal', 'ExpressTransaction')
+    basket_ids = {}
+    txns = Transaction.objects.filter(ack__in=SUCCESS_ACKS).order_by('id')
+    for txn in txns.iterator():
+        request = parse(txn.raw_request)
+        response = parse(txn.raw_response)
+        txn.payer_id = (
+            response.get('PAYERID') or request.get('PAYERID') or None)
+        txn.payer_email = response.get('EMAIL', '')[:254] or None
+        txn.transaction_id = (
+            response.get('PAYMENTINFO_0_TRANSACTIONID') or
+            response.get('TRANSACTIONID') or
+            response.get('REFUNDTRANSACTIONID') or None)
+        if txn.method == 'SetExpressCheckout':
+            match = BASKET_ID.search(
+                urlsplit(request.get('RETURNURL', '')).path)
+            if match and txn.token:
+                basket_ids[txn.token] = int(match.group(1))
+        txn.basket_id = basket_ids.get(txn.token)
+        txn.save(update_fields=[
+            'payer_id', 'payer_email', 'transaction_id', 'basket_id'])
+
+
+def noop(apps, schema_editor):
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paypal', '0002_transaction_lookup_fields'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, noop),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paypal', '0003_backfill_lookup_fields'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expresstransaction',
+            name='date_created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='expresstransaction',
+            name='token',
+            field=models.CharField(max_length=32, null=True, blank=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='expresstransaction',
+            index_together=set([('token', 'method')]),
+        ),
+        migrations.AlterField(
+            model_name='payflowtransaction',
+            name='date_created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='payflowtransaction',
+            name='comment1',
+            field=models.CharField(max_length=128, verbose_name='Comment 1'),
+        ),
+        migrations.AlterIndexTogether(
+            name='payflowtransaction',
+            index_together=set([('comment1', 'trxtype')]),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+import paypal.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paypal', '0004_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expresstransaction',
+            name='raw_request',
+            field=paypal.fields.CompressedTextField(max_length=512),
+        ),
+        migrations.AlterField(
+            model_name='expresstransaction',
+            name='raw_response',
+            field=paypal.fields.CompressedTextField(max_length=512),
+        ),
+        migrations.AlterField(
+            model_name='payflowtransaction',
+            name='raw_request',
+            field=paypal.fields.CompressedTextField(max_length=512),
+        ),
+        migrations.AlterField(
+            model_name='payflowtransaction',
+            name='raw_response',
+            field=paypal.fields.CompressedTextField(max_length=512),
+        ),
+    ]
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import uuid
+
+from django.db import models, migrations
+import django.db.models.deletion
+import paypal.base
+import paypal.fields
+
+MODELS = ('ExpressTransaction', 'PayflowTransaction')
+BATCH_SIZE = 1000
+# Rows per UPDATE, keeping the number of query parameters under SQLite's
+# limit of 999
+UPDATE_SIZE = 300
+
+
+def move_payloads(apps, schema_editor):
+    """
+    Copy the raw request and response of each transaction into a payload
+    row.  Transactions with neither get no payload.  Payloads are stored
+    compressed if PAYPAL_COMPRESS_PAYLOADS is set.
+    """
+    Payload = apps.get_model('paypal', 'TransactionPayload')
+    for name in MODELS:
+        Transaction = apps.get_model('paypal', name)
+        last_id = 0
+        while True:
+            rows = list(Transaction.objects.filter(pk__gt=last_id)
+                        .order_by('pk')
+                        .values_list('pk', 'raw_request', 'raw_response')
+                        [:BATCH_SIZE])
+            if not rows:
+                break
+            payloads = []
+            for pk, raw_request, raw_response in rows:
+                if raw_request or raw_response:
+                    payload = Payload(id=uuid.uuid4().hex,
+                                      raw_request=raw_request,
+                                      raw_response=raw_response)
+                    payloads.append((pk, payload))
+            Payload.objects.bulk_create([payload for __, payload in payloads])
+            for start in range(0, len(payloads), UPDATE_SIZE):
+                _set_payload_ids(
+                    schema_editor, Transaction,
+                    [(pk, payload.id) for pk, payload in
+                     payloads[start:start + UPDATE_SIZE]])
+            last_id = rows[-1][0]
+
+
+def _set_payload_ids(schema_editor, Transaction, payload_ids):
+    """
+    Point each transaction at its payload with a single UPDATE, given
+    ``(pk, payload_id)`` pairs.
+    """
+    if not payload_ids:
+        return
+    quote_name = schema_editor.connection.ops.quote_name
+    pk = quote_name(Transaction._meta.pk.column)
+    sql = 'UPDATE %s SET %s = CASE %s %s END WHERE %s IN (%s)' % (
+        quote_name(Transaction._meta.db_table),
+        quote_name(Transaction._meta.get_field('payload').column),
+        pk, ' '.join(['WHEN %s THEN %s'] * len(payload_ids)),
+        pk, ', '.join(['%s'] * len(payload_ids)))
+    params = [value for pair in payload_ids for value in pair]
+    params.extend(pk_value for pk_value, __ in payload_ids)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def restore_payloads(apps, schema_editor):
+    # The columns have the same type in both tables, so the stored values
+    # are copied as they are, in one statement per table
+    Payload = apps.get_model('paypal', 'TransactionPayload')
+    quote_name = schema_editor.connection.ops.quote_name
+    payload_table = quote_name(Payload._meta.db_table)
+    payload_pk = quote_name(Payload._meta.pk.column)
+    for name in MODELS:
+        Transaction = apps.get_model('paypal', name)
+        table = quote_name(Transaction._meta.db_table)
+        payload_id = quote_name(
+            Transaction._meta.get_field('payload').column)
+        assignments = ', '.join(
+            '%s = (SELECT %s FROM %s WHERE %s.%s = %s.%s)' % (
+                quote_name(column), quote_name(column), payload_table,
+                payload_table, payload_pk, table, payload_id)
+            for column in ('raw_request', 'raw_response'))
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('UPDATE %s SET %s WHERE %s IS NOT NULL' % (
+                table, assignments, payload_id))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paypal', '0005_compressed_payloads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionPayload',
+            fields=[
+                ('id', models.CharField(default=paypal.base.new_payload_id, max_length=32, serialize=False, editable=False, primary_key=True)),
+                ('raw_request', paypal.fields.CompressedTextField(max_length=512, blank=True)),
+                ('raw_response', paypal.fields.CompressedTextField(max_length=512, blank=True)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AddField(
+            model_name='expresstransaction',
+            name='payload',
+            field=models.OneToOneField(related_name='+', null=True, on_delete=django.db.models.deletion.SET_NULL, editable=False, to='paypal.TransactionPayload'),
+        ),
+        migrations.AddField(
+            model_name='payflowtransaction',
+            name='payload',
+            field=models.OneToOneField(related_name='+', null=True, on_delete=django.db.models.deletion.SET_NULL, editable=False, to='paypal.TransactionPayload'),
+        ),
+        migrations.RunPython(move_payloads, restore_payloads),
+        # Allow blank values first, so the columns can be added back with a
+        # default if this migration is reversed
+        migrations.AlterField(
+            model_name='expresstransaction',
+            name='raw_request',
+            field=paypal.fields.CompressedTextField(max_length=512, blank=True),
+        ),
+        migrations.AlterField(
+            model_name='expresstransaction',
+            name='raw_response',
+            field=paypal.fields.CompressedTextField(max_length=512, blank=True),
+        ),
+        migrations.AlterField(
+            model_name='payflowtransaction',
+            name='raw_request',
+            field=paypal.fields.CompressedTextField(max_length=512, blank=True),
+        ),
+        migrations.AlterField(
+            model_name='payflowtransaction',
+            name='raw_response',
+            field=paypal.fields.CompressedTextField(max_length=512, blank=True),
+        ),
+        migrations.RemoveField(
+            model_name='expresstransaction',
+            name='raw_request',
+        ),
+        migrations.RemoveField(
+            model_name='expresstransaction',
+            name='raw_response',
+        ),
+        migrations.RemoveField(
+            model_name='payflowtransaction',
+            name='raw_request',
+        ),
+        migrations.RemoveField(
+            model_name='payflowtransaction',
+            name='raw_response',
+        ),
+    ]
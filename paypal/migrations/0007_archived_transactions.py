@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import paypal.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('paypal', '0006_transaction_payloads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('model_name', models.CharField(max_length=32)),
+                ('original_id', models.PositiveIntegerField()),
+                ('date_created', models.DateTimeField(db_index=True)),
+                ('data', paypal.fields.CompressedTextField(always_compress=True)),
+                ('date_archived', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+            },
+            bases=(models.Model,),
+        ),
+        migrations.AlterUniqueTogether(
+            name='archivedtransaction',
+            unique_together=set([('model_name', 'original_id')]),
+        ),
+    ]
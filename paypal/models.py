@@ -1,2 +1,3 @@
+from paypal.base import ArchivedTransaction, TransactionPayload  # noqa
 from paypal.express.models import *
-from paypal.payflow.models import *
\ No newline at end of file
+from paypal.payflow.models import *
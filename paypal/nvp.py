@@ -0,0 +1,126 @@
+"""
+Response type for PayPal's name-value pair (NVP) APIs.
+"""
+from __future__ import unicode_literals
+import re
+from decimal import Decimal as D
+
+from django.utils import six
+from django.utils.six.moves.urllib.parse import parse_qsl
+
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+# Matches indexed fields such as L_ERRORCODE0 or L_PAYMENTREQUEST_0_NAME12,
+# splitting them into the field name and the index.
+INDEXED_FIELD = re.compile(r'^(L_\w*?)(\d+)$')
+
+# Audit information which used to be returned as keys of the response dict
+AUDIT_KEYS = {
+    '_raw_request': 'raw_request',
+    '_raw_response': 'raw_response',
+    '_response_time': 'response_time',
+}
+
+
+class NVPResponse(Mapping):
+    """
+    A read-only mapping of the fields of an NVP response.
+
+    The response is only decoded and parsed when a field is first accessed,
+    and then only once.  On top of the plain mapping interface:
+
+    * :meth:`indexed` returns the values of an indexed field (eg
+      ``L_ERRORCODE0``, ``L_ERRORCODE1``, ...) as a list;
+    * :meth:`amount` returns a field as a ``Decimal``.
+
+    The audit information is available as the ``raw_request``,
+    ``raw_response`` and ``response_time`` attributes.  For backwards
+    compatibility it can also be looked up with the ``_raw_request``,
+    ``_raw_response`` and ``_response_time`` keys, though these are not
+    included when iterating.
+    """
+    __slots__ = ('_content', '_fields', '_indexed', 'raw_request',
+                 'response_time')
+
+    def __init__(self, content, raw_request=None, response_time=None):
+        self._content = content
+        self._fields = None
+        self._indexed = None
+        self.raw_request = raw_request
+        self.response_time = response_time
+
+    @property
+    def raw_response(self):
+        if isinstance(self._content, six.binary_type):
+            self._content = self._content.decode('utf8')
+        return self._content
+
+    @property
+    def fields(self):
+        if self._fields is None:
+            self._fields = self._parse()
+        return self._fields
+
+    def _parse(self):
+        if six.PY2:
+            # Python 2's parse_qsl only handles UTF-8 escapes in bytes
+            content = self._content
+            if isinstance(content, six.text_type):
+                content = content.encode('utf8')
+        else:
+            # ...whereas Python 3's only handles them in text
+            content = self.raw_response
+        fields = {}
+        for key, value in parse_qsl(content):
+            if isinstance(key, six.binary_type):
+                key = key.decode('utf8')
+            if isinstance(value, six.binary_type):
+                value = value.decode('utf8')
+            fields[key] = value
+        return fields
+
+    def __getitem__(self, key):
+        if key in AUDIT_KEYS:
+            return getattr(self, AUDIT_KEYS[key])
+        return self.fields[key]
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __repr__(self):
+        return '<NVPResponse %r>' % self.fields
+
+    def indexed(self, name):
+        """
+        Return the values of an indexed field as a list, eg
+        ``indexed('L_ERRORCODE')`` for ``L_ERRORCODE0``, ``L_ERRORCODE1``,
+        ...  Missing indices are ``None``.
+        """
+        if self._indexed is None:
+            groups = {}
+            for key, value in self.fields.items():
+                match = INDEXED_FIELD.match(key)
+                if match:
+                    field, index = match.groups()
+                    groups.setdefault(field, {})[int(index)] = value
+            self._indexed = groups
+        values = self._indexed.get(name, {})
+        if not values:
+            return []
+        return [values.get(index) for index in range(max(values) + 1)]
+
+    def amount(self, key, default=None):
+        """
+        Return a field as a ``Decimal``, or ``default`` if it is missing or
+        empty.
+        """
+        value = self.fields.get(key)
+        if not value:
+            return default
+        return D(value)
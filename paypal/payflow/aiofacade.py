@@ -0,0 +1,79 @@
+"""
+Asynchronous versions of the :mod:`paypal.payflow.facade` functions.
+"""
+from oscar.apps.payment import exceptions
+
+from paypal.aiogateway import sync_to_async
+from paypal.payflow import aiogateway, codes, facade
+
+
+async def authorize(order_number, amt, bankcard, billing_address=None):
+    """
+    Make an *authorisation* request
+    """
+    return await _submit_payment_details(
+        aiogateway.authorize, order_number, amt, bankcard, billing_address)
+
+
+async def sale(order_number, amt, bankcard, billing_address=None):
+    """
+    Make a *sale* request
+    """
+    return await _submit_payment_details(
+        aiogateway.sale, order_number, amt, bankcard, billing_address)
+
+
+async def _submit_payment_details(
+        gateway_fn, order_number, amt, bankcard, billing_address=None):
+    txn = await gateway_fn(
+        order_number, amt=amt,
+        **facade._payment_kwargs(bankcard, billing_address))
+    if not txn.is_approved:
+        raise exceptions.UnableToTakePayment(txn.respmsg)
+    return txn
+
+
+async def delayed_capture(order_number, pnref=None, amt=None):
+    """
+    Capture funds that have been previously authorized.
+    """
+    if pnref is None:
+        pnref = await sync_to_async(facade._lookup_pnref)(
+            order_number, (codes.AUTHORIZATION,))
+    txn = await aiogateway.delayed_capture(order_number, pnref, amt)
+    if not txn.is_approved:
+        raise exceptions.UnableToTakePayment(txn.respmsg)
+    return txn
+
+
+async def referenced_sale(order_number, pnref, amt):
+    """
+    Capture funds using the bank/address details of a previous transaction
+    """
+    txn = await aiogateway.reference_transaction(order_number, pnref, amt)
+    if not txn.is_approved:
+        raise exceptions.UnableToTakePayment(txn.respmsg)
+    return txn
+
+
+async def void(order_number, pnref):
+    """
+    Void an authorisation transaction to prevent it from being settled
+    """
+    txn = await aiogateway.void(order_number, pnref)
+    if not txn.is_approved:
+        raise exceptions.PaymentError(txn.respmsg)
+    return txn
+
+
+async def credit(order_number, pnref=None, amt=None):
+    """
+    Return funds that have been previously settled.
+    """
+    if pnref is None:
+        pnref = await sync_to_async(facade._lookup_pnref)(
+            order_number, (codes.AUTHORIZATION, codes.SALE))
+    txn = await aiogateway.credit(order_number, pnref, amt)
+    if not txn.is_approved:
+        raise exceptions.PaymentError(txn.respmsg)
+    return txn
@@ -0,0 +1,81 @@
+"""
+Asynchronous versions of the :mod:`paypal.payflow.gateway` functions.
+
+Like the synchronous gateway, this module is ignorant of Oscar.
+"""
+import logging
+
+from paypal import aiogateway
+from paypal.aiogateway import sync_to_async
+from paypal.payflow import codes
+from paypal.payflow import gateway as sync_gateway
+
+logger = logging.getLogger('paypal.payflow')
+
+
+async def authorize(order_number, card_number, cvv, expiry_date, amt,
+                    **kwargs):
+    """
+    Make an AUTHORIZE request.
+    """
+    return await _transaction(sync_gateway._payment_details_params(
+        codes.AUTHORIZATION, order_number, card_number, cvv, expiry_date,
+        amt, **kwargs))
+
+
+async def sale(order_number, card_number, cvv, expiry_date, amt, **kwargs):
+    """
+    Make a SALE request.
+    """
+    return await _transaction(sync_gateway._payment_details_params(
+        codes.SALE, order_number, card_number, cvv, expiry_date, amt,
+        **kwargs))
+
+
+async def delayed_capture(order_number, pnref, amt=None):
+    """
+    Perform a DELAYED CAPTURE transaction.
+    """
+    return await _transaction(
+        sync_gateway._delayed_capture_params(order_number, pnref, amt))
+
+
+async def reference_transaction(order_number, pnref, amt):
+    """
+    Capture money using the card/address details of a previous transaction
+    """
+    return await _transaction(
+        sync_gateway._reference_transaction_params(order_number, pnref, amt))
+
+
+async def credit(order_number, pnref, amt=None):
+    """
+    Refund money back to a bankcard.
+    """
+    return await _transaction(
+        sync_gateway._credit_params(order_number, pnref, amt))
+
+
+async def void(order_number, pnref):
+    """
+    Prevent a transaction from being settled
+    """
+    return await _transaction(sync_gateway._void_params(order_number, pnref))
+
+
+async def _transaction(extra_params):
+    """
+    Perform a transaction with PayPal without blocking the event loop.
+    """
+    params = sync_gateway._build_params(extra_params)
+    url = sync_gateway._get_url()
+
+    trxtype = params['TRXTYPE']
+    logger.info("Performing async %s transaction (trxtype=%s)",
+                codes.trxtype_map[trxtype], trxtype)
+    policy = sync_gateway._get_call_policy(trxtype)
+    response = await aiogateway.post(
+        url, params, headers=sync_gateway._get_headers(policy), policy=policy)
+
+    return await sync_to_async(sync_gateway._record_transaction)(
+        params, response)
@@ -10,6 +10,7 @@ class PayFlowDashboardApplication(Application):
     name = None
     list_view = views.TransactionListView
     detail_view = views.TransactionDetailView
+    export_view = views.TransactionExportView
 
     def get_urls(self):
         urlpatterns = patterns('',
@@ -17,6 +18,8 @@ class PayFlowDashboardApplication(Application):
                 name='paypal-payflow-list'),
             url(r'^transactions/(?P<pk>\d+)/$', self.detail_view.as_view(),
                 name='paypal-payflow-detail'),
+            url(r'^transactions/export/$', self.export_view.as_view(),
+                name='paypal-payflow-export'),
         )
         return self.post_process_urls(urlpatterns)
 
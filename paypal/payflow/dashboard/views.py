@@ -6,8 +6,10 @@ from django.conf import settings
 from django import http
 from django.utils.translation import ugettext as _
 
+from paypal import archive, export
 from paypal.payflow import models
 from paypal.payflow import facade
+from paypal.routers import get_dashboard_database
 
 
 class TransactionListView(generic.ListView):
@@ -15,12 +17,30 @@ class TransactionListView(generic.ListView):
     template_name = 'paypal/payflow/transaction_list.html'
     context_object_name = 'transactions'
 
+    def get_queryset(self):
+        return super(TransactionListView, self).get_queryset().using(
+            get_dashboard_database())
+
 
 class TransactionDetailView(generic.DetailView):
     model = models.PayflowTransaction
     template_name = 'paypal/payflow/transaction_detail.html'
     context_object_name = 'txn'
 
+    def get_queryset(self):
+        return super(TransactionDetailView, self).get_queryset().using(
+            get_dashboard_database())
+
+    def get_object(self, queryset=None):
+        try:
+            return super(TransactionDetailView, self).get_object(queryset)
+        except http.Http404:
+            # Fall back to the archive for old transactions
+            txn = archive.get_archived(self.model, self.kwargs['pk'])
+            if txn is None:
+                raise
+            return txn
+
     def get_context_data(self, **kwargs):
         ctx = super(TransactionDetailView, self).get_context_data(**kwargs)
         ctx['show_form_buttons'] = getattr(
@@ -29,7 +49,8 @@ class TransactionDetailView(generic.DetailView):
 
     def post(self, request, *args, **kwargs):
         orig_txn = self.get_object()
-        if not getattr(settings, 'PAYPAL_PAYFLOW_DASHBOARD_FORMS', False):
+        if (orig_txn.is_archived or
+                not getattr(settings, 'PAYPAL_PAYFLOW_DASHBOARD_FORMS', False)):
             messages.error(self.request, _("Dashboard actions not permitted"))
             return http.HttpResponseRedirect(
                 reverse('paypal-payflow-detail', kwargs={'pk': orig_txn.id}))
@@ -45,7 +66,7 @@ class TransactionDetailView(generic.DetailView):
 
     def capture(self, orig_txn):
         try:
-            txn = facade.delayed_capture(orig_txn.comment1)
+            facade.delayed_capture(orig_txn.comment1)
         except Exception as e:
             messages.error(
                 self.request, _("Unable to settle transaction - %s") % e)
@@ -54,29 +75,37 @@ class TransactionDetailView(generic.DetailView):
         else:
             messages.success(
                 self.request, _("Transaction %s settled") % orig_txn.pnref)
-            return http.HttpResponseRedirect(reverse('paypal-payflow-detail',
-                                                     kwargs={'pk': txn.id}))
+            return self._redirect(orig_txn)
 
     def credit(self, orig_txn):
         try:
-            txn = facade.credit(orig_txn.comment1)
+            facade.credit(orig_txn.comment1)
         except Exception as e:
             messages.error(self.request, _("Unable to credit transaction - %s") % e)
             return http.HttpResponseRedirect(reverse('paypal-payflow-detail',
                                                      kwargs={'pk': orig_txn.id}))
         else:
             messages.success(self.request, _("Transaction %s credited") % orig_txn.pnref)
-            return http.HttpResponseRedirect(reverse('paypal-payflow-detail',
-                                                     kwargs={'pk': txn.id}))
+            return self._redirect(orig_txn)
 
     def void(self, orig_txn):
         try:
-            txn = facade.void(orig_txn.comment1, orig_txn.pnref)
+            facade.void(orig_txn.comment1, orig_txn.pnref)
         except Exception as e:
             messages.error(self.request, _("Unable to void transaction - %s") % e)
             return http.HttpResponseRedirect(reverse('paypal-payflow-detail',
                                                      kwargs={'pk': orig_txn.id}))
         else:
             messages.success(self.request, _("Transaction %s voided") % orig_txn.pnref)
-            return http.HttpResponseRedirect(reverse('paypal-payflow-detail',
-                                                     kwargs={'pk': txn.id}))
+            return self._redirect(orig_txn)
+
+    def _redirect(self, orig_txn):
+        # Back to the original transaction rather than the new one, which
+        # was written to the primary database and may not have reached the
+        # dashboard database (eg a replica) yet
+        return http.HttpResponseRedirect(
+            reverse('paypal-payflow-detail', kwargs={'pk': orig_txn.id}))
+
+
+class TransactionExportView(export.ExportView):
+    kind = 'payflow'
@@ -4,6 +4,7 @@ Bridging module between Oscar and the gateway module (which is Oscar agnostic)
 from __future__ import unicode_literals
 from oscar.apps.payment import exceptions
 
+from paypal import audit
 from paypal.payflow import gateway, models, codes
 
 
@@ -55,6 +56,14 @@ def sale(order_number, amt, bankcard, billing_address=None):
 
 def _submit_payment_details(
         gateway_fn, order_number, amt, bankcard, billing_address=None):
+    txn = gateway_fn(
+        order_number, amt=amt, **_payment_kwargs(bankcard, billing_address))
+    if not txn.is_approved:
+        raise exceptions.UnableToTakePayment(txn.respmsg)
+    return txn
+
+
+def _payment_kwargs(bankcard, billing_address=None):
     # Remap address fields if set.
     address_fields = {}
     if billing_address:
@@ -67,16 +76,11 @@ def _submit_payment_details(
             'zip': billing_address['postcode'].strip(' ')
         })
 
-    txn = gateway_fn(
-        order_number,
+    return dict(
         card_number=bankcard.number,
         cvv=bankcard.cvv,
         expiry_date=bankcard.expiry_month("%m%y"),
-        amt=amt,
         **address_fields)
-    if not txn.is_approved:
-        raise exceptions.UnableToTakePayment(txn.respmsg)
-    return txn
 
 
 def delayed_capture(order_number, pnref=None, amt=None):
@@ -100,13 +104,7 @@ def delayed_capture(order_number, pnref=None, amt=None):
     if pnref is None:
         # No PNREF specified, look-up the auth transaction for this order number
         # to get the PNREF from there.
-        try:
-            auth_txn = models.PayflowTransaction.objects.get(
-                comment1=order_number, trxtype=codes.AUTHORIZATION)
-        except models.PayflowTransaction.DoesNotExist:
-            raise exceptions.UnableToTakePayment(
-                "No authorization transaction found with PNREF=%s" % pnref)
-        pnref = auth_txn
+        pnref = _lookup_pnref(order_number, (codes.AUTHORIZATION,))
 
     txn = gateway.delayed_capture(order_number, pnref, amt)
     if not txn.is_approved:
@@ -167,16 +165,23 @@ def credit(order_number, pnref=None, amt=None):
     if pnref is None:
         # No PNREF specified, look-up the auth/sale transaction for this order number
         # to get the PNREF from there.
-        try:
-            auth_txn = models.PayflowTransaction.objects.get(
-                comment1=order_number, trxtype__in=(codes.AUTHORIZATION,
-                                                    codes.SALE))
-        except models.PayflowTransaction.DoesNotExist:
-            raise exceptions.UnableToTakePayment(
-                "No authorization transaction found with PNREF=%s" % pnref)
-        pnref = auth_txn
+        pnref = _lookup_pnref(order_number, (codes.AUTHORIZATION, codes.SALE))
 
     txn = gateway.credit(order_number, pnref, amt)
     if not txn.is_approved:
         raise exceptions.PaymentError(txn.respmsg)
     return txn
+
+
+def _lookup_pnref(order_number, trxtypes):
+    """
+    Return the original transaction of one of the given types for an order
+    number, to be used as its PNREF.
+    """
+    audit.flush()
+    try:
+        return models.PayflowTransaction.objects.get(
+            comment1=order_number, trxtype__in=trxtypes)
+    except models.PayflowTransaction.DoesNotExist:
+        raise exceptions.UnableToTakePayment(
+            "No authorization transaction found for order %s" % order_number)
@@ -4,11 +4,12 @@ non-Oscar project.  All Oscar-related functionality should be in the facade.
 """
 from __future__ import unicode_literals
 import logging
+import uuid
 
 from django.conf import settings
 from django.core import exceptions
 
-from paypal import gateway
+from paypal import audit, gateway, metrics
 from paypal.payflow import models
 from paypal.payflow import codes
 
@@ -44,7 +45,13 @@ def _submit_payment_details(trxtype, order_number, card_number, cvv, expiry_date
     """
     Submit payment details to PayPal.
     """
-    params = {
+    return _transaction(_payment_details_params(
+        trxtype, order_number, card_number, cvv, expiry_date, amt, **kwargs))
+
+
+def _payment_details_params(trxtype, order_number, card_number, cvv,
+                            expiry_date, amt, **kwargs):
+    return {
         'TRXTYPE': trxtype,
         'TENDER': codes.BANKCARD,
         'AMT': amt,
@@ -66,7 +73,6 @@ def _submit_payment_details(trxtype, order_number, card_number, cvv, expiry_date
         'EMAIL': kwargs.get('user_email', ''),
         'PHONENUM': kwargs.get('billing_phone_number', ''),
     }
-    return _transaction(params)
 
 
 def delayed_capture(order_number, pnref, amt=None):
@@ -75,6 +81,10 @@ def delayed_capture(order_number, pnref, amt=None):
 
     This captures money that was previously authorised.
     """
+    return _transaction(_delayed_capture_params(order_number, pnref, amt))
+
+
+def _delayed_capture_params(order_number, pnref, amt=None):
     params = {
         'COMMENT1': order_number,
         'TRXTYPE': codes.DELAYED_CAPTURE,
@@ -82,7 +92,7 @@ def delayed_capture(order_number, pnref, amt=None):
     }
     if amt:
         params['AMT'] = amt
-    return _transaction(params)
+    return params
 
 
 def reference_transaction(order_number, pnref, amt):
@@ -91,7 +101,11 @@ def reference_transaction(order_number, pnref, amt):
 
     * The PNREF of the original txn is valid for 12 months
     """
-    params = {
+    return _transaction(_reference_transaction_params(order_number, pnref, amt))
+
+
+def _reference_transaction_params(order_number, pnref, amt):
+    return {
         'COMMENT1': order_number,
         # Use SALE as we are effectively authorising and settling a new
         # transaction
@@ -100,13 +114,16 @@ def reference_transaction(order_number, pnref, amt):
         'ORIGID': pnref,
         'AMT': amt,
     }
-    return _transaction(params)
 
 
 def credit(order_number, pnref, amt=None):
     """
     Refund money back to a bankcard.
     """
+    return _transaction(_credit_params(order_number, pnref, amt))
+
+
+def _credit_params(order_number, pnref, amt=None):
     params = {
         'COMMENT1': order_number,
         'TRXTYPE': codes.CREDIT,
@@ -114,19 +131,22 @@ def credit(order_number, pnref, amt=None):
     }
     if amt:
         params['AMT'] = amt
-    return _transaction(params)
+    return params
 
 
 def void(order_number, pnref):
     """
     Prevent a transaction from being settled
     """
-    params = {
+    return _transaction(_void_params(order_number, pnref))
+
+
+def _void_params(order_number, pnref):
+    return {
         'COMMENT1': order_number,
         'TRXTYPE': codes.VOID,
         'ORIGID': pnref
     }
-    return _transaction(params)
 
 
 def _transaction(extra_params):
@@ -136,6 +156,23 @@ def _transaction(extra_params):
     :extra_params: Additional parameters to include in the payload other than
     the user credentials.
     """
+    params = _build_params(extra_params)
+    url = _get_url()
+
+    trxtype = params['TRXTYPE']
+    logger.info("Performing %s transaction (trxtype=%s)",
+                codes.trxtype_map[trxtype], trxtype)
+    policy = _get_call_policy(trxtype)
+    response = gateway.post(url, params, headers=_get_headers(policy),
+                            policy=policy)
+
+    return _record_transaction(params, response)
+
+
+def _build_params(extra_params):
+    """
+    Validate the parameters for a transaction and add the credentials.
+    """
     if 'TRXTYPE' not in extra_params:
         raise RuntimeError("All transactions must specify a 'TRXTYPE' paramter")
 
@@ -179,35 +216,72 @@ def _transaction(extra_params):
             params['CURRENCY'] = getattr(settings,
                                          'PAYPAL_PAYFLOW_CURRENCY', 'USD')
         params['AMT'] = "%.2f" % params['AMT']
+    return params
+
+
+def _get_call_policy(trxtype):
+    """
+    Return the timeouts and retry budget for a transaction type.  These can be
+    customised per TRXTYPE with the PAYPAL_HTTP_POLICIES setting.
+
+    Every transaction carries a request ID, so Payflow recognises a retried
+    call as a duplicate rather than processing it twice.  This makes all
+    transaction types safe to retry.
+    """
+    return gateway.get_call_policy(trxtype, {'retries': 2})
+
+
+def _get_headers(policy):
+    """
+    Return the Payflow HTTP headers for a single transaction.  The same
+    headers (and so the same request ID) are used for any retries.
+    """
+    return {
+        'X-VPS-REQUEST-ID': uuid.uuid4().hex,
+        'X-VPS-CLIENT-TIMEOUT': '%d' % policy.read_timeout,
+    }
 
+
+def _get_url():
+    # An explicit URL (eg of a local simulator) takes precedence
+    url = getattr(settings, 'PAYPAL_PAYFLOW_URL', None)
+    if url:
+        return url
     if getattr(settings, 'PAYPAL_PAYFLOW_PRODUCTION_MODE', False):
-        url = 'https://payflowpro.paypal.com'
-    else:
-        url = 'https://pilot-payflowpro.paypal.com'
+        return 'https://payflowpro.paypal.com'
+    return 'https://pilot-payflowpro.paypal.com'
 
-    logger.info("Performing %s transaction (trxtype=%s)",
-                codes.trxtype_map[trxtype], trxtype)
-    pairs = gateway.post(url, params)
 
-    # Beware - this log information will contain the Payflow credentials
-    # only use it in development, not production.
-    logger.debug("Raw request: %s", pairs['_raw_request'])
-    logger.debug("Raw response: %s", pairs['_raw_response'])
+def _record_transaction(params, response):
+    """
+    Save and return the audit record for a transaction.
+
+    :response: The :class:`paypal.nvp.NVPResponse` returned by the transport.
+    """
+    # Credentials and card details are masked by the transport, but the
+    # request still contains customer details - only use this in development.
+    logger.debug("Raw request: %s", response['_raw_request'])
+    logger.debug("Raw response: %s", response['_raw_response'])
 
-    return models.PayflowTransaction.objects.create(
+    txn = models.PayflowTransaction(
         comment1=params['COMMENT1'],
         trxtype=params['TRXTYPE'],
         tender=params.get('TENDER', None),
         amount=params.get('AMT', None),
-        pnref=pairs.get('PNREF', None),
-        ppref=pairs.get('PPREF', None),
-        cvv2match=pairs.get('CVV2MATCH', None),
-        avsaddr=pairs.get('AVSADDR', None),
-        avszip=pairs.get('AVSZIP', None),
-        result=pairs.get('RESULT', None),
-        respmsg=pairs.get('RESPMSG', None),
-        authcode=pairs.get('AUTHCODE', None),
-        raw_request=pairs['_raw_request'],
-        raw_response=pairs['_raw_response'],
-        response_time=pairs['_response_time']
+        pnref=response.get('PNREF', None),
+        ppref=response.get('PPREF', None),
+        cvv2match=response.get('CVV2MATCH', None),
+        avsaddr=response.get('AVSADDR', None),
+        avszip=response.get('AVSZIP', None),
+        result=response.get('RESULT', None),
+        respmsg=response.get('RESPMSG', None),
+        authcode=response.get('AUTHCODE', None),
+        raw_request=response['_raw_request'],
+        raw_response=response['_raw_response'],
+        response_time=response['_response_time']
     )
+    result = txn.result or ''
+    metrics.call_succeeded(txn.trxtype, result,
+                           '' if result == '0' else result,
+                           txn.response_time / 1000.0)
+    return audit.record(txn, call=txn.trxtype, successful=txn.is_approved)
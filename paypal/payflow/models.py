@@ -1,5 +1,4 @@
 from __future__ import unicode_literals
-import re
 
 from django.db import models
 from django.utils.encoding import python_2_unicode_compatible
@@ -14,7 +13,7 @@ from paypal import base
 class PayflowTransaction(base.ResponseModel):
     # This is the linking parameter between the merchant and PayPal.  It is
     # normally set to the order number
-    comment1 = models.CharField(_("Comment 1"), max_length=128, db_index=True)
+    comment1 = models.CharField(_("Comment 1"), max_length=128)
 
     trxtype = models.CharField(_("Transaction type"), max_length=12)
     tender = models.CharField(_("Bankcard or PayPal"), max_length=12, null=True)
@@ -24,7 +23,7 @@ class PayflowTransaction(base.ResponseModel):
 
     # Response params
     pnref = models.CharField(_("Payflow transaction ID"), max_length=32,
-                             null=True)
+                             null=True, db_index=True)
     ppref = models.CharField(_("Payment transaction ID"), max_length=32,
                              unique=True, null=True)
     result = models.CharField(max_length=32, null=True, blank=True)
@@ -43,12 +42,8 @@ class PayflowTransaction(base.ResponseModel):
     class Meta:
         ordering = ('-date_created',)
         app_label = 'paypal'
-
-    def save(self, *args, **kwargs):
-        self.raw_request = re.sub(r'PWD=.+?&', 'PWD=XXXXXX&', self.raw_request)
-        self.raw_request = re.sub(r'ACCT=\d+(\d{4})&', 'ACCT=XXXXXXXXXXXX\1&', self.raw_request)
-        self.raw_request = re.sub(r'CVV2=\d+&', 'CVV2=XXX&', self.raw_request)
-        return super(PayflowTransaction, self).save(*args, **kwargs)
+        # The facade looks up transactions by order number and type
+        index_together = [('comment1', 'trxtype')]
 
     def get_trxtype_display(self):
         return ugettext(codes.trxtype_map.get(self.trxtype, self.trxtype))
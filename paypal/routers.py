@@ -0,0 +1,66 @@
+"""
+Database router for keeping the audit records in their own database.
+
+Add it to your settings with::
+
+    DATABASE_ROUTERS = ['paypal.routers.PayPalRouter']
+
+The models of the ``paypal`` app are then read from and written to the
+``PAYPAL_DATABASE`` alias.  As each alias has its own connection, the audit
+records are committed independently of any transaction on the ``default``
+database (eg a checkout's order placement) - even when both aliases point at
+the same database.
+"""
+from __future__ import unicode_literals
+
+from django.conf import settings
+
+APP_LABEL = 'paypal'
+
+
+def get_database():
+    """
+    Return the alias of the database the ``paypal`` models are written to.
+    """
+    return getattr(settings, 'PAYPAL_DATABASE', 'default')
+
+
+def get_dashboard_database():
+    """
+    Return the alias the dashboards and exports read from, eg a replica.
+    Other reads (like the facades' lookups of earlier transactions) always
+    use :func:`get_database` so they see the latest writes.
+    """
+    return (getattr(settings, 'PAYPAL_DASHBOARD_DATABASE', None) or
+            get_database())
+
+
+class PayPalRouter(object):
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == APP_LABEL:
+            # Related objects (eg a transaction's payload) are read from the
+            # database their parent came from, such as the dashboard replica
+            instance = hints.get('instance')
+            if instance is not None and instance._state.db:
+                return instance._state.db
+            return get_database()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == APP_LABEL:
+            return get_database()
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if (obj1._meta.app_label == APP_LABEL and
+                obj2._meta.app_label == APP_LABEL):
+            return True
+
+    def allow_migrate(self, db, app_label, model=None, **hints):
+        # Django 1.7 passes the model rather than the app label
+        if hasattr(app_label, '_meta'):
+            app_label = app_label._meta.app_label
+        database = get_database()
+        if app_label == APP_LABEL:
+            return db == database
+        if db != 'default' and db in (database, get_dashboard_database()):
+            return False
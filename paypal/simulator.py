@@ -0,0 +1,488 @@
+"""
+A local server which speaks PayPal's NVP protocols, for load and latency
+testing without the real sandbox.
+
+It handles the Express methods used by :mod:`paypal.express.gateway`
+(SetExpressCheckout, GetExpressCheckoutDetails, DoExpressCheckoutPayment,
+DoCapture, DoVoid and RefundTransaction) and the Payflow Pro transaction types
+used by :mod:`paypal.payflow.gateway` (S, A, D, C and V).  It also serves the
+``/webscr`` page that customers are redirected to, which immediately sends
+them back to the RETURNURL as if they had approved the payment.
+
+Latency, error rates and throttling are configurable.  Run it with::
+
+    python -m paypal.simulator --port 8008 --latency normal:80:20
+
+and point the gateways at it::
+
+    PAYPAL_API_URL = 'http://127.0.0.1:8008/nvp'
+    PAYPAL_CHECKOUT_URL = 'http://127.0.0.1:8008/webscr'
+    PAYPAL_PAYFLOW_URL = 'http://127.0.0.1:8008/'
+
+This module only uses the standard library so it can run outside Django.
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import collections
+import random
+import threading
+import time
+import uuid
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qsl, urlencode, urlsplit
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import urlencode
+    from urlparse import parse_qsl, urlsplit
+
+
+class Latency(object):
+    """
+    A latency distribution in milliseconds, parsed from a spec such as
+    ``fixed:50``, ``uniform:20:200``, ``normal:80:20`` or
+    ``lognormal:4.4:0.5`` (the mean and sigma of the underlying normal).
+    """
+
+    def __init__(self, spec='fixed:0'):
+        parts = spec.split(':')
+        self.kind = parts[0]
+        self.args = [float(x) for x in parts[1:]]
+        if self.kind not in ('fixed', 'uniform', 'normal', 'lognormal'):
+            raise ValueError("Unknown latency distribution '%s'" % self.kind)
+
+    def sample(self):
+        """
+        Return a latency in seconds.
+        """
+        if self.kind == 'fixed':
+            ms = self.args[0]
+        elif self.kind == 'uniform':
+            ms = random.uniform(*self.args)
+        elif self.kind == 'normal':
+            ms = random.normalvariate(*self.args)
+        else:
+            ms = random.lognormvariate(*self.args)
+        return max(ms, 0) / 1000.0
+
+
+class SimulatorConfig(object):
+    """
+    :latency: Default :class:`Latency` for all calls.
+    :method_latency: Dict of Express METHOD or Payflow TRXTYPE to
+                     :class:`Latency`, overriding the default.
+    :error_rate: Fraction of calls that get an API-level failure (ACK=Failure
+                 or a non-zero Payflow RESULT).
+    :http_error_rate: Fraction of calls that get an HTTP 500.
+    :throttle_rate: Fraction of calls that are throttled with HTTP 503.
+    :max_rps: Calls per second above which requests are throttled.
+    """
+
+    def __init__(self, latency=None, method_latency=None, error_rate=0.0,
+                 http_error_rate=0.0, throttle_rate=0.0, max_rps=None):
+        self.latency = latency or Latency()
+        self.method_latency = method_latency or {}
+        self.error_rate = error_rate
+        self.http_error_rate = http_error_rate
+        self.throttle_rate = throttle_rate
+        self.max_rps = max_rps
+
+
+class _RateLimiter(object):
+    """
+    A token bucket allowing ``rate`` calls per second.
+    """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            now = time.time()
+            self.tokens = min(
+                self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+# How many Payflow request IDs are remembered for detecting duplicates
+MAX_PAYFLOW_REQUESTS = 10000
+
+
+class _State(object):
+    """
+    Checkout and transaction state shared between requests.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = {}
+        # Responses by request ID, oldest first.  Only the most recent are
+        # kept, so long load tests don't grow without bound.
+        self.payflow_requests = collections.OrderedDict()
+
+    def remember_payflow_request(self, request_id, pairs):
+        with self.lock:
+            self.payflow_requests[request_id] = pairs
+            while len(self.payflow_requests) > MAX_PAYFLOW_REQUESTS:
+                self.payflow_requests.popitem(last=False)
+
+    def next_id(self, prefix, length=17):
+        return '%s%s' % (prefix, uuid.uuid4().hex.upper()[:length])
+
+
+def _common(method_params):
+    return [
+        ('TIMESTAMP', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())),
+        ('CORRELATIONID', uuid.uuid4().hex[:13]),
+        ('ACK', 'Success'),
+        ('VERSION', method_params.get('VERSION', '119')),
+        ('BUILD', '000000'),
+    ]
+
+
+def _express_failure(params, code, message):
+    pairs = _common(params)
+    pairs[2] = ('ACK', 'Failure')
+    pairs.extend([
+        ('L_ERRORCODE0', code),
+        ('L_SHORTMESSAGE0', message),
+        ('L_LONGMESSAGE0', message),
+        ('L_SEVERITYCODE0', 'Error'),
+    ])
+    return pairs
+
+
+def set_express_checkout(state, params):
+    token = 'EC-%s' % state.next_id('')
+    with state.lock:
+        state.tokens[token] = {
+            'amount': params.get('PAYMENTREQUEST_0_AMT', '0.00'),
+            'currency': params.get('PAYMENTREQUEST_0_CURRENCYCODE', 'GBP'),
+            'shipping': params.get('PAYMENTREQUEST_0_SHIPPINGAMT', '0.00'),
+            'shipping_name': params.get('L_SHIPPINGOPTIONNAME0'),
+            'return_url': params.get('RETURNURL'),
+            'payer_id': state.next_id('', 13),
+        }
+    return [('TOKEN', token)] + _common(params)
+
+
+def _get_token(state, params):
+    with state.lock:
+        return state.tokens.get(params.get('TOKEN'))
+
+
+def get_express_checkout_details(state, params):
+    checkout = _get_token(state, params)
+    if checkout is None:
+        return _express_failure(params, '10410', 'Invalid token')
+    pairs = [('TOKEN', params['TOKEN'])] + _common(params)
+    pairs.extend([
+        ('CHECKOUTSTATUS', 'PaymentActionNotInitiated'),
+        ('EMAIL', 'buyer@example.com'),
+        ('PAYERID', checkout['payer_id']),
+        ('PAYERSTATUS', 'verified'),
+        ('FIRSTNAME', 'Test'),
+        ('LASTNAME', 'Buyer'),
+        ('COUNTRYCODE', 'GB'),
+        ('CURRENCYCODE', checkout['currency']),
+        ('AMT', checkout['amount']),
+        ('SHIPPINGAMT', checkout['shipping']),
+        ('PAYMENTREQUEST_0_CURRENCYCODE', checkout['currency']),
+        ('PAYMENTREQUEST_0_AMT', checkout['amount']),
+        ('PAYMENTREQUEST_0_SHIPPINGAMT', checkout['shipping']),
+        ('PAYMENTREQUEST_0_SHIPTONAME', 'Test Buyer'),
+        ('PAYMENTREQUEST_0_SHIPTOSTREET', '1 Main Terrace'),
+        ('PAYMENTREQUEST_0_SHIPTOCITY', 'Wolverhampton'),
+        ('PAYMENTREQUEST_0_SHIPTOSTATE', 'West Midlands'),
+        ('PAYMENTREQUEST_0_SHIPTOZIP', 'W12 4LQ'),
+        ('PAYMENTREQUEST_0_SHIPTOCOUNTRYCODE', 'GB'),
+        ('PAYMENTREQUEST_0_SHIPTOCOUNTRYNAME', 'United Kingdom'),
+    ])
+    if checkout['shipping_name']:
+        pairs.append(('SHIPPINGOPTIONNAME', checkout['shipping_name']))
+    return pairs
+
+
+def do_express_checkout_payment(state, params):
+    if _get_token(state, params) is None:
+        return _express_failure(params, '10410', 'Invalid token')
+    pairs = [('TOKEN', params['TOKEN'])] + _common(params)
+    pairs.extend([
+        ('PAYMENTINFO_0_TRANSACTIONID', state.next_id('')),
+        ('PAYMENTINFO_0_TRANSACTIONTYPE', 'expresscheckout'),
+        ('PAYMENTINFO_0_PAYMENTTYPE', 'instant'),
+        ('PAYMENTINFO_0_AMT', params.get('PAYMENTREQUEST_0_AMT', '0.00')),
+        ('PAYMENTINFO_0_CURRENCYCODE',
+         params.get('PAYMENTREQUEST_0_CURRENCYCODE', 'GBP')),
+        ('PAYMENTINFO_0_PAYMENTSTATUS', 'Completed'),
+        ('PAYMENTINFO_0_ERRORCODE', '0'),
+        ('PAYMENTINFO_0_ACK', 'Success'),
+    ])
+    return pairs
+
+
+def do_capture(state, params):
+    pairs = _common(params)
+    pairs.extend([
+        ('AUTHORIZATIONID', params.get('AUTHORIZATIONID', '')),
+        ('TRANSACTIONID', state.next_id('')),
+        ('AMT', params.get('AMT', '0.00')),
+        ('CURRENCYCODE', params.get('CURRENCYCODE', 'GBP')),
+        ('PAYMENTSTATUS', 'Completed'),
+    ])
+    return pairs
+
+
+def do_void(state, params):
+    return [('AUTHORIZATIONID', params.get('AUTHORIZATIONID', ''))] + \
+        _common(params)
+
+
+def refund_transaction(state, params):
+    pairs = _common(params)
+    pairs.extend([
+        ('REFUNDTRANSACTIONID', state.next_id('')),
+        ('GROSSREFUNDAMT', params.get('AMT', '0.00')),
+        ('CURRENCYCODE', params.get('CURRENCYCODE', 'GBP')),
+        ('REFUNDSTATUS', 'Instant'),
+    ])
+    return pairs
+
+
+EXPRESS_HANDLERS = {
+    'SetExpressCheckout': set_express_checkout,
+    'GetExpressCheckoutDetails': get_express_checkout_details,
+    'DoExpressCheckoutPayment': do_express_checkout_payment,
+    'DoCapture': do_capture,
+    'DoVoid': do_void,
+    'RefundTransaction': refund_transaction,
+}
+
+
+def payflow_transaction(state, params):
+    trxtype = params.get('TRXTYPE')
+    if trxtype not in ('S', 'A', 'D', 'C', 'V'):
+        return [('RESULT', '3'), ('RESPMSG', 'Invalid transaction type')]
+    if trxtype in ('D', 'C', 'V') and not params.get('ORIGID'):
+        return [('RESULT', '19'), ('RESPMSG', 'Original transaction ID not found')]
+    pairs = [
+        ('RESULT', '0'),
+        ('PNREF', state.next_id('V', 11)),
+        ('RESPMSG', 'Approved'),
+    ]
+    if trxtype in ('S', 'A'):
+        pairs.extend([
+            ('AUTHCODE', state.next_id('', 6)),
+            ('AVSADDR', 'Y'),
+            ('AVSZIP', 'Y'),
+            ('CVV2MATCH', 'Y'),
+        ])
+    return pairs
+
+
+def payflow_failure(params):
+    return [('RESULT', '12'), ('PNREF', ''), ('RESPMSG', 'Declined')]
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep connections alive
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # The page customers are redirected to.  Pretend they approved the
+        # payment and send them straight back.
+        parts = urlsplit(self.path)
+        query = dict(parse_qsl(parts.query))
+        state = self.server.state
+        with state.lock:
+            checkout = state.tokens.get(query.get('token'))
+        if parts.path != '/webscr' or checkout is None:
+            return self._respond(404, 'Not found')
+        location = '%s%s%s' % (
+            checkout['return_url'],
+            '&' if '?' in checkout['return_url'] else '?',
+            urlencode([('token', query['token']),
+                       ('PayerID', checkout['payer_id'])]))
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get('content-length', 0))
+        body = self.rfile.read(length)
+        if not isinstance(body, str):
+            body = body.decode('utf8')
+        params = dict(parse_qsl(body))
+        config = self.server.config
+        name = params.get('METHOD') or params.get('TRXTYPE')
+
+        latency = config.method_latency.get(name, config.latency)
+        time.sleep(latency.sample())
+
+        limiter = self.server.limiter
+        if (limiter and not limiter.allow()) or \
+                random.random() < config.throttle_rate:
+            return self._respond(503, 'Service Unavailable',
+                                 [('Retry-After', '1')])
+        if random.random() < config.http_error_rate:
+            return self._respond(500, 'Internal Server Error')
+
+        if 'METHOD' in params:
+            pairs = self._express(params)
+        else:
+            pairs = self._payflow(params)
+        self._respond(200, urlencode(pairs))
+
+    def _express(self, params):
+        handler = EXPRESS_HANDLERS.get(params['METHOD'])
+        if handler is None:
+            return _express_failure(params, '81002', 'Unspecified Method')
+        if random.random() < self.server.config.error_rate:
+            return _express_failure(params, '10001', 'Internal Error')
+        return handler(self.server.state, params)
+
+    def _payflow(self, params):
+        # Payflow returns the original response for a repeated request ID
+        state = self.server.state
+        request_id = self.headers.get('X-VPS-REQUEST-ID')
+        if request_id:
+            with state.lock:
+                previous = state.payflow_requests.get(request_id)
+            if previous is not None:
+                return previous + [('DUPLICATE', '1')]
+        if random.random() < self.server.config.error_rate:
+            pairs = payflow_failure(params)
+        else:
+            pairs = payflow_transaction(state, params)
+        if request_id:
+            state.remember_payflow_request(request_id, pairs)
+        return pairs
+
+    def _respond(self, status, body, headers=()):
+        body = body.encode('utf8')
+        self.send_response(status)
+        for header in headers:
+            self.send_header(*header)
+        self.send_header('Content-Type', 'text/namevalue')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, *args)
+
+
+class _ThreadedServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class Simulator(object):
+    """
+    Run the simulator in a background thread, eg from a benchmark or test::
+
+        with Simulator(SimulatorConfig(latency=Latency('fixed:20'))) as sim:
+            with override_settings(**sim.settings()):
+                ...
+    """
+
+    def __init__(self, config=None, host='127.0.0.1', port=0, verbose=False):
+        config = config or SimulatorConfig()
+        self.server = _ThreadedServer((host, port), SimulatorHandler)
+        self.server.config = config
+        self.server.state = _State()
+        self.server.limiter = _RateLimiter(config.max_rps) \
+            if config.max_rps else None
+        self.server.verbose = verbose
+        self.url = 'http://%s:%d' % self.server.server_address[:2]
+        self.thread = None
+
+    def settings(self):
+        """
+        Return the Django settings which point the gateways at this server.
+        """
+        return {
+            'PAYPAL_API_URL': self.url + '/nvp',
+            'PAYPAL_CHECKOUT_URL': self.url + '/webscr',
+            'PAYPAL_PAYFLOW_URL': self.url + '/',
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+def _parse_method_latency(values):
+    latencies = {}
+    for value in values or []:
+        name, spec = value.split('=', 1)
+        latencies[name] = Latency(spec)
+    return latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Local PayPal NVP simulator for load and latency testing")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8008)
+    parser.add_argument(
+        '--latency', default='fixed:0',
+        help="Latency distribution in ms, eg fixed:50, uniform:20:200, "
+             "normal:80:20 or lognormal:4.4:0.5")
+    parser.add_argument(
+        '--method-latency', action='append', metavar='NAME=SPEC',
+        help="Latency for one METHOD or TRXTYPE, eg "
+             "GetExpressCheckoutDetails=normal:40:5 (repeatable)")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="Fraction of calls with an API-level failure")
+    parser.add_argument('--http-error-rate', type=float, default=0.0,
+                        help="Fraction of calls answered with HTTP 500")
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help="Fraction of calls throttled with HTTP 503")
+    parser.add_argument('--max-rps', type=float,
+                        help="Throttle calls above this rate with HTTP 503")
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    config = SimulatorConfig(
+        latency=Latency(args.latency),
+        method_latency=_parse_method_latency(args.method_latency),
+        error_rate=args.error_rate,
+        http_error_rate=args.http_error_rate,
+        throttle_rate=args.throttle_rate,
+        max_rps=args.max_rps)
+    simulator = Simulator(config, args.host, args.port, args.verbose)
+    print("PayPal simulator listening on %s" % simulator.url)
+    for key, value in sorted(simulator.settings().items()):
+        print("    %s = '%s'" % (key, value))
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Coalescing of concurrent identical calls to PayPal.
+
+Double-clicks, browser prefetching and retrying proxies can send several
+requests for the same token at once.  :class:`Group` lets concurrent callers
+in a process share a single in-flight call, and :func:`exclusive` uses a
+Django cache as a lock so that a call is only ever in flight once across
+every process (and every node, if the cache is shared).  Callers which arrive
+after the call has completed get its stored result.
+"""
+from __future__ import unicode_literals
+import hashlib
+import logging
+import threading
+import time
+
+from django.core.cache import caches
+from django.utils.encoding import force_bytes
+
+from paypal import exceptions
+
+logger = logging.getLogger('paypal.gateway')
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Group(object):
+    """
+    Concurrent calls to :meth:`do` with the same key share the result (or
+    exception) of whichever call started first.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        return self.call(key, fn, *args, **kwargs)[0]
+
+    def call(self, key, fn, *args, **kwargs):
+        """
+        Like :meth:`do`, but return a ``(result, is_leader)`` tuple, where
+        ``is_leader`` is whether this caller made the call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+        if not is_leader:
+            logger.debug("Waiting for in-flight call %s", key)
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, False
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result, True
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+def exclusive(key, fn, dump, load, cache='default', lock_timeout=60,
+              result_timeout=3600, wait=None, poll_interval=0.25):
+    """
+    Call ``fn`` unless another process is already calling it (or has called
+    it) for the same key.  Return a ``(result, made_call)`` tuple, where
+    ``made_call`` is whether this caller called ``fn``.
+
+    The lock is held in a cache for at most ``lock_timeout`` seconds.  A
+    successful result is stored, as returned by ``dump``, for
+    ``result_timeout`` seconds and returned (after ``load``) to later
+    callers.  Callers which find the lock held wait up to ``wait`` seconds
+    (by default ``lock_timeout``, so as long as the call could take) for the
+    result, then fail with a ``PayPalError``.  If ``fn`` raises, no result is
+    stored and the next caller tries again.
+    """
+    if wait is None:
+        wait = lock_timeout
+    cache = caches[cache]
+    prefix = 'paypal:singleflight:%s' % hashlib.md5(
+        force_bytes(key)).hexdigest()
+    lock_key = prefix + ':lock'
+    result_key = prefix + ':result'
+
+    deadline = time.time() + wait
+    while True:
+        stored = cache.get(result_key)
+        if stored is not None:
+            break
+        if cache.add(lock_key, time.time(), lock_timeout):
+            # The result may have been stored (and the lock released) since
+            # it was checked above
+            stored = cache.get(result_key)
+            if stored is not None:
+                cache.delete(lock_key)
+                break
+            try:
+                result = fn()
+                cache.set(result_key, dump(result), result_timeout)
+                return result, True
+            finally:
+                cache.delete(lock_key)
+        if time.time() >= deadline:
+            raise exceptions.PayPalError(
+                "Another request is already processing this payment")
+        time.sleep(poll_interval)
+
+    logger.info("Returning stored result of call %s", key)
+    return load(stored), False
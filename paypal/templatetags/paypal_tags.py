@@ -0,0 +1,20 @@
+from __future__ import unicode_literals
+
+from django import template
+
+from paypal.express import prefetch
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def paypal_prefetch_token(context):
+    """
+    Start registering an Express Checkout token for the request's basket in
+    the background, if ``PAYPAL_EXPRESS_PREFETCH`` is set.  Renders nothing.
+    """
+    request = context.get('request')
+    basket = getattr(request, 'basket', None)
+    if basket is not None:
+        prefetch.prefetch(request, basket)
+    return ''
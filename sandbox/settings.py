@@ -285,6 +285,15 @@ PAYPAL_API_SIGNATURE = 'A-IzJhZZjhg29XQ2qnhapuwxIDzyAZQ92FRP5dqBzVesOkzbdUONzmOU
 PAYPAL_CURRENCY = PAYPAL_PAYFLOW_CURRENCY = 'GBP'
 PAYPAL_PAYFLOW_DASHBOARD_FORMS = True
 
+# Point both gateways at a local simulator (started with
+# "python -m paypal.simulator") by setting PAYPAL_SIMULATOR_URL, eg
+# PAYPAL_SIMULATOR_URL=http://127.0.0.1:8008
+PAYPAL_SIMULATOR_URL = os.environ.get('PAYPAL_SIMULATOR_URL')
+if PAYPAL_SIMULATOR_URL:
+    PAYPAL_API_URL = PAYPAL_SIMULATOR_URL + '/nvp'
+    PAYPAL_CHECKOUT_URL = PAYPAL_SIMULATOR_URL + '/webscr'
+    PAYPAL_PAYFLOW_URL = PAYPAL_SIMULATOR_URL + '/'
+
 # Put your own sandbox settings into an integration.py modulde (that is ignored
 # by git).
 try:
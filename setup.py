@@ -21,7 +21,10 @@ setup(
         'requests>=1.0',
         'django-localflavor'],
     extras_require={
-        'oscar': ["django-oscar>=1.0"]
+        'oscar': ["django-oscar>=1.0"],
+        'async': ["httpx"],
+        'metrics': ["prometheus_client"],
+        'export': ["pyarrow"],
     },
     # See http://pypi.python.org/pypi?%3Aaction=list_classifiers
     classifiers=[
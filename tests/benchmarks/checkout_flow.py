@@ -0,0 +1,67 @@
+"""
+Benchmark the full Express Checkout flow through the views - adding a product
+to the basket, ``RedirectView`` (SetExpressCheckout), the customer approving
+the payment on the local simulator's checkout page and ``SuccessResponseView``
+(GetExpressCheckoutDetails and DoExpressCheckoutPayment).
+
+Run against the sandbox project with::
+
+    python -m tests.benchmarks.checkout_flow [--output results.json]
+"""
+from __future__ import unicode_literals
+import argparse
+import os
+import sys
+from decimal import Decimal as D
+
+from tests.benchmarks.utils import setup_django, measure, report
+
+SANDBOX = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(
+        __file__)))), 'sandbox')
+if __name__ == '__main__':
+    sys.path.insert(0, SANDBOX)
+    setup_django('settings')
+else:
+    setup_django()
+
+from django.core.urlresolvers import reverse  # noqa
+from django.test import Client  # noqa
+from django.test.utils import override_settings  # noqa
+from oscar.test.factories import create_product  # noqa
+
+from paypal import gateway  # noqa
+from paypal.simulator import Simulator  # noqa
+
+
+def checkout(product):
+    client = Client()
+    client.post(reverse('basket:add', kwargs={'pk': product.pk}),
+                {'quantity': 1})
+    response = client.get(reverse('paypal-redirect'))
+    assert response.status_code == 302, response.status_code
+
+    # The simulator's checkout page sends the customer straight back to the
+    # return URL with the token and payer ID
+    approval = gateway.get_session().get(
+        response['Location'], allow_redirects=False)
+    response = client.get(approval.headers['Location'])
+    assert response.status_code in (200, 302), response.status_code
+
+
+def run(iterations=50):
+    product = create_product(price=D('10.00'), num_in_stock=1000000)
+    with Simulator() as simulator:
+        with override_settings(**simulator.settings()):
+            return {
+                'redirect+success': measure(
+                    lambda: checkout(product), iterations, warmup=2),
+            }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    report('checkout_flow', run(args.iterations), args.output)
@@ -0,0 +1,77 @@
+"""
+Benchmark ``_fetch_response`` end to end - building the parameters, the
+transport layer, parsing the response and recording the transaction - with
+the HTTP call itself stubbed out so only our own overhead is measured.
+
+Run with::
+
+    python -m tests.benchmarks.fetch_response [--output results.json]
+"""
+from __future__ import unicode_literals
+import argparse
+
+from tests.benchmarks.utils import setup_django, measure, report
+
+setup_django()
+
+import mock  # noqa
+from django.utils.http import urlencode  # noqa
+
+from paypal.express import gateway  # noqa
+from tests.benchmarks.parsing import build_response  # noqa
+
+
+class StubResponse(object):
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content.encode('utf8')
+
+
+SET_RESPONSE = urlencode([
+    ('TOKEN', 'EC-6LY24738AX539092T'),
+    ('TIMESTAMP', '2012-04-13T09:36:36Z'),
+    ('CORRELATIONID', 'a70f7e5a4e6e7'),
+    ('ACK', 'Success'),
+    ('VERSION', '119'),
+    ('BUILD', '2764190'),
+])
+
+
+def set_txn_params():
+    params = {
+        'PAYMENTREQUEST_0_AMT': '100.00',
+        'PAYMENTREQUEST_0_CURRENCYCODE': 'GBP',
+        'RETURNURL': 'http://example.com/success',
+        'CANCELURL': 'http://example.com/cancel',
+    }
+    for index in range(10):
+        params['L_PAYMENTREQUEST_0_NAME%d' % index] = 'Product %d' % index
+        params['L_PAYMENTREQUEST_0_AMT%d' % index] = '10.00'
+        params['L_PAYMENTREQUEST_0_QTY%d' % index] = 1
+    return params
+
+
+def run(iterations=200):
+    results = {}
+    cases = [
+        ('SetExpressCheckout', gateway.SET_EXPRESS_CHECKOUT,
+         set_txn_params(), SET_RESPONSE),
+        ('GetExpressCheckoutDetails lines=100',
+         gateway.GET_EXPRESS_CHECKOUT, {'TOKEN': 'EC-6LY24738AX539092T'},
+         build_response(100)),
+    ]
+    for name, method, params, content in cases:
+        response = StubResponse(content)
+        with mock.patch('paypal.gateway._send', return_value=response):
+            results[name] = measure(
+                lambda: gateway._fetch_response(method, params), iterations)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    report('fetch_response', run(args.iterations), args.output)
@@ -0,0 +1,70 @@
+"""
+Benchmark parsing stored responses with ``ResponseModel.context`` and
+``value()``, for responses with up to 1000 line items.
+
+Run with::
+
+    python -m tests.benchmarks.parsing [--output results.json]
+"""
+from __future__ import unicode_literals
+import argparse
+
+from tests.benchmarks.utils import setup_django, measure, report
+
+setup_django()
+
+from django.utils.http import urlencode  # noqa
+
+from paypal.express.models import ExpressTransaction  # noqa
+
+LINE_COUNTS = (1, 10, 100, 1000)
+
+
+def build_response(num_lines):
+    """
+    Return a GetExpressCheckoutDetails-style response with ``num_lines``
+    line items.
+    """
+    pairs = [
+        ('TOKEN', 'EC-6LY24738AX539092T'),
+        ('ACK', 'Success'),
+        ('VERSION', '119'),
+        ('EMAIL', 'customer@example.com'),
+        ('PAYERID', 'M5XCXXLA8GH9N'),
+        ('FIRSTNAME', 'Bärbel'),
+        ('LASTNAME', 'Smith'),
+        ('PAYMENTREQUEST_0_AMT', '%d.00' % (num_lines * 10)),
+        ('PAYMENTREQUEST_0_CURRENCYCODE', 'GBP'),
+    ]
+    for index in range(num_lines):
+        pairs.extend([
+            ('L_PAYMENTREQUEST_0_NAME%d' % index, 'Product %d' % index),
+            ('L_PAYMENTREQUEST_0_NUMBER%d' % index, '978%010d' % index),
+            ('L_PAYMENTREQUEST_0_QTY%d' % index, '1'),
+            ('L_PAYMENTREQUEST_0_AMT%d' % index, '10.00'),
+        ])
+    return urlencode(pairs)
+
+
+def run(iterations=200):
+    results = {}
+    for num_lines in LINE_COUNTS:
+        txn = ExpressTransaction(raw_response=build_response(num_lines))
+        count = max(iterations * 10 // max(num_lines, 10), 10)
+        results['context lines=%d' % num_lines] = measure(
+            lambda: txn.context, count)
+        # A typical view reads several values from the same transaction
+        results['value x5 lines=%d' % num_lines] = measure(
+            lambda: [txn.value(key) for key in (
+                'ACK', 'EMAIL', 'PAYERID', 'PAYMENTREQUEST_0_AMT',
+                'PAYMENTREQUEST_0_CURRENCYCODE')],
+            count)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    report('parsing', run(args.iterations), args.output)
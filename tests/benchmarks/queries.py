@@ -0,0 +1,121 @@
+"""
+Benchmark the transaction lookups made by the facades and dashboards against
+large synthetic tables, before and after the lookup indexes migration.
+
+For each query the database's query plan is reported along with its
+latency.  Run with::
+
+    python -m tests.benchmarks.queries [--rows 1000000] [--output results.json]
+
+Use ``--settings`` to point at a settings module using the same database
+engine as production - query plans differ a lot between engines.
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import random
+
+from tests.benchmarks.utils import setup_django, measure, report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--settings', default='tests.settings')
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    setup_django(args.settings)
+else:
+    setup_django()
+
+from django.core.management import call_command  # noqa
+from django.db import connection  # noqa
+
+from paypal.express.models import ExpressTransaction  # noqa
+from paypal.payflow.models import PayflowTransaction  # noqa
+
+BEFORE = '0003_backfill_lookup_fields'
+AFTER = '0004_lookup_indexes'
+
+# The columns read by the queries.  The transaction models have gained
+# columns since the migrations the benchmark switches between, so whole rows
+# can't be selected.
+EXPRESS_COLUMNS = ('id', 'method', 'token', 'ack', 'amount', 'date_created')
+PAYFLOW_COLUMNS = ('id', 'comment1', 'trxtype', 'pnref', 'amount',
+                   'date_created')
+
+EXPRESS_METHODS = ('SetExpressCheckout', 'GetExpressCheckoutDetails',
+                   'DoExpressCheckoutPayment')
+PAYFLOW_TYPES = ('A', 'D', 'S', 'C', 'V')
+
+
+def seed(rows, batch_size=5000):
+    """
+    Fill both tables with ``rows`` synthetic transactions each.  Express
+    tokens get three rows each, one per method, as in real checkouts.
+    """
+    ExpressTransaction.objects.all().delete()
+    PayflowTransaction.objects.all().delete()
+    express, payflow = [], []
+    for index in range(rows):
+        express.append(ExpressTransaction(
+            method=EXPRESS_METHODS[index % 3], version='119', ack='Success',
+            token='EC-%017d' % (index // 3), response_time=0))
+        payflow.append(PayflowTransaction(
+            comment1='%d' % (100000 + index // 2),
+            trxtype=PAYFLOW_TYPES[index % len(PAYFLOW_TYPES)],
+            pnref='V%011d' % index, respmsg='Approved', result='0',
+            response_time=0))
+        if len(express) >= batch_size:
+            ExpressTransaction.objects.bulk_create(express)
+            PayflowTransaction.objects.bulk_create(payflow)
+            express, payflow = [], []
+    ExpressTransaction.objects.bulk_create(express)
+    PayflowTransaction.objects.bulk_create(payflow)
+
+
+def queries(rows):
+    """
+    Return the facade and dashboard queries as (name, queryset factory)
+    pairs.  Lookups pick a random key each time so we don't just measure the
+    database's cache.
+    """
+    express = ExpressTransaction.objects.values_list(*EXPRESS_COLUMNS)
+    payflow = PayflowTransaction.objects.values_list(*PAYFLOW_COLUMNS)
+    return [
+        ('express token+method', lambda: express.filter(
+            token='EC-%017d' % random.randrange(rows // 3),
+            method='DoExpressCheckoutPayment')),
+        ('payflow comment1+trxtype', lambda: payflow.filter(
+            comment1='%d' % (100000 + random.randrange(rows // 2)),
+            trxtype__in=('A', 'S'))),
+        ('express dashboard page', lambda: express[:20]),
+        ('payflow dashboard page', lambda: payflow[:20]),
+    ]
+
+
+def explain(queryset):
+    sql, params = queryset.query.sql_with_params()
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return [' '.join('%s' % col for col in row) for row in cursor.fetchall()]
+
+
+def run(iterations=200, rows=200000):
+    seed(rows)
+    results = {}
+    for label, migration in (('before', BEFORE), ('after', AFTER)):
+        call_command('migrate', 'paypal', migration, verbosity=0)
+        for name, factory in queries(rows):
+            key = '%s %s' % (name, label)
+            results[key] = measure(lambda: list(factory()), iterations)
+            results[key]['plan'] = explain(factory())
+    call_command('migrate', 'paypal', verbosity=0)
+    return results
+
+
+if __name__ == '__main__':
+    results = run(args.iterations, args.rows)
+    report('queries', results, args.output)
+    for name, stats in sorted(results.items()):
+        print("\n%s:\n  %s" % (name, '\n  '.join(stats['plan'])))
@@ -0,0 +1,82 @@
+"""
+Benchmark building the payload and its redacted copy for a call, comparing
+the regex substitutions previously run by ``save()`` on the encoded request
+with the single-pass masking of :func:`paypal.gateway.encode`.
+
+Run with::
+
+    python -m tests.benchmarks.redaction [--output results.json]
+"""
+from __future__ import unicode_literals
+import argparse
+import re
+
+from tests.benchmarks.utils import setup_django, measure, report
+
+setup_django()
+
+from django.utils.http import urlencode  # noqa
+
+from paypal import gateway  # noqa
+
+LINE_COUNTS = (1, 10, 100, 1000)
+
+# The substitutions ExpressTransaction.save and PayflowTransaction.save used
+# to run over every stored request
+REGEXES = (
+    (re.compile(r'PWD=\d+&'), 'PWD=XXXXXX&'),
+    (re.compile(r'PWD=.+?&'), 'PWD=XXXXXX&'),
+    (re.compile(r'ACCT=\d+(\d{4})&'), r'ACCT=XXXXXXXXXXXX\1&'),
+    (re.compile(r'CVV2=\d+&'), 'CVV2=XXX&'),
+)
+
+
+def build_params(num_lines):
+    """
+    Return the params of a SetExpressCheckout call for a basket with
+    ``num_lines`` lines, plus card details as sent to Payflow.
+    """
+    params = {
+        'METHOD': 'SetExpressCheckout',
+        'VERSION': '119',
+        'USER': 'merchant_api1.example.com',
+        'PWD': '1432777837',
+        'SIGNATURE': 'A22DCxaCv-WeMRC6ke.fAabwPrYNAH6IkVF8xxY9XZI3Qtl0q',
+        'ACCT': '5555555555554444',
+        'CVV2': '123',
+        'PAYMENTREQUEST_0_AMT': '%d.00' % (num_lines * 10),
+    }
+    for index in range(num_lines):
+        params['L_PAYMENTREQUEST_0_NAME%d' % index] = 'Product %d' % index
+        params['L_PAYMENTREQUEST_0_DESC%d' % index] = (
+            'A longer description of product number %d' % index)
+        params['L_PAYMENTREQUEST_0_AMT%d' % index] = '10.00'
+        params['L_PAYMENTREQUEST_0_QTY%d' % index] = '1'
+    return params
+
+
+def regex_redaction(params):
+    payload = urlencode(params)
+    raw_request = payload
+    for pattern, replacement in REGEXES:
+        raw_request = pattern.sub(replacement, raw_request)
+    return payload, raw_request
+
+
+def run(iterations=500):
+    results = {}
+    for num_lines in LINE_COUNTS:
+        params = build_params(num_lines)
+        results['lines=%d regex' % num_lines] = measure(
+            lambda: regex_redaction(params), iterations)
+        results['lines=%d single-pass' % num_lines] = measure(
+            lambda: gateway.encode(params), iterations)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    report('redaction', run(args.iterations), args.output)
@@ -0,0 +1,52 @@
+"""
+Run the benchmark suite and write the results as JSON.
+
+Run with::
+
+    python -m tests.benchmarks.run [--only set_txn,parsing] [--output results.json]
+
+The output includes the commit and Python version so that results from
+different runs can be compared.
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import importlib
+
+from tests.benchmarks.utils import setup_django, print_results, write_results
+
+BENCHMARKS = (
+    'set_txn',
+    'parsing',
+    'txn_values',
+    'redaction',
+    'fetch_response',
+    'shipping_options',
+    'transport',
+    'checkout_flow',
+    'queries',
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--only', help="Comma-separated list of benchmarks to run")
+    parser.add_argument(
+        '--settings', default='tests.settings',
+        help="Django settings module to use")
+    parser.add_argument('--output', default='benchmark-results.json')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else BENCHMARKS
+    setup_django(args.settings)
+    benchmarks = {}
+    for name in names:
+        module = importlib.import_module('tests.benchmarks.%s' % name)
+        benchmarks[name] = module.run()
+        print_results(name, benchmarks[name])
+    write_results(args.output, benchmarks)
+    print("Results written to %s" % args.output)
+
+
+if __name__ == '__main__':
+    main()
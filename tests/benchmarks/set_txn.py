@@ -0,0 +1,94 @@
+"""
+Benchmark building the SetExpressCheckout parameters for baskets of 1 to 1000
+lines, with offer and voucher discounts.
+
+Run with::
+
+    python -m tests.benchmarks.set_txn [--output results.json]
+"""
+from __future__ import unicode_literals
+import argparse
+from decimal import Decimal as D
+
+from tests.benchmarks.utils import setup_django, measure, report
+
+setup_django()
+
+from oscar.apps.shipping.methods import FixedPrice  # noqa
+
+from paypal.express import gateway  # noqa
+
+BASKET_SIZES = (1, 10, 100, 1000)
+
+
+class FakeProduct(object):
+
+    def __init__(self, index):
+        self.title = 'Product %d' % index
+        self.upc = '978%010d' % index
+        self.description = (
+            '<p>A <strong>lovely</strong> product with a description which '
+            'is long enough that it has to be truncated (#%d).</p>' % index)
+
+    def get_title(self):
+        return self.title
+
+
+class FakeLine(object):
+
+    def __init__(self, index):
+        self.product = FakeProduct(index)
+        self.unit_price_incl_tax = D('9.99')
+        self.quantity = 1 + index % 3
+
+
+class FakeVoucher(object):
+    name = 'Spring sale'
+    code = 'SPRING'
+
+
+class FakeBasket(object):
+    """
+    Just enough of Oscar's basket API for ``_set_txn_params``.  Plain objects
+    are used rather than mocks so that mock overhead doesn't swamp the
+    results.
+    """
+
+    def __init__(self, num_lines):
+        self.lines = [FakeLine(i) for i in range(num_lines)]
+        self.total_incl_tax = sum(
+            l.unit_price_incl_tax * l.quantity for l in self.lines)
+        self.offer_discounts = [
+            {'name': '3 for 2', 'discount': D('1.00')},
+            {'name': '10% off', 'discount': D('2.00')}]
+        self.voucher_discounts = [
+            {'voucher': FakeVoucher(), 'discount': D('1.50')}]
+        self.shipping_discounts = []
+
+    def all_lines(self):
+        return self.lines
+
+
+def run(iterations=200):
+    methods = [FixedPrice(D('2.50'), D('2.50')),
+               FixedPrice(D('5.00'), D('5.00'))]
+    results = {}
+    for size in BASKET_SIZES:
+        basket = FakeBasket(size)
+        # Keep the total run time of the larger baskets reasonable
+        count = max(iterations * 10 // max(size, 10), 10)
+        results['lines=%d' % size] = measure(
+            lambda: gateway._set_txn_params(
+                basket, methods, 'GBP', 'http://example.com/success',
+                'http://example.com/cancel',
+                update_url='http://example.com/shipping-options'),
+            count)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    report('set_txn', run(args.iterations), args.output)
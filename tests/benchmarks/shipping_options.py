@@ -0,0 +1,54 @@
+"""
+Benchmark rendering the instant update callback response in
+``ShippingOptionsView``.
+
+Run with::
+
+    python -m tests.benchmarks.shipping_options [--output results.json]
+"""
+from __future__ import unicode_literals
+import argparse
+from decimal import Decimal as D
+
+from tests.benchmarks.utils import setup_django, measure, report
+
+setup_django()
+
+from django.test import RequestFactory  # noqa
+from oscar.apps.shipping.methods import FixedPrice  # noqa
+
+from paypal.express.views import ShippingOptionsView  # noqa
+from tests.benchmarks.set_txn import FakeBasket  # noqa
+
+METHOD_COUNTS = (1, 5, 20)
+
+
+def run(iterations=500):
+    results = {}
+    basket = FakeBasket(10)
+    request = RequestFactory().post(
+        '/checkout/paypal/shipping-options/1/', {
+            'CURRENCYCODE': 'GBP',
+            'PAYMENTREQUEST_0_SHIPTOCOUNTRY': 'GB',
+            'PAYMENTREQUEST_0_SHIPTOCITY': 'London',
+            'PAYMENTREQUEST_0_SHIPTOZIP': 'N1 9EE',
+        })
+    for count in METHOD_COUNTS:
+        methods = []
+        for index in range(count):
+            method = FixedPrice(D('2.50') + index, D('2.50') + index)
+            method.name = 'Method %d' % index
+            methods.append(method)
+        view = ShippingOptionsView()
+        view.request = request
+        results['methods=%d' % count] = measure(
+            lambda: view.render_to_response(methods, basket), iterations)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    report('shipping_options', run(args.iterations), args.output)
@@ -0,0 +1,42 @@
+"""
+Compare the pooled keep-alive transport with a fresh connection per call,
+against a local PayPal simulator.
+
+Run with::
+
+    python -m tests.benchmarks.transport [--output results.json]
+"""
+from __future__ import unicode_literals
+import argparse
+
+from django.conf import settings
+
+if not settings.configured:
+    settings.configure()
+
+from paypal import gateway  # noqa
+from paypal.simulator import Simulator  # noqa
+from tests.benchmarks.utils import measure, report  # noqa
+
+
+def run(iterations=500):
+    results = {}
+    with Simulator() as simulator:
+        url = simulator.settings()['PAYPAL_API_URL']
+        params = {'METHOD': 'SetExpressCheckout', 'VERSION': '119',
+                  'PAYMENTREQUEST_0_AMT': '10.00'}
+        for keep_alive in (False, True):
+            settings.PAYPAL_HTTP_KEEP_ALIVE = keep_alive
+            gateway.reset_session()
+            name = 'pooled' if keep_alive else 'connection-per-call'
+            results[name] = measure(
+                lambda: gateway.post(url, params), iterations)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    report('transport', run(args.iterations), args.output)
@@ -0,0 +1,66 @@
+"""
+Benchmark the ``ResponseModel.value()`` calls made by the Express views and
+facade for each request, with the parsed response memoized on the
+transaction compared with re-parsing the response for every call.
+
+Run with::
+
+    python -m tests.benchmarks.txn_values [--output results.json]
+"""
+from __future__ import unicode_literals
+import argparse
+
+from tests.benchmarks.utils import setup_django, measure, report
+
+setup_django()
+
+from paypal.express.models import ExpressTransaction  # noqa
+from tests.benchmarks.parsing import build_response  # noqa
+
+# The values SuccessResponseView reads from the GetExpressCheckoutDetails
+# transaction when showing the preview (get_context_data,
+# get_shipping_address and get_shipping_method) and again when placing the
+# order.
+PREVIEW_KEYS = (
+    'EMAIL', 'AMT', 'PAYMENTREQUEST_0_SHIPTONAME',
+    'PAYMENTREQUEST_0_SHIPTOSTREET', 'PAYMENTREQUEST_0_SHIPTOSTREET2',
+    'PAYMENTREQUEST_0_SHIPTOCITY', 'PAYMENTREQUEST_0_SHIPTOSTATE',
+    'PAYMENTREQUEST_0_SHIPTOZIP', 'PAYMENTREQUEST_0_SHIPTOCOUNTRYCODE',
+    'PAYMENTREQUEST_0_SHIPPINGAMT', 'SHIPPINGOPTIONNAME',
+)
+PLACE_ORDER_KEYS = PREVIEW_KEYS[2:]
+
+LINE_COUNTS = (10, 100)
+
+
+def read_values(txn, keys, memoize):
+    for key in keys:
+        if not memoize:
+            txn.__dict__.pop('_parsed_response', None)
+        txn.value(key)
+
+
+def run(iterations=500):
+    results = {}
+    for num_lines in LINE_COUNTS:
+        response = build_response(num_lines)
+        for view, keys in (('preview', PREVIEW_KEYS),
+                           ('place-order', PLACE_ORDER_KEYS)):
+            for memoize in (False, True):
+                name = '%s lines=%d %s' % (
+                    view, num_lines, 'memoized' if memoize else 'reparsed')
+                # A fresh transaction per request, as the views load one
+                results[name] = measure(
+                    lambda: read_values(
+                        ExpressTransaction(raw_response=response), keys,
+                        memoize),
+                    iterations)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+    report('txn_values', run(args.iterations), args.output)
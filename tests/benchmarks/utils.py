@@ -0,0 +1,96 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks are plain modules (they are not collected by pytest) which each
+provide a ``run(iterations)`` function returning a dict of case name to timing
+statistics.  They can be run on their own or together with
+``python -m tests.benchmarks.run``, which writes the results as JSON so runs
+can be compared over time.
+"""
+from __future__ import unicode_literals, print_function
+import json
+import os
+import platform
+import subprocess
+import time
+
+
+def setup_django(settings_module='tests.settings'):
+    """
+    Configure Django and create a throwaway test database for benchmarks that
+    need models.  Does nothing if Django is already set up.
+    """
+    from django.apps import apps
+    if apps.ready:
+        return
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0)
+
+
+def measure(fn, iterations=200, warmup=10):
+    """
+    Call ``fn`` repeatedly and return timing statistics in milliseconds.
+    """
+    for __ in range(warmup):
+        fn()
+    timings = []
+    for __ in range(iterations):
+        start = time.time()
+        fn()
+        timings.append((time.time() - start) * 1000.0)
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'mean_ms': sum(timings) / len(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[max(int(len(timings) * 0.95) - 1, 0)],
+        'max_ms': timings[-1],
+    }
+
+
+def metadata():
+    """
+    Return details of the environment the benchmarks ran in.
+    """
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD']).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.time(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def print_results(name, results):
+    print(name)
+    for case, stats in sorted(results.items()):
+        print("  %-40s mean %8.3fms  p95 %8.3fms" % (
+            case, stats['mean_ms'], stats['p95_ms']))
+
+
+def write_results(output, benchmarks):
+    """
+    Write a dict of benchmark name to results as JSON.
+    """
+    with open(output, 'w') as f:
+        json.dump({'meta': metadata(), 'benchmarks': benchmarks}, f,
+                  indent=2, sort_keys=True)
+
+
+def report(name, results, output=None):
+    """
+    Print ``results`` (a dict of case name to stats) and optionally write
+    them to ``output`` as JSON.
+    """
+    print_results(name, results)
+    if output:
+        write_results(output, {name: results})
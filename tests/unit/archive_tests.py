@@ -0,0 +1,54 @@
+from __future__ import unicode_literals
+import datetime
+from decimal import Decimal as D
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from django.utils.six import StringIO
+
+from paypal import archive
+from paypal.base import ArchivedTransaction, TransactionPayload
+from paypal.express.models import ExpressTransaction
+
+
+def create_txn(token, days_old):
+    txn = ExpressTransaction.objects.create(
+        method='DoExpressCheckoutPayment', version='119', ack='Success',
+        token=token, amount=D('6.99'), currency='GBP',
+        raw_request='METHOD=DoExpressCheckoutPayment',
+        raw_response='ACK=Success', response_time=10)
+    date_created = timezone.now() - datetime.timedelta(days=days_old)
+    ExpressTransaction.objects.filter(pk=txn.pk).update(
+        date_created=date_created)
+    return txn
+
+
+class TestArchive(TestCase):
+
+    def setUp(self):
+        self.old = create_txn('EC-OLD', 400)
+        self.recent = create_txn('EC-NEW', 10)
+        call_command('paypal_archive_transactions', days=365, batch_size=1,
+                     stdout=StringIO())
+
+    def test_old_transactions_are_moved(self):
+        self.assertEqual(
+            ['EC-NEW'],
+            list(ExpressTransaction.objects.values_list('token', flat=True)))
+        self.assertEqual(1, ArchivedTransaction.objects.count())
+        self.assertEqual(1, TransactionPayload.objects.count())
+
+    def test_archived_transactions_can_be_read(self):
+        txn = archive.get_archived(ExpressTransaction, self.old.pk)
+        self.assertTrue(txn.is_archived)
+        self.assertEqual('EC-OLD', txn.token)
+        self.assertEqual(D('6.99'), txn.amount)
+        self.assertEqual('Success', txn.value('ACK'))
+
+    def test_archived_transactions_can_be_restored(self):
+        archive.restore(ExpressTransaction, self.old.pk)
+        txn = ExpressTransaction.objects.get(pk=self.old.pk)
+        self.assertEqual('ACK=Success', txn.raw_response)
+        self.assertTrue(txn.date_created < self.recent.date_created)
+        self.assertEqual(0, ArchivedTransaction.objects.count())
@@ -0,0 +1,114 @@
+from __future__ import unicode_literals
+import time
+
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import override_settings
+
+from paypal import audit
+from paypal.express.models import ExpressTransaction
+
+WRITE_BEHIND = {'max_size': 3, 'max_age': 60}
+
+
+def make_txn(token):
+    return ExpressTransaction(
+        method='SetExpressCheckout', version='119', ack='Success',
+        token=token, raw_request='METHOD=SetExpressCheckout',
+        raw_response='ACK=Success', response_time=10)
+
+
+class TestRecordWithoutBuffer(TestCase):
+
+    def test_saves_at_once(self):
+        txn = audit.record(make_txn('EC-1'))
+        self.assertIsNotNone(txn.pk)
+
+    def test_deferred_records_are_saved_later(self):
+        with audit.deferred() as records:
+            txn = audit.record(make_txn('EC-1'))
+        self.assertEqual([txn], records)
+        self.assertIsNone(txn.pk)
+        audit.save_deferred(records)
+        self.assertIsNotNone(txn.pk)
+
+
+@override_settings(PAYPAL_AUDIT_WRITE_BEHIND=WRITE_BEHIND)
+class TestWriteBehind(TransactionTestCase):
+    # Records are written by the flusher thread, on its own connection
+
+    def setUp(self):
+        audit.reset_buffer()
+
+    def tearDown(self):
+        audit.reset_buffer()
+
+    def test_records_are_buffered(self):
+        audit.record(make_txn('EC-1'))
+        self.assertEqual(0, ExpressTransaction.objects.count())
+
+    def test_records_are_written_when_buffer_is_full(self):
+        for index in range(3):
+            audit.record(make_txn('EC-%d' % index))
+        deadline = time.time() + 5
+        while (ExpressTransaction.objects.count() < 3 and
+               time.time() < deadline):
+            time.sleep(0.01)
+        self.assertEqual(3, ExpressTransaction.objects.count())
+        self.assertEqual(0, len(audit.get_buffer()))
+
+    def test_records_survive_a_rolled_back_request(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                audit.record(make_txn('EC-1'))
+                audit.flush()
+                raise RuntimeError()
+        self.assertTrue(
+            ExpressTransaction.objects.filter(token='EC-1').exists())
+
+    def test_flush_writes_buffered_records(self):
+        audit.record(make_txn('EC-1'))
+        audit.flush()
+        txn = ExpressTransaction.objects.get(token='EC-1')
+        self.assertIsNotNone(txn.date_created)
+
+    def test_payloads_are_written_with_records(self):
+        audit.record(make_txn('EC-1'))
+        audit.flush()
+        txn = ExpressTransaction.objects.get(token='EC-1')
+        self.assertEqual('METHOD=SetExpressCheckout', txn.raw_request)
+
+
+class TestSampling(TestCase):
+
+    def test_failures_are_always_stored_in_full(self):
+        sampling = {'SetExpressCheckout': {'records': 0}}
+        with self.settings(PAYPAL_AUDIT_SAMPLING=sampling):
+            self.assertEqual(
+                audit.FULL, audit.get_storage('SetExpressCheckout', False))
+
+    def test_money_moving_calls_are_always_stored_in_full(self):
+        sampling = {'DoExpressCheckoutPayment': {'records': 0}}
+        with self.settings(PAYPAL_AUDIT_SAMPLING=sampling):
+            self.assertEqual(
+                audit.FULL,
+                audit.get_storage('DoExpressCheckoutPayment', True))
+
+    def test_unsampled_records_are_not_saved(self):
+        sampling = {'SetExpressCheckout': {'records': 0}}
+        with self.settings(PAYPAL_AUDIT_SAMPLING=sampling):
+            txn = audit.record(make_txn('EC-1'), call='SetExpressCheckout',
+                               successful=True)
+        self.assertEqual(0, ExpressTransaction.objects.count())
+        self.assertEqual('ACK=Success', txn.raw_response)
+
+    def test_summary_records_are_saved_without_payload(self):
+        sampling = {'SetExpressCheckout': {'payloads': 0}}
+        with self.settings(PAYPAL_AUDIT_SAMPLING=sampling):
+            txn = audit.record(make_txn('EC-1'), call='SetExpressCheckout',
+                               successful=True)
+        self.assertEqual('ACK=Success', txn.raw_response)
+        stored = ExpressTransaction.objects.get(token='EC-1')
+        self.assertIsNone(stored.payload_id)
+        self.assertTrue(
+            audit.stats()[('SetExpressCheckout', audit.SUMMARY)] >= 1)
@@ -0,0 +1,101 @@
+from __future__ import unicode_literals
+import time
+
+from django.core.cache import cache
+from django.test import TestCase
+import mock
+import requests
+
+from paypal import breaker, exceptions
+from paypal.gateway import post
+
+BREAKER_SETTINGS = {'failure_threshold': 2, 'reset_timeout': 30}
+
+
+class TestCircuitBreaker(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        breaker.reset_breakers()
+
+    def tearDown(self):
+        breaker.reset_breakers()
+
+    def fail(self):
+        with mock.patch('requests.Session.post') as mock_post:
+            mock_post.side_effect = requests.ConnectionError()
+            with self.assertRaises(exceptions.PayPalError):
+                post('http://example.com/nvp', {})
+        return mock_post
+
+    def succeed(self):
+        with mock.patch('requests.Session.post') as mock_post:
+            response = mock.Mock()
+            response.status_code = 200
+            response.content = 'ACK=Success'
+            mock_post.return_value = response
+            return post('http://example.com/nvp', {})
+
+    def expire_reset_timeout(self):
+        cb = breaker.get_breaker('http://example.com/nvp')
+        cache.set(cb.opened_key, time.time() - 60, 300)
+        return cb
+
+    def test_disabled_by_default(self):
+        for __ in range(5):
+            mock_post = self.fail()
+        self.assertTrue(mock_post.called)
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        with self.settings(PAYPAL_CIRCUIT_BREAKER=BREAKER_SETTINGS):
+            self.fail()
+            self.fail()
+            mock_post = self.fail()
+        self.assertFalse(mock_post.called)
+
+    def test_successful_probe_closes_breaker(self):
+        with self.settings(PAYPAL_CIRCUIT_BREAKER=BREAKER_SETTINGS):
+            self.fail()
+            self.fail()
+            self.expire_reset_timeout()
+            self.assertEqual('Success', self.succeed()['ACK'])
+            self.assertEqual('Success', self.succeed()['ACK'])
+
+    def test_only_one_probe_is_allowed(self):
+        with self.settings(PAYPAL_CIRCUIT_BREAKER=BREAKER_SETTINGS):
+            self.fail()
+            self.fail()
+            cb = self.expire_reset_timeout()
+            cb.before_call()
+            with self.assertRaises(exceptions.PayPalUnavailable):
+                cb.before_call()
+
+    def test_successes_do_not_reset_failure_count(self):
+        with self.settings(PAYPAL_CIRCUIT_BREAKER=BREAKER_SETTINGS):
+            self.fail()
+            self.succeed()
+            self.fail()
+            mock_post = self.fail()
+        self.assertFalse(mock_post.called)
+
+    def test_client_error_probe_closes_breaker(self):
+        with self.settings(PAYPAL_CIRCUIT_BREAKER=BREAKER_SETTINGS):
+            self.fail()
+            self.fail()
+            cb = self.expire_reset_timeout()
+            with mock.patch('requests.Session.post') as mock_post:
+                mock_post.return_value = mock.Mock(status_code=400)
+                with self.assertRaises(exceptions.PayPalError):
+                    post('http://example.com/nvp', {})
+            self.assertIsNone(cache.get(cb.opened_key))
+
+    def test_probe_rejected_by_bulkhead_is_released(self):
+        with self.settings(PAYPAL_CIRCUIT_BREAKER=BREAKER_SETTINGS):
+            self.fail()
+            self.fail()
+            cb = self.expire_reset_timeout()
+            with mock.patch('paypal.bulkhead.slot') as slot:
+                slot.side_effect = exceptions.PayPalUnavailable()
+                with self.assertRaises(exceptions.PayPalUnavailable):
+                    post('http://example.com/nvp', {})
+            cb.before_call()
@@ -0,0 +1,43 @@
+from __future__ import unicode_literals
+from django.core.cache import cache
+from django.test import TestCase
+
+from paypal import exceptions
+from paypal.bulkhead import Bulkhead
+
+
+class TestBulkhead(TestCase):
+
+    def test_rejects_when_queue_is_full(self):
+        bulkhead = Bulkhead(max_concurrent=1, max_queued=0)
+        bulkhead.acquire()
+        with self.assertRaises(exceptions.PayPalUnavailable):
+            bulkhead.acquire()
+        self.assertEqual(1, bulkhead.stats()['rejected'])
+
+    def test_queued_caller_times_out(self):
+        bulkhead = Bulkhead(max_concurrent=1, max_queued=1,
+                            queue_timeout=0.01)
+        bulkhead.acquire()
+        with self.assertRaises(exceptions.PayPalUnavailable):
+            bulkhead.acquire()
+        self.assertEqual(0, bulkhead.stats()['queued'])
+
+    def test_released_slots_can_be_reused(self):
+        bulkhead = Bulkhead(max_concurrent=1, max_queued=0)
+        with bulkhead.slot():
+            self.assertEqual(1, bulkhead.stats()['in_flight'])
+        with bulkhead.slot():
+            pass
+        self.assertEqual(0, bulkhead.stats()['in_flight'])
+
+    def test_node_limit(self):
+        cache.clear()
+        first = Bulkhead(max_concurrent=5, node_limit=1)
+        second = Bulkhead(max_concurrent=5, node_limit=1)
+        first.acquire()
+        with self.assertRaises(exceptions.PayPalUnavailable):
+            second.acquire()
+        self.assertEqual(0, second.stats()['in_flight'])
+        first.release()
+        second.acquire()
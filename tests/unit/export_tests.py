@@ -0,0 +1,48 @@
+from __future__ import unicode_literals
+import json
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils.six import StringIO
+
+from paypal import export
+from paypal.express.models import ExpressTransaction
+
+
+def create_txn(method, ack='Success'):
+    return ExpressTransaction.objects.create(
+        method=method, version='119', ack=ack, token='EC-1',
+        raw_request='', raw_response='', response_time=10)
+
+
+class TestExport(TestCase):
+
+    def setUp(self):
+        create_txn('SetExpressCheckout')
+        create_txn('GetExpressCheckoutDetails')
+        create_txn('DoExpressCheckoutPayment', ack='Failure')
+
+    def test_rows_are_read_in_chunks(self):
+        queryset = export.get_queryset('express')
+        rows = list(export.iter_rows(queryset, ('id', 'method'),
+                                     chunk_size=2))
+        self.assertEqual(3, len(rows))
+
+    def test_csv_includes_header(self):
+        lines = list(export.stream('express', 'csv'))
+        self.assertEqual(4, len(lines))
+        self.assertTrue(lines[0].startswith('id,date_created,method'))
+
+    def test_can_filter_by_call_and_status(self):
+        lines = list(export.stream('express', 'jsonl', status='Success',
+                                   call='SetExpressCheckout'))
+        self.assertEqual(1, len(lines))
+        self.assertEqual('SetExpressCheckout', json.loads(lines[0])['method'])
+
+    def test_command_writes_to_stdout(self):
+        out = StringIO()
+        call_command('paypal_export_transactions', 'express', format='jsonl',
+                     status='Failure', stdout=out)
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(['DoExpressCheckoutPayment'],
+                         [row['method'] for row in rows])
@@ -0,0 +1,93 @@
+from __future__ import unicode_literals
+import sys
+from decimal import Decimal as D
+
+import pytest
+from django.test import TransactionTestCase
+from mock import patch, Mock
+
+from paypal.express.models import ExpressTransaction as Transaction
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 5), reason="asyncio gateway requires Python 3.5+")
+
+
+class AsyncGatewayTests(TransactionTestCase):
+    response_body = 'TOKEN=EC%2d6WY34243AN3588740&CORRELATIONID=7e9c5efbda3c0&ACK=Success&VERSION=88%2e0&PAYMENTREQUEST_0_CURRENCYCODE=GBP&PAYMENTREQUEST_0_AMT=33%2e98'
+
+    def setUp(self):
+        pytest.importorskip('httpx')
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def run_with_response(self, coro_fn, body, status_code=200):
+        response = Mock()
+        response.content = body
+        response.status_code = status_code
+        future = self.loop.create_future()
+        future.set_result(response)
+        client = Mock()
+        client.post.return_value = future
+        with patch('paypal.aiogateway.get_client') as get_client:
+            get_client.return_value = client
+            return self.loop.run_until_complete(coro_fn())
+
+    def test_get_txn_records_transaction(self):
+        from paypal.express import aiogateway
+        txn = self.run_with_response(
+            lambda: aiogateway.get_txn('EC-6WY34243AN3588740'),
+            self.response_body)
+        self.assertEqual(D('33.98'), txn.amount)
+        self.assertTrue(Transaction.objects.filter(
+            token='EC-6WY34243AN3588740').exists())
+
+    def test_non_200_response_raises_exception(self):
+        from paypal import exceptions
+        from paypal.express import aiogateway
+        with self.assertRaises(exceptions.PayPalError):
+            self.run_with_response(
+                lambda: aiogateway.get_txn('EC-6WY34243AN3588740'), '',
+                status_code=500)
+
+    def test_calls_take_bulkhead_slots(self):
+        from paypal import bulkhead, exceptions
+        from paypal.express import aiogateway
+        bulkhead.reset_bulkhead()
+        self.addCleanup(bulkhead.reset_bulkhead)
+        with self.settings(PAYPAL_BULKHEAD={'max_concurrent': 1,
+                                            'max_queued': 0}):
+            slots = bulkhead.get_bulkhead()
+            slots.acquire()
+            try:
+                with self.assertRaises(exceptions.PayPalBusy):
+                    self.run_with_response(
+                        lambda: aiogateway.get_txn('EC-6WY34243AN3588740'),
+                        self.response_body)
+            finally:
+                slots.release()
+            self.run_with_response(
+                lambda: aiogateway.get_txn('EC-6WY34243AN3588740'),
+                self.response_body)
+            self.assertEqual(0, slots.stats()['in_flight'])
+
+    def test_concurrent_fetches_share_a_call(self):
+        import asyncio
+        from paypal.express import aiofacade
+        response = Mock()
+        response.content = self.response_body
+        response.status_code = 200
+        future = self.loop.create_future()
+        future.set_result(response)
+        client = Mock()
+        client.post.return_value = future
+        with patch('paypal.aiogateway.get_client') as get_client:
+            get_client.return_value = client
+            txns = self.loop.run_until_complete(asyncio.gather(*[
+                aiofacade.fetch_transaction_details('EC-6WY34243AN3588740')
+                for __ in range(3)]))
+        self.assertEqual(1, client.post.call_count)
+        self.assertEqual([D('33.98')] * 3, [txn.amount for txn in txns])
@@ -43,7 +43,7 @@ class ErrorResponseTests(MockedResponseTestCase):
         response_body = 'TIMESTAMP=2012%2d03%2d26T16%3a33%3a09Z&CORRELATIONID=3bea2076bb9c3&ACK=Failure&VERSION=0%2e000000&BUILD=2649250&L_ERRORCODE0=10002&L_SHORTMESSAGE0=Security%20error&L_LONGMESSAGE0=Security%20header%20is%20not%20valid&L_SEVERITYCODE0=Error'
         response = self.create_mock_response(response_body)
 
-        with patch('requests.post') as post:
+        with patch('requests.Session.post') as post:
             post.return_value = response
             with self.assertRaises(exceptions.PayPalError):
                 gateway.set_txn(self.basket, self.methods, 'GBP', 'http://localhost:8000/success',
@@ -52,7 +52,7 @@ class ErrorResponseTests(MockedResponseTestCase):
     def test_non_200_response_raises_exception(self):
         response = self.create_mock_response(body='', status_code=500)
 
-        with patch('requests.post') as post:
+        with patch('requests.Session.post') as post:
             post.return_value = response
             with self.assertRaises(exceptions.PayPalError):
                 gateway.set_txn(self.basket, self.methods, 'GBP', 'http://localhost:8000/success',
@@ -66,7 +66,7 @@ class SuccessResponseTests(MockedResponseTestCase):
         response_body = 'TOKEN=EC%2d6469953681606921P&TIMESTAMP=2012%2d03%2d26T17%3a19%3a38Z&CORRELATIONID=50a8d895e928f&ACK=Success&VERSION=60%2e0&BUILD=2649250'
         response = self.create_mock_response(response_body)
 
-        with patch('requests.post') as post:
+        with patch('requests.Session.post') as post:
             post.return_value = response
             self.url = gateway.set_txn(self.basket, self.methods, 'GBP',
                                        'http://localhost:8000/success',
@@ -106,3 +106,32 @@ class TestOrderTotal(TestCase):
             with self.assertRaises(InvalidBasket):
                 gateway.set_txn(basket, shipping_methods, 'GBP',
                                 'http://example.com', 'http://example.com')
+
+
+class CallPolicyTests(TestCase):
+
+    def test_payment_calls_are_never_retried(self):
+        with self.settings(PAYPAL_HTTP_POLICIES={'default': {'retries': 3}}):
+            policy = gateway._get_call_policy(gateway.DO_EXPRESS_CHECKOUT)
+        self.assertEqual(0, policy.retries)
+
+    def test_get_express_checkout_is_retried(self):
+        with self.settings(PAYPAL_HTTP_POLICIES={'default': {'retries': 3}}):
+            policy = gateway._get_call_policy(gateway.GET_EXPRESS_CHECKOUT)
+        self.assertEqual(3, policy.retries)
+
+
+class LookupFieldsTests(MockedResponseTestCase):
+
+    def test_payment_records_lookup_fields(self):
+        response_body = 'TOKEN=EC%2d6WY34243AN3588740&CORRELATIONID=3db1d5276ddfd&ACK=Success&VERSION=119&PAYMENTINFO_0_TRANSACTIONID=51963679RW630412N&PAYMENTINFO_0_AMT=33%2e98&PAYMENTINFO_0_CURRENCYCODE=GBP'
+        with patch('requests.Session.post') as post:
+            post.return_value = self.create_mock_response(response_body)
+            txn = gateway.do_txn('7ZTRBDFYYA47W', 'EC-6WY34243AN3588740',
+                                 D('33.98'), 'GBP', basket_id=12,
+                                 order_number='100012')
+
+        self.assertEqual('51963679RW630412N', txn.transaction_id)
+        self.assertEqual('7ZTRBDFYYA47W', txn.payer_id)
+        self.assertEqual(12, txn.basket_id)
+        self.assertEqual('100012', txn.order_number)
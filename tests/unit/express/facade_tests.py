@@ -4,12 +4,18 @@ from unittest import TestCase
 
 import pytest
 from mock import patch, Mock
+from django.core.cache import cache as default_cache
+from django.test.utils import override_settings
 from purl import URL
 from django.utils.six.moves.urllib.parse import parse_qs
 from oscar.apps.shipping.methods import Free
 
 from paypal.models import ExpressTransaction as Transaction
-from paypal.express.facade import get_paypal_url, fetch_transaction_details
+from paypal.express import cache
+from paypal.express.gateway import do_void
+from paypal.express.facade import (
+    get_paypal_url, fetch_transaction_details, confirm_transaction,
+    confirm_transaction_once, _get_payment_lock_config)
 
 
 @pytest.mark.django_db
@@ -21,7 +27,7 @@ class MockedResponseTests(TestCase):
         response = Mock()
         response.content = self.response_body
         response.status_code = 200
-        with patch('requests.post') as post:
+        with patch('requests.Session.post') as post:
             post.return_value = response
             self.perform_action()
             self.mocked_post = post
@@ -77,6 +83,47 @@ class SuccessfulSetExpressCheckoutTests(BaseSetExpressCheckoutTests):
         self.assertPaypalParamEqual('ALLOWNOTE', '1')
 
 
+class TokenReuseTests(SuccessfulSetExpressCheckoutTests):
+
+    def setUp(self):
+        default_cache.clear()
+        self.cache_settings = override_settings(
+            PAYPAL_EXPRESS_TOKEN_CACHE={'timeout': 60})
+        self.cache_settings.enable()
+        super(TokenReuseTests, self).setUp()
+
+    def tearDown(self):
+        super(TokenReuseTests, self).tearDown()
+        self.cache_settings.disable()
+
+    def redirect(self, total=D('200')):
+        basket = Mock()
+        basket.id = 1
+        basket.total_incl_tax = total
+        basket.all_lines = Mock(return_value=[])
+        basket.offer_discounts = []
+        basket.voucher_discounts = []
+        basket.shipping_discounts = []
+        with patch('requests.Session.post') as post:
+            post.return_value = self.mocked_post.return_value
+            url = URL.from_string(get_paypal_url(basket, [Free()]))
+        return url, post
+
+    def test_token_is_reused_for_unchanged_basket(self):
+        url, post = self.redirect()
+        self.assertFalse(post.called)
+        self.assertEqual(self.token, url.query_param('token'))
+
+    def test_new_token_is_registered_for_changed_basket(self):
+        url, post = self.redirect(total=D('150'))
+        self.assertTrue(post.called)
+
+    def test_token_is_not_reused_after_invalidation(self):
+        cache.invalidate(self.token)
+        url, post = self.redirect()
+        self.assertTrue(post.called)
+
+
 class ExtraPaypalSuccessfulSetExpressCheckoutTests(BaseSetExpressCheckoutTests):
     token = 'EC-6469953681606921P'
     response_body = 'TOKEN=EC%2d6469953681606921P&TIMESTAMP=2012%2d03%2d26T17%3a19%3a38Z&CORRELATIONID=50a8d895e928f&ACK=Success&VERSION=60%2e0&BUILD=2649250'
@@ -149,3 +196,113 @@ class SuccessfulGetExpressCheckoutTests(MockedResponseTests):
         ]
         for k, v in values:
             self.assertEqual(v, ctx[k])
+
+
+class CachedGetExpressCheckoutTests(MockedResponseTests):
+    token = SuccessfulGetExpressCheckoutTests.token
+    response_body = SuccessfulGetExpressCheckoutTests.response_body
+
+    def setUp(self):
+        self.cache_settings = override_settings(
+            PAYPAL_EXPRESS_DETAILS_CACHE={'timeout': 60})
+        self.cache_settings.enable()
+        super(CachedGetExpressCheckoutTests, self).setUp()
+
+    def tearDown(self):
+        super(CachedGetExpressCheckoutTests, self).tearDown()
+        self.cache_settings.disable()
+
+    def perform_action(self):
+        default_cache.clear()
+        self.txn = fetch_transaction_details(self.token, basket_id=1)
+
+    def fetch(self, **kwargs):
+        with patch('requests.Session.post') as post:
+            post.return_value = self.mocked_post.return_value
+            txn = fetch_transaction_details(self.token, **kwargs)
+        return txn, post
+
+    def test_details_are_reused(self):
+        txn, post = self.fetch(basket_id=1, use_cache=True)
+        self.assertFalse(post.called)
+        self.assertEqual(self.txn.correlation_id, txn.correlation_id)
+        self.assertEqual(D('33.98'), txn.amount)
+        self.assertEqual('Winterbottom', txn.value('LASTNAME'))
+
+    def test_details_are_fetched_unless_cache_is_used(self):
+        txn, post = self.fetch(basket_id=1)
+        self.assertTrue(post.called)
+
+    def test_details_for_another_basket_are_not_reused(self):
+        txn, post = self.fetch(basket_id=2, use_cache=True)
+        self.assertTrue(post.called)
+
+    def test_invalidate_drops_details(self):
+        cache.invalidate(self.token)
+        self.assertIsNone(cache.get_details(self.token))
+
+    def test_confirming_payment_drops_details(self):
+        with patch('paypal.express.facade.do_txn'):
+            confirm_transaction('PAYER', self.token, D('33.98'), 'GBP')
+        self.assertIsNone(cache.get_details(self.token))
+
+    def test_disabled_by_default(self):
+        with override_settings(PAYPAL_EXPRESS_DETAILS_CACHE=None):
+            txn, post = self.fetch(basket_id=1, use_cache=True)
+        self.assertTrue(post.called)
+
+
+@pytest.mark.django_db
+class RequestLoggingTests(TestCase):
+
+    def test_credentials_are_not_logged(self):
+        response = Mock()
+        response.content = 'ACK=Success&CORRELATIONID=7e9c5efbda3c0'
+        response.status_code = 200
+        with override_settings(PAYPAL_API_PASSWORD='Abc123secret'):
+            with patch('paypal.express.gateway.logger') as logger:
+                logger.isEnabledFor.return_value = True
+                with patch('requests.Session.post') as post:
+                    post.return_value = response
+                    do_void('51963679RW630412N')
+        logged = repr(logger.debug.call_args_list)
+        self.assertTrue('Abc123secret' not in logged)
+        self.assertTrue('DoVoid' in logged)
+
+
+class PaymentLockConfigTests(TestCase):
+
+    def test_lock_outlives_the_call(self):
+        with override_settings(PAYPAL_EXPRESS_PAYMENT_LOCK={}):
+            config = _get_payment_lock_config()
+        self.assertEqual(90, config['lock_timeout'])
+
+    def test_lock_timeout_follows_the_call_deadline(self):
+        with override_settings(
+                PAYPAL_EXPRESS_PAYMENT_LOCK={'lock_timeout': 10},
+                PAYPAL_HTTP_POLICIES={'DoExpressCheckoutPayment': {
+                    'deadline': 120}}):
+            config = _get_payment_lock_config()
+        self.assertEqual(150, config['lock_timeout'])
+
+    def test_confirmations_wait_while_the_lock_may_be_held(self):
+        with override_settings(PAYPAL_EXPRESS_PAYMENT_LOCK={'wait': 5}):
+            config = _get_payment_lock_config()
+        self.assertEqual(90, config['wait'])
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(_get_payment_lock_config())
+
+
+class ConfirmTransactionTests(TestCase):
+
+    def test_returns_the_transaction(self):
+        with patch('paypal.express.facade.do_txn') as do_txn:
+            txn = confirm_transaction('PAYER', 'EC-1', D('33.98'), 'GBP')
+        self.assertIs(do_txn.return_value, txn)
+
+    def test_once_tells_whether_paypal_was_called(self):
+        with patch('paypal.express.facade.do_txn') as do_txn:
+            result = confirm_transaction_once(
+                'PAYER', 'EC-1', D('33.98'), 'GBP')
+        self.assertEqual((do_txn.return_value, True), result)
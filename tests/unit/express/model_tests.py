@@ -1,19 +1,15 @@
 from __future__ import unicode_literals
 from unittest import TestCase
 
+from django.test import TestCase as DjangoTestCase
 import pytest
+from paypal.base import TransactionPayload
 from paypal.express.models import ExpressTransaction as Transaction
 
 
 @pytest.mark.django_db
 class TransactionTests(TestCase):
 
-    def test_password_is_not_saved(self):
-        payload = 'PAYMENTACTION=Sale&PAYERID=7ZTRBDFYYA47W&CURRENCYCODE=GBP&TOKEN=EC-9LW34435GU332960W&AMT=6.99&PWD=1432777837&VERSION=60.0&USER=test_1332777813_biz_api1.gmail.com&SIGNATURE=A22DCxaCv-WeMRC6ke.fAabwPrYNAH6IkVF8xxY9XZI3Qtl0q-2XLULA&METHOD=DoExpressCheckoutPayment'
-        txn = Transaction.objects.create(raw_request=payload,
-                                         response_time=0)
-        self.assertTrue('1432777837' not in txn.raw_request)
-
     def test_query_param_extraction(self):
         response = 'TOKEN=EC%2d8P797793UC466090M&CHECKOUTSTATUS=PaymentActionNotInitiated&TIMESTAMP=2012%2d04%2d16T11%3a51%3a57Z&CORRELATIONID=ab8a263eb440&ACK=Success&VERSION=60%2e0&BUILD=2808426&EMAIL=david%2e_1332854868_per%40gmail%2ecom&PAYERID=7ZTRBDFYYA47W&PAYERSTATUS=verified&FIRSTNAME=David&LASTNAME=Winterbottom&COUNTRYCODE=GB&SHIPTONAME=David%20Winterbottom&SHIPTOSTREET=1%20Main%20Terrace&SHIPTOCITY=Wolverhampton&SHIPTOSTATE=West%20Midlands&SHIPTOZIP=W12%204LQ&SHIPTOCOUNTRYCODE=GB&SHIPTOCOUNTRYNAME=United%20Kingdom&ADDRESSSTATUS=Confirmed&CURRENCYCODE=GBP&AMT=6%2e99&SHIPPINGAMT=0%2e00&HANDLINGAMT=0%2e00&TAXAMT=0%2e00&INSURANCEAMT=0%2e00&SHIPDISCAMT=0%2e00'
         txn = Transaction.objects.create(raw_request='',
@@ -27,3 +23,44 @@ class TransactionTests(TestCase):
                                          ack='SuccessWithWarning',
                                          response_time=0)
         self.assertTrue(txn.is_successful)
+
+
+class ParsedResponseTests(TestCase):
+
+    def test_response_is_parsed_once(self):
+        txn = Transaction(raw_response='ACK=Success&EMAIL=a%40example.com')
+        self.assertEqual('Success', txn.value('ACK'))
+        self.assertIs(txn.nvp, txn.nvp)
+        self.assertIs(txn.context, txn.context)
+
+    def test_cache_is_dropped_when_raw_response_changes(self):
+        txn = Transaction(raw_response='ACK=Success')
+        self.assertEqual('Success', txn.value('ACK'))
+        txn.raw_response = 'ACK=Failure'
+        self.assertEqual('Failure', txn.value('ACK'))
+        self.assertEqual(['Failure'], txn.context['ACK'])
+
+
+class PayloadTests(DjangoTestCase):
+
+    def test_payload_is_saved_with_transaction(self):
+        txn = Transaction.objects.create(
+            raw_request='METHOD=SetExpressCheckout',
+            raw_response='ACK=Success', response_time=0)
+        txn = Transaction.objects.get(pk=txn.pk)
+        self.assertEqual('METHOD=SetExpressCheckout', txn.raw_request)
+        self.assertEqual('Success', txn.value('ACK'))
+
+    def test_payload_is_only_loaded_when_read(self):
+        pk = Transaction.objects.create(
+            raw_request='', raw_response='ACK=Success', response_time=0).pk
+        with self.assertNumQueries(1):
+            txn = Transaction.objects.get(pk=pk)
+        with self.assertNumQueries(1):
+            self.assertEqual('Success', txn.value('ACK'))
+
+    def test_payload_is_deleted_with_transaction(self):
+        txn = Transaction.objects.create(
+            raw_request='', raw_response='ACK=Success', response_time=0)
+        txn.delete()
+        self.assertEqual(0, TransactionPayload.objects.count())
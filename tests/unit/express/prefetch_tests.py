@@ -0,0 +1,89 @@
+from __future__ import unicode_literals
+from decimal import Decimal as D
+
+from django.core.cache import cache
+from django.test import TestCase
+from mock import Mock, patch
+from oscar.apps.shipping.methods import Free
+
+from paypal.express import prefetch
+
+PREFETCH_SETTINGS = {
+    'PAYPAL_EXPRESS_PREFETCH': {'rate_limit': 2},
+    'PAYPAL_EXPRESS_TOKEN_CACHE': {},
+}
+
+
+class RedirectView(object):
+
+    def _get_paypal_url_kwargs(self, basket):
+        return {'basket': basket, 'shipping_methods': [Free()],
+                'host': 'example.com'}
+
+
+class TestPrefetch(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.request = Mock()
+        self.request.user.is_authenticated.return_value = True
+        self.request.user.pk = 1
+
+    def get_basket(self, total=D('200')):
+        basket = Mock()
+        basket.id = 1
+        basket.is_empty = False
+        basket.currency = 'GBP'
+        basket.total_incl_tax = total
+        basket.all_lines = Mock(return_value=[])
+        basket.offer_discounts = []
+        basket.voucher_discounts = []
+        basket.shipping_discounts = []
+        return basket
+
+    def prefetch(self, **kwargs):
+        with patch('paypal.express.gateway.get_token') as get_token:
+            thread = prefetch.prefetch(
+                self.request, self.get_basket(**kwargs),
+                view_class=RedirectView)
+            if thread is not None:
+                thread.join(5)
+        return thread, get_token
+
+    def test_disabled_by_default(self):
+        thread, get_token = self.prefetch()
+        self.assertIsNone(thread)
+        self.assertFalse(get_token.called)
+
+    def test_registers_token_in_background(self):
+        with self.settings(**PREFETCH_SETTINGS):
+            thread, get_token = self.prefetch()
+        self.assertIsNotNone(thread)
+        params = get_token.call_args[0][0]
+        self.assertEqual(D('200.00'), params['PAYMENTREQUEST_0_AMT'])
+        self.assertEqual(1, get_token.call_args[1]['basket_id'])
+
+    def test_skips_baskets_with_a_cached_token(self):
+        with self.settings(**PREFETCH_SETTINGS):
+            with patch('paypal.express.cache.get_token') as get_token:
+                get_token.return_value = 'EC-8P797793UC466090M'
+                thread, __ = self.prefetch()
+        self.assertIsNone(thread)
+
+    def test_rate_is_limited_per_customer(self):
+        with self.settings(**PREFETCH_SETTINGS):
+            threads = [self.prefetch(total=D(total))[0]
+                       for total in ('100', '110', '120')]
+            self.request.user.pk = 2
+            other, __ = self.prefetch()
+        self.assertEqual(2, len([thread for thread in threads if thread]))
+        self.assertIsNotNone(other)
+
+    def test_limited_customers_cost_nothing(self):
+        with self.settings(**PREFETCH_SETTINGS):
+            for total in ('100', '110'):
+                self.prefetch(total=D(total))
+            with patch('paypal.express.facade._get_set_txn_kwargs') as kwargs:
+                thread, __ = self.prefetch(total=D('120'))
+        self.assertIsNone(thread)
+        self.assertFalse(kwargs.called)
@@ -3,6 +3,7 @@ from __future__ import unicode_literals
 
 from decimal import Decimal as D
 
+from django.core.cache import cache as default_cache
 from django.test import TestCase
 from django.test.client import Client
 from django.utils.encoding import force_text
@@ -15,6 +16,8 @@ from oscar.core.loading import get_classes
 from oscar.test.factories import create_product
 from purl import URL
 
+from paypal.express.models import ExpressTransaction
+
 
 Partner, StockRecord = get_classes('partner.models', ('Partner',
                                                       'StockRecord'))
@@ -32,7 +35,7 @@ class MockedPayPalTests(TestCase):
 
     def setUp(self):
         self.client = Client()
-        with patch('requests.post') as post:
+        with patch('requests.Session.post') as post:
             self.patch_http_post(post)
             self.perform_action()
 
@@ -161,6 +164,17 @@ class PreviewOrderTests(MockedPayPalTests):
             self.assertTrue(k in self.response.context, "%s not in context" % k)
 
 
+class ConcurrentPreviewOrderTests(PreviewOrderTests):
+
+    def perform_action(self):
+        with self.settings(PAYPAL_EXPRESS_CONCURRENT_FETCH=True):
+            super(ConcurrentPreviewOrderTests, self).perform_action()
+
+    def test_audit_record_is_saved_by_the_request(self):
+        self.assertTrue(ExpressTransaction.objects.filter(
+            method='GetExpressCheckoutDetails').exists())
+
+
 class SubmitOrderTests(MockedPayPalTests):
 
     def perform_action(self):
@@ -198,6 +212,45 @@ class SubmitOrderTests(MockedPayPalTests):
         self.assertEqual('line2', self.order.shipping_address.line2)
 
 
+class DuplicateSubmitOrderTests(SubmitOrderTests):
+
+    def perform_action(self):
+        default_cache.clear()
+        with self.settings(PAYPAL_EXPRESS_PAYMENT_LOCK={}):
+            super(DuplicateSubmitOrderTests, self).perform_action()
+
+            # A second submission which loaded the frozen basket before the
+            # first one placed its order
+            basket = Basket.objects.get(id=self.order.basket_id)
+            basket.freeze()
+            url = reverse('paypal-place-order',
+                          kwargs={'basket_id': basket.id})
+            self.duplicate_response = self.client.post(
+                url, {'action': 'place_order',
+                      'payer_id': '12345',
+                      'token': 'EC-8P797793UC466090M'})
+
+    def patch_http_post(self, post):
+        super(DuplicateSubmitOrderTests, self).patch_http_post(post)
+        self.mocked_post = post
+
+    def test_only_one_order_is_placed(self):
+        self.assertEqual(1, Order.objects.count())
+
+    def test_payment_is_confirmed_once(self):
+        payloads = [args[1] for args, kwargs in
+                    self.mocked_post.call_args_list]
+        self.assertEqual(1, len([payload for payload in payloads
+                                 if 'DoExpressCheckoutPayment' in payload]))
+
+    def test_duplicate_redirects_to_thank_you_page(self):
+        self.assertRedirects(self.duplicate_response,
+                             reverse('checkout:thank-you'),
+                             fetch_redirect_response=False)
+        self.assertEqual(self.order.pk,
+                         self.client.session['checkout_order_id'])
+
+
 class SubmitOrderErrorsTests(MockedPayPalTests):
 
     def perform_action(self):
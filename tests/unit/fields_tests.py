@@ -0,0 +1,60 @@
+from __future__ import unicode_literals
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils.six import StringIO
+
+from paypal import fields
+from paypal.express.models import ExpressTransaction
+
+RESPONSE = '&'.join(
+    'L_PAYMENTREQUEST_0_NAME%d=Product+%d' % (index, index)
+    for index in range(50)) + '&ACK=Success'
+
+
+def stored_response(txn):
+    return ExpressTransaction.objects.filter(pk=txn.pk).values_list(
+        'payload__raw_response', flat=True)[0]
+
+
+class TestCompression(TestCase):
+
+    def test_values_are_restored(self):
+        compressed = fields.compress(RESPONSE)
+        self.assertTrue(fields.is_compressed(compressed))
+        self.assertEqual(RESPONSE, fields.decompress(compressed))
+
+    def test_short_values_are_left_alone(self):
+        self.assertEqual('ACK=Success', fields.compress('ACK=Success'))
+
+
+class TestCompressedTextField(TestCase):
+
+    def create_txn(self):
+        return ExpressTransaction.objects.create(
+            method='GetExpressCheckoutDetails', raw_request='',
+            raw_response=RESPONSE, response_time=0)
+
+    def test_values_are_stored_uncompressed_by_default(self):
+        txn = self.create_txn()
+        self.assertEqual(RESPONSE, stored_response(txn))
+
+    @override_settings(PAYPAL_COMPRESS_PAYLOADS=True)
+    def test_values_are_compressed_when_enabled(self):
+        txn = self.create_txn()
+        self.assertTrue(fields.is_compressed(stored_response(txn)))
+        self.assertEqual(RESPONSE, txn.raw_response)
+
+    @override_settings(PAYPAL_COMPRESS_PAYLOADS=True)
+    def test_values_are_decompressed_when_read(self):
+        txn = ExpressTransaction.objects.get(pk=self.create_txn().pk)
+        self.assertTrue(fields.is_compressed(txn.payload.__dict__['raw_response']))
+        self.assertEqual('Success', txn.value('ACK'))
+        self.assertEqual(['Product 3'], txn.context['L_PAYMENTREQUEST_0_NAME3'])
+
+    def test_command_compresses_existing_rows(self):
+        txn = self.create_txn()
+        call_command('paypal_compress_payloads', stdout=StringIO())
+        self.assertTrue(fields.is_compressed(stored_response(txn)))
+        txn = ExpressTransaction.objects.get(pk=txn.pk)
+        self.assertEqual(RESPONSE, txn.raw_response)
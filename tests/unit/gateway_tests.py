@@ -1,7 +1,9 @@
 from __future__ import unicode_literals
 from django.test import TestCase
 import mock
+import requests
 
+from paypal import exceptions, gateway
 from paypal.gateway import post
 
 # Fixtures
@@ -11,7 +13,7 @@ ERROR_RESPONSE = 'RESULT=126&PNREF=V25A2BB645A7&RESPMSG=Under review by Fraud Se
 class TestErrorResponse(TestCase):
 
     def setUp(self):
-        with mock.patch('requests.post') as mock_post:
+        with mock.patch('requests.Session.post') as mock_post:
             response = mock.Mock()
             response.status_code = 200
             response.content = ERROR_RESPONSE
@@ -38,3 +40,110 @@ class TestErrorResponse(TestCase):
                     '_response_time']
         for key in expected:
             self.assertTrue(key in self.pairs)
+
+
+class TestPooledSession(TestCase):
+
+    def tearDown(self):
+        gateway.reset_session()
+
+    def test_session_is_reused_between_calls(self):
+        self.assertIs(gateway.get_session(), gateway.get_session())
+
+    def test_new_session_is_created_after_fork(self):
+        session = gateway.get_session()
+        with mock.patch('os.getpid') as getpid:
+            getpid.return_value = -1
+            self.assertIsNot(session, gateway.get_session())
+
+    def test_keep_alive_can_be_disabled(self):
+        with self.settings(PAYPAL_HTTP_KEEP_ALIVE=False):
+            with mock.patch('requests.post') as mock_post:
+                response = mock.Mock()
+                response.status_code = 200
+                response.content = ERROR_RESPONSE
+                mock_post.return_value = response
+                post('http://example.com', {})
+        self.assertTrue(mock_post.called)
+
+
+class TestRetries(TestCase):
+
+    def setUp(self):
+        self.response = mock.Mock()
+        self.response.status_code = 200
+        self.response.content = ERROR_RESPONSE
+
+    def test_connection_errors_are_retried(self):
+        policy = gateway.CallPolicy(retries=2)
+        with mock.patch('requests.Session.post') as mock_post, \
+                mock.patch('time.sleep'):
+            mock_post.side_effect = [
+                requests.ConnectionError(), self.response]
+            pairs = post('http://example.com', {}, policy=policy)
+        self.assertEqual(2, mock_post.call_count)
+        self.assertEqual('126', pairs['RESULT'])
+
+    def test_calls_are_not_retried_by_default(self):
+        with mock.patch('requests.Session.post') as mock_post:
+            mock_post.side_effect = requests.Timeout()
+            with self.assertRaises(exceptions.PayPalError):
+                post('http://example.com', {})
+        self.assertEqual(1, mock_post.call_count)
+
+    def test_client_errors_are_not_retried(self):
+        self.response.status_code = 400
+        policy = gateway.CallPolicy(retries=2)
+        with mock.patch('requests.Session.post') as mock_post:
+            mock_post.return_value = self.response
+            with self.assertRaises(exceptions.PayPalError):
+                post('http://example.com', {}, policy=policy)
+        self.assertEqual(1, mock_post.call_count)
+
+    def test_timeouts_are_passed_to_transport(self):
+        policy = gateway.CallPolicy(connect_timeout=1, read_timeout=5)
+        with mock.patch('requests.Session.post') as mock_post:
+            mock_post.return_value = self.response
+            post('http://example.com', {}, policy=policy)
+        self.assertEqual((1, 5), mock_post.call_args[1]['timeout'])
+
+    def test_policies_can_be_overridden_per_method(self):
+        overrides = {'GetExpressCheckoutDetails': {'read_timeout': 7}}
+        with self.settings(PAYPAL_HTTP_POLICIES=overrides):
+            policy = gateway.get_call_policy('GetExpressCheckoutDetails')
+        self.assertEqual(7, policy.read_timeout)
+
+
+class TestRedaction(TestCase):
+
+    def test_credentials_are_masked(self):
+        payload, raw_request = gateway.encode({
+            'METHOD': 'SetExpressCheckout',
+            'USER': 'merchant',
+            'PWD': 'Abc123secret',
+            'SIGNATURE': 'A22DCxaCv-WeMRC6ke.fAabw'})
+        self.assertTrue('Abc123secret' in payload)
+        self.assertTrue('Abc123secret' not in raw_request)
+        self.assertTrue('A22DCxaCv' not in raw_request)
+        self.assertTrue('USER=merchant' in raw_request)
+
+    def test_card_number_keeps_last_four_digits(self):
+        __, raw_request = gateway.encode({
+            'ACCT': '5555555555554444', 'CVV2': '123'})
+        self.assertTrue('ACCT=XXXXXXXXXXXX4444' in raw_request)
+        self.assertTrue('CVV2=XXX' in raw_request)
+
+    def test_extra_keys_can_be_configured(self):
+        with self.settings(PAYPAL_REDACT_KEYS=('EMAIL',)):
+            __, raw_request = gateway.encode({'EMAIL': 'a@example.com'})
+        self.assertEqual('EMAIL=XXXXXX', raw_request)
+
+    def test_stored_request_is_redacted(self):
+        response = mock.Mock()
+        response.status_code = 200
+        response.content = b'ACK=Success'
+        with mock.patch('requests.Session.post') as mock_post:
+            mock_post.return_value = response
+            pairs = post('http://example.com', {'PWD': '1432777837'})
+        self.assertEqual('PWD=1432777837', mock_post.call_args[0][1])
+        self.assertEqual('PWD=XXXXXX', pairs.raw_request)
@@ -0,0 +1,100 @@
+from __future__ import unicode_literals
+from django.test import TestCase
+import mock
+import pytest
+import requests
+
+from paypal import exceptions, gateway
+from paypal.bulkhead import Bulkhead
+from paypal.express import gateway as express_gateway
+
+prometheus_client = pytest.importorskip('prometheus_client')
+
+SUCCESS_RESPONSE = 'ACK=Success&CORRELATIONID=7e9c5efbda3c0'
+FAILURE_RESPONSE = 'ACK=Failure&L_ERRORCODE0=10001'
+
+
+def sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+
+def ok_response(content):
+    response = mock.Mock()
+    response.status_code = 200
+    response.content = content
+    return response
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        self.policy = gateway.get_call_policy('DoVoid')
+
+    def call(self, content):
+        # Outcomes are recorded by the gateways when they read the response
+        with mock.patch('requests.Session.post',
+                        return_value=ok_response(content)):
+            response = gateway.post('http://example.com', {},
+                                    policy=self.policy)
+        try:
+            express_gateway._record_response('DoVoid', {}, response)
+        except exceptions.PayPalError:
+            pass
+
+    def test_counts_successful_calls(self):
+        before = sample('paypal_requests_total', call='DoVoid',
+                        outcome='Success', error_code='')
+        self.call(SUCCESS_RESPONSE)
+        after = sample('paypal_requests_total', call='DoVoid',
+                       outcome='Success', error_code='')
+        self.assertEqual(before + 1, after)
+        self.assertEqual(0, sample('paypal_requests_in_flight',
+                                   call='DoVoid'))
+
+    def test_labels_failures_with_error_code(self):
+        before = sample('paypal_requests_total', call='DoVoid',
+                        outcome='Failure', error_code='10001')
+        self.call(FAILURE_RESPONSE)
+        after = sample('paypal_requests_total', call='DoVoid',
+                       outcome='Failure', error_code='10001')
+        self.assertEqual(before + 1, after)
+
+    def test_counts_retries_and_transport_errors(self):
+        policy = gateway.get_call_policy(
+            'GetExpressCheckoutDetails', {'retries': 2, 'backoff': 0})
+        retries = sample('paypal_retries_total',
+                         call='GetExpressCheckoutDetails')
+        errors = sample('paypal_errors_total',
+                        call='GetExpressCheckoutDetails', reason='unavailable')
+        with mock.patch('requests.Session.post',
+                        side_effect=requests.ConnectionError):
+            with self.assertRaises(exceptions.PayPalUnavailable):
+                gateway.post('http://example.com', {}, policy=policy)
+        self.assertEqual(retries + 2, sample(
+            'paypal_retries_total', call='GetExpressCheckoutDetails'))
+        self.assertEqual(errors + 1, sample(
+            'paypal_errors_total', call='GetExpressCheckoutDetails',
+            reason='unavailable'))
+        self.assertEqual(0, sample('paypal_requests_in_flight',
+                                   call='GetExpressCheckoutDetails'))
+
+    def test_counts_bulkhead_rejections(self):
+        bulkhead = Bulkhead(max_concurrent=1, max_queued=0)
+        rejections = sample('paypal_bulkhead_rejections_total',
+                            reason='queue_full')
+        errors = sample('paypal_errors_total', call='DoVoid',
+                        reason='busy')
+        in_flight = sample('paypal_bulkhead_in_flight')
+        with mock.patch('paypal.bulkhead.get_bulkhead',
+                        return_value=bulkhead):
+            with bulkhead.slot():
+                self.assertEqual(in_flight + 1,
+                                 sample('paypal_bulkhead_in_flight'))
+                with self.assertRaises(exceptions.PayPalBusy):
+                    gateway.post('http://example.com', {},
+                                 policy=self.policy)
+        self.assertEqual(rejections + 1, sample(
+            'paypal_bulkhead_rejections_total', reason='queue_full'))
+        self.assertEqual(errors + 1, sample(
+            'paypal_errors_total', call='DoVoid', reason='busy'))
+        self.assertEqual(in_flight, sample('paypal_bulkhead_in_flight'))
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+from decimal import Decimal as D
+
+from django.test import TestCase
+
+from paypal.nvp import NVPResponse
+
+RESPONSE = (
+    b'ACK=Failure&PAYMENTREQUEST_0_AMT=12.50&FIRSTNAME=B%C3%A4rbel'
+    b'&L_ERRORCODE0=10001&L_ERRORCODE1=10002&L_ERRORCODE10=10011'
+    b'&L_PAYMENTREQUEST_0_NAME0=Robin&L_PAYMENTREQUEST_0_NAME1=Batman')
+
+
+class TestNVPResponse(TestCase):
+
+    def setUp(self):
+        self.response = NVPResponse(
+            RESPONSE, raw_request='METHOD=DoVoid', response_time=123.4)
+
+    def test_acts_as_a_mapping(self):
+        self.assertEqual('Failure', self.response['ACK'])
+        self.assertEqual('Failure', self.response.get('ACK'))
+        self.assertIsNone(self.response.get('TOKEN'))
+        self.assertTrue('ACK' in self.response)
+        self.assertEqual(8, len(self.response))
+
+    def test_decodes_utf8(self):
+        self.assertEqual('Bärbel', self.response['FIRSTNAME'])
+
+    def test_accepts_text(self):
+        response = NVPResponse(RESPONSE.decode('utf8'))
+        self.assertEqual('Bärbel', response['FIRSTNAME'])
+
+    def test_groups_indexed_fields(self):
+        errors = self.response.indexed('L_ERRORCODE')
+        self.assertEqual(11, len(errors))
+        self.assertEqual(['10001', '10002'], errors[:2])
+        self.assertIsNone(errors[2])
+        self.assertEqual('10011', errors[10])
+        self.assertEqual(['Robin', 'Batman'],
+                         self.response.indexed('L_PAYMENTREQUEST_0_NAME'))
+        self.assertEqual([], self.response.indexed('L_SHIPPINGOPTIONNAME'))
+
+    def test_converts_amounts(self):
+        self.assertEqual(D('12.50'),
+                         self.response.amount('PAYMENTREQUEST_0_AMT'))
+        self.assertEqual(D('0.00'), self.response.amount('AMT', D('0.00')))
+
+    def test_supports_audit_keys(self):
+        self.assertEqual('METHOD=DoVoid', self.response['_raw_request'])
+        self.assertEqual(RESPONSE.decode('utf8'),
+                         self.response['_raw_response'])
+        self.assertEqual(123.4, self.response['_response_time'])
+        self.assertFalse('_raw_request' in list(self.response))
+
+    def test_is_parsed_lazily(self):
+        response = NVPResponse(b'not parsed yet')
+        self.assertIsNone(response._fields)
+        response.get('ACK')
+        self.assertIsNotNone(response._fields)
@@ -0,0 +1,44 @@
+from __future__ import unicode_literals
+import sys
+from decimal import Decimal as D
+
+import pytest
+from django.test import TransactionTestCase
+import mock
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 5), reason="asyncio gateway requires Python 3.5+")
+
+
+class TestAsyncAuthorize(TransactionTestCase):
+
+    def setUp(self):
+        pytest.importorskip('httpx')
+        import asyncio
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_returns_a_txn_instance(self):
+        from paypal.payflow import aiogateway
+        future = self.loop.create_future()
+        future.set_result({
+            'RESULT': '0',
+            'PNREF': 'V25A2BB645A7',
+            'RESPMSG': 'Approved',
+            '_raw_request': '',
+            '_raw_response': '',
+            '_response_time': 1000
+        })
+        with mock.patch('paypal.aiogateway.post') as mock_post:
+            mock_post.return_value = future
+            txn = self.loop.run_until_complete(aiogateway.authorize(
+                order_number='1234',
+                card_number='4111111111111111',
+                cvv='123',
+                expiry_date='1214',
+                amt=D('10.00')))
+        self.assertTrue(txn.is_approved)
+        self.assertEqual('V25A2BB645A7', txn.pnref)
@@ -30,26 +30,23 @@ class TestAuthorizeFunction(TestCase):
         self.assertTrue(txn.is_approved)
 
     def test_hides_card_details(self):
-        with mock.patch('paypal.gateway.post') as mock_post:
-            mock_post.return_value = {
-                'RESULT': '126',
-                'PNREF': 'V25A2BB645A7',
-                'RESPMSG': 'Under review by Fraud Service',
-                'AUTHCODE': '525PNI',
-                'POSTFPSMSG': 'Review',
-                '_raw_request': 'VENDOR=oscarpaypal&TRXTYPE=A&ZIP=n12+9et&LASTNAME=&COMMENT1=100010&EXPDATE=0113&COMMENT2=&STATE=&STREET=Flat+1+Caxton+Court&USER=oscarpaypal&CVV2=123&TENDER=C&ACCT=5555555555554444&CITY=&FIRSTNAME=&PWD=secret&AMT=6.99',
-                '_raw_response': '',
-                '_response_time': 1000
-            }
+        with mock.patch('requests.Session.post') as mock_post:
+            response = mock.Mock()
+            response.status_code = 200
+            response.content = b'RESULT=126&PNREF=V25A2BB645A7&RESPMSG=Under review by Fraud Service'
+            mock_post.return_value = response
             txn = gateway.authorize(
                 order_number='1234',
                 card_number='5555555555554444',
                 cvv='123',
                 expiry_date='0113',
                 amt=D('6.99'))
+            sent = mock_post.call_args[0][1]
 
+        self.assertTrue('5555555555554444' in sent)
         self.assertTrue('5555555555554444' not in txn.raw_request)
-        self.assertTrue('123' not in txn.raw_request)
+        self.assertTrue('ACCT=XXXXXXXXXXXX4444' in txn.raw_request)
+        self.assertTrue('CVV2=123' not in txn.raw_request)
 
     def test_error_handled_gracefully(self):
         with mock.patch('paypal.gateway.post') as mock_post:
@@ -82,3 +79,20 @@ class TestReferenceTransaction(TestCase):
             gateway.reference_transaction(order_number='12345',
                                           pnref='111222',
                                           amt=D('12.23'))
+
+
+class TestRequestId(TestCase):
+
+    def test_request_id_is_sent(self):
+        with mock.patch('paypal.gateway.post') as mock_post:
+            mock_post.return_value = {
+                'RESULT': '0',
+                'RESPMSG': '',
+                '_raw_request': '',
+                '_raw_response': '',
+                '_response_time': 1000
+            }
+            gateway.void(order_number='12345', pnref='111222')
+        headers = mock_post.call_args[1]['headers']
+        self.assertEqual(32, len(headers['X-VPS-REQUEST-ID']))
+        self.assertTrue(mock_post.call_args[1]['policy'].retries > 0)
@@ -0,0 +1,40 @@
+from __future__ import unicode_literals
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from paypal.express.models import ExpressTransaction
+from paypal.routers import PayPalRouter, get_dashboard_database
+
+
+@override_settings(PAYPAL_DATABASE='payments')
+class TestRouter(TestCase):
+
+    def setUp(self):
+        self.router = PayPalRouter()
+
+    def test_paypal_models_use_their_own_database(self):
+        self.assertEqual('payments',
+                         self.router.db_for_write(ExpressTransaction))
+        self.assertEqual('payments',
+                         self.router.db_for_read(ExpressTransaction))
+
+    def test_related_reads_follow_the_instance(self):
+        txn = ExpressTransaction()
+        txn._state.db = 'replica'
+        self.assertEqual('replica', self.router.db_for_read(
+            ExpressTransaction, instance=txn))
+
+    def test_other_models_are_not_routed(self):
+        from django.contrib.sites.models import Site
+        self.assertIsNone(self.router.db_for_write(Site))
+
+    def test_migrations_only_run_on_paypal_database(self):
+        self.assertTrue(self.router.allow_migrate('payments', 'paypal'))
+        self.assertFalse(self.router.allow_migrate('default', 'paypal'))
+        self.assertFalse(self.router.allow_migrate('payments', 'sites'))
+        self.assertIsNone(self.router.allow_migrate('default', 'sites'))
+
+    def test_dashboard_reads_default_to_paypal_database(self):
+        self.assertEqual('payments', get_dashboard_database())
+        with self.settings(PAYPAL_DASHBOARD_DATABASE='replica'):
+            self.assertEqual('replica', get_dashboard_database())
@@ -0,0 +1,48 @@
+from __future__ import unicode_literals
+from decimal import Decimal as D
+
+from django.test import TestCase
+from mock import patch
+
+from paypal.express import gateway as express_gateway
+from paypal.payflow import gateway as payflow_gateway
+from paypal.simulator import Simulator, SimulatorConfig
+
+
+class TestSimulator(TestCase):
+
+    def setUp(self):
+        self.simulator = Simulator()
+        self.simulator.start()
+
+    def tearDown(self):
+        self.simulator.stop()
+
+    def test_express_checkout_round_trip(self):
+        with self.settings(**self.simulator.settings()):
+            set_txn = express_gateway._fetch_response(
+                express_gateway.SET_EXPRESS_CHECKOUT, {
+                    'PAYMENTREQUEST_0_AMT': D('10.00'),
+                    'PAYMENTREQUEST_0_CURRENCYCODE': 'GBP'})
+            get_txn = express_gateway.get_txn(set_txn.token)
+        self.assertEqual(D('10.00'), get_txn.amount)
+
+    def test_payflow_sale(self):
+        with self.settings(**self.simulator.settings()):
+            txn = payflow_gateway.sale(
+                order_number='1234', card_number='4111111111111111',
+                cvv='123', expiry_date='1214', amt=D('10.00'))
+        self.assertTrue(txn.is_approved)
+
+    def test_error_rate(self):
+        self.simulator.server.config = SimulatorConfig(error_rate=1.0)
+        with self.settings(**self.simulator.settings()):
+            txn = payflow_gateway.void(order_number='1234', pnref='V123')
+        self.assertFalse(txn.is_approved)
+
+    def test_payflow_request_ids_are_capped(self):
+        state = self.simulator.server.state
+        with patch('paypal.simulator.MAX_PAYFLOW_REQUESTS', 2):
+            for request_id in ('1', '2', '3'):
+                state.remember_payflow_request(request_id, [])
+        self.assertEqual(['2', '3'], list(state.payflow_requests))
@@ -0,0 +1,100 @@
+from __future__ import unicode_literals
+import hashlib
+import threading
+
+from django.core.cache import cache, caches
+from django.test import TestCase
+from mock import patch
+
+from paypal import exceptions, singleflight
+
+
+class TestGroup(TestCase):
+
+    def test_concurrent_calls_share_one_call(self):
+        group = singleflight.Group()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'result'
+
+        def call():
+            results.append(group.call('key', slow))
+
+        leader = threading.Thread(target=call)
+        leader.start()
+        started.wait(5)
+        followers = [threading.Thread(target=call) for __ in range(3)]
+        for thread in followers:
+            thread.start()
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+
+        self.assertEqual(1, len(calls))
+        self.assertEqual([('result', True)] + [('result', False)] * 3,
+                         results)
+
+    def test_sequential_calls_are_not_shared(self):
+        group = singleflight.Group()
+        self.assertEqual(1, group.do('key', lambda: 1))
+        self.assertEqual(2, group.do('key', lambda: 2))
+
+    def test_exceptions_are_raised(self):
+        group = singleflight.Group()
+
+        def fail():
+            raise exceptions.PayPalError("Failed")
+
+        with self.assertRaises(exceptions.PayPalError):
+            group.do('key', fail)
+        self.assertEqual(1, group.do('key', lambda: 1))
+
+
+class TestExclusive(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def call(self, fn, **kwargs):
+        return singleflight.exclusive('key', fn, dump=str, load=int, **kwargs)
+
+    def test_later_callers_get_stored_result(self):
+        self.assertEqual((1, True), self.call(lambda: 1))
+        self.assertEqual((1, False), self.call(lambda: 2))
+
+    def test_failures_are_not_stored(self):
+        def fail():
+            raise exceptions.PayPalError("Failed")
+
+        with self.assertRaises(exceptions.PayPalError):
+            self.call(fail)
+        self.assertEqual((2, True), self.call(lambda: 2))
+
+    def test_result_stored_before_lock_is_acquired(self):
+        prefix = 'paypal:singleflight:%s' % hashlib.md5(b'key').hexdigest()
+        default = caches['default']
+        add = default.add
+
+        def store_then_add(*args, **kwargs):
+            # Another process stores its result and releases the lock
+            # between the check for a result and taking the lock
+            default.set(prefix + ':result', '1')
+            return add(*args, **kwargs)
+
+        with patch.object(default, 'add', side_effect=store_then_add):
+            self.assertEqual((1, False), self.call(lambda: 2))
+        self.assertIsNone(default.get(prefix + ':lock'))
+
+    def test_fails_when_lock_is_held(self):
+        def nested():
+            return self.call(lambda: 2, wait=0)
+
+        with self.assertRaises(exceptions.PayPalError):
+            self.call(nested)